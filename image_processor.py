@@ -1,282 +1,654 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image
-import os
-import tkinterdnd2 as tkdnd
-from concurrent.futures import ThreadPoolExecutor
-import logging
-import time
-import queue
-
-class ImageBatchProcessor:
-
-    def __init__(self, master):
-        self.master = master
-        # self.master.geometry("750x550")  # 调整窗口大小
-
-        # 变量初始化
-        self.input_dir = ""
-        self.output_dir = ""
-        self.scale_factor = tk.DoubleVar(value=10.0)
-        self.output_format = tk.StringVar(value="JPEG")
-        self.output_width = tk.IntVar()
-        self.output_height = tk.IntVar()
-        self.resize_mode = tk.IntVar(value=1)
-
-        # 日志记录器
-        self.logger = self.setup_logger()
-
-        # 创建一个队列用于线程间通信
-        self.gui_queue = queue.Queue()
-
-        # 线程池 (在 __init__ 中创建，避免每次处理都创建)
-        self.executor = ThreadPoolExecutor(max_workers=4)  # 全局线程池
-
-        # UI 样式
-        style = ttk.Style(self.master)
-        style.configure("TButton", padding=6, relief="flat")
-        style.configure("TEntry", padding=5)
-        style.configure("TLabel", font=("Arial", 10))
-        style.configure("TScale", background="lightgray")
-        style.configure("Horizontal.TProgressbar", troughcolor='lightgray', background='green')
-
-        self.create_widgets()
-
-        # 启动定时器，定期检查队列
-        self.master.after(100, self.process_gui_queue)
-
-
-    def setup_logger(self):
-        logger = logging.getLogger("ImageProcessor")
-        logger.setLevel(logging.DEBUG)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        fh = logging.FileHandler("image_processor.log", mode='w')  # 'w' 模式
-        fh.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        ch.setFormatter(formatter)
-        fh.setFormatter(formatter)
-        logger.addHandler(ch)
-        logger.addHandler(fh)
-        return logger
-
-    def create_widgets(self):
-        # ... (文件选择、尺寸调整、格式选择部分的代码不变，与之前版本相同) ...
-        # 1. 文件选择
-        input_frame = ttk.Frame(self.master)
-        input_frame.pack(pady=10, padx=10, fill=tk.X)
-
-        ttk.Label(input_frame, text="输入文件夹:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.input_entry = ttk.Entry(input_frame, width=40)
-        self.input_entry.grid(row=0, column=1, padx=5, pady=5)
-        self.input_entry.drop_target_register(tkdnd.DND_FILES)
-        self.input_entry.dnd_bind('<<Drop>>', self.handle_drop)
-
-        ttk.Button(input_frame, text="选择", command=self.select_input_dir).grid(row=0, column=2, pady=5)
-
-        ttk.Label(input_frame, text="输出文件夹:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.output_entry = ttk.Entry(input_frame, width=40)
-        self.output_entry.grid(row=1, column=1, padx=5, pady=5)
-        ttk.Button(input_frame, text="选择", command=self.select_output_dir).grid(row=1, column=2, pady=5)
-
-        # 2. 尺寸调整
-        size_frame = ttk.Frame(self.master)
-        size_frame.pack(pady=10, padx=10, fill=tk.X)
-
-        # 等比
-        scale_frame = ttk.Frame(size_frame)
-        scale_frame.pack(fill=tk.X)
-        ttk.Radiobutton(scale_frame, text="等比缩放", variable=self.resize_mode, value=1).pack(side=tk.LEFT)
-        self.scale_slider = ttk.Scale(scale_frame, from_=1, to=20, orient=tk.HORIZONTAL,
-                                      variable=self.scale_factor)
-        self.scale_slider.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
-        self.scale_label = ttk.Label(scale_frame, text="100%")
-        self.scale_label.pack(side=tk.LEFT)
-        self.scale_slider.config(command=self.update_scale_label)
-
-        # 指定尺寸
-        dimension_frame = ttk.Frame(size_frame)
-        dimension_frame.pack(fill=tk.X, pady=5)
-        ttk.Radiobutton(dimension_frame, text="指定尺寸", variable=self.resize_mode, value=2).pack(side=tk.LEFT)
-
-        ttk.Label(dimension_frame, text="宽度:").pack(side=tk.LEFT, padx=(10, 2))
-        self.width_entry = ttk.Entry(dimension_frame, width=8, textvariable=self.output_width)
-        self.width_entry.pack(side=tk.LEFT)
-        ttk.Label(dimension_frame, text="px").pack(side=tk.LEFT, padx=5)
-
-        ttk.Label(dimension_frame, text="高度:").pack(side=tk.LEFT)
-        self.height_entry = ttk.Entry(dimension_frame, width=8, textvariable=self.output_height)
-        self.height_entry.pack(side=tk.LEFT)
-        ttk.Label(dimension_frame, text="px").pack(side=tk.LEFT, padx=5)
-
-        # 3. 格式选择
-        format_frame = ttk.Frame(self.master)
-        format_frame.pack(pady=10, padx=10, fill=tk.X)
-
-        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT)
-        format_combo = ttk.Combobox(format_frame, values=["JPEG", "PNG", "GIF", "BMP", "TIFF"],
-                                    textvariable=self.output_format, state="readonly")
-        format_combo.pack(side=tk.LEFT, padx=5)
-        format_combo.set("JPEG")
-
-        # 4. 处理按钮和进度条
-        button_frame = ttk.Frame(self.master)
-        button_frame.pack(pady=20, padx=10)
-
-        self.process_button = ttk.Button(button_frame, text="开始处理", command=self.process_images, width=15)
-        self.process_button.pack()
-
-        self.progress_bar = ttk.Progressbar(self.master, orient="horizontal", mode="determinate")
-        self.progress_bar.pack(fill=tk.X, padx=10, pady=(0, 10))
-
-
-    def update_scale_label(self, *args):
-        scale_value = self.scale_factor.get() / 10.0
-        self.scale_label.config(text=f"{int(scale_value * 100)}%")
-
-    def select_input_dir(self):
-        self.input_dir = filedialog.askdirectory()
-        self.input_entry.delete(0, tk.END)
-        self.input_entry.insert(0, self.input_dir)
-
-    def select_output_dir(self):
-        self.output_dir = filedialog.askdirectory()
-        self.output_entry.delete(0, tk.END)
-        self.output_entry.insert(0, self.output_dir)
-
-    def handle_drop(self, event):
-        path = event.data
-        path = path.strip('{}')
-        if os.path.isdir(path):
-            self.input_dir = path
-            self.input_entry.delete(0, tk.END)
-            self.input_entry.insert(0, self.input_dir)
-            self.logger.info(f"通过拖放设置输入文件夹: {path}")
-        else:
-            self.logger.warning("拖放的不是文件夹: %s", path)
-            messagebox.showwarning("警告", "请拖放文件夹，而不是文件")
-
-
-    def process_single_image(self, filename):
-        """处理单个图像 (在子线程中运行)"""
-        self.logger.debug(f"线程 {os.getpid()}: 开始处理 {filename}")  # 记录线程 ID
-        try:
-            if not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')):
-                return
-
-            img_path = os.path.join(self.input_dir, filename)
-            try:
-                img = Image.open(img_path)  # 再次用 try...except 包裹 PIL 操作
-                # 获取图像信息并记录
-                self.logger.debug(f"  图像尺寸: {img.size}, 模式: {img.mode}, 格式: {img.format}")
-            except Exception as e:
-                self.logger.exception(f"  打开图像失败: {e}")
-                self.gui_queue.put(("error", f"打开图像 {filename} 失败: {e}"))
-                return
-
-            scale = self.scale_factor.get() / 10.0
-            output_format = self.output_format.get().lower()
-
-            if self.resize_mode.get() == 1:
-                width, height = img.size
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-            else:
-                new_width = self.output_width.get()
-                new_height = self.output_height.get()
-
-            try:
-                resized_img = img.resize((new_width, new_height))
-            except Exception as e:
-                self.logger.exception(f"  调整图像尺寸失败: {e}")
-                self.gui_queue.put(("error", f"调整图像 {filename} 尺寸失败: {e}"))
-                return
-
-            output_filename = os.path.splitext(filename)[0] + "." + output_format
-            output_path = os.path.join(self.output_dir, output_filename)
-
-            try:
-                resized_img.save(output_path, format=output_format)
-            except Exception as e:
-                self.logger.exception(f"  保存图像失败: {e}")
-                self.gui_queue.put(("error", f"保存图像 {filename} 失败: {e}"))
-                return
-            finally:
-                # 释放图像资源 (重要!)
-                if 'resized_img' in locals():  # 检查变量是否存在
-                    resized_img.close()
-                img.close()
-
-
-            self.gui_queue.put(("progress", 1))  # 增加进度
-            self.gui_queue.put(("log", f"已处理: {filename} -> {output_filename}"))
-
-        except Exception as e:
-            #  捕获 *所有* 异常 (虽然通常不推荐这样做, 但这里为了确保线程不会意外退出)
-            self.logger.exception(f"处理文件 {filename} 时发生未知错误: {e}")
-            self.gui_queue.put(("error", f"处理文件 {filename} 时发生未知错误: {e}"))
-        finally:
-            self.logger.debug(f"线程 {os.getpid()}: 完成处理 {filename}")  # 记录线程结束
-
-    def process_images(self):
-        if not self.input_dir or not self.output_dir:
-            messagebox.showerror("错误", "请选择输入和输出文件夹")
-            return
-
-        if not os.path.isdir(self.input_dir) or not os.path.isdir(self.output_dir):
-            messagebox.showerror("错误", "输入或输出文件夹不存在")
-            return
-
-        self.process_button.config(state=tk.DISABLED)
-
-        try:
-            image_files = [f for f in os.listdir(self.input_dir)
-                           if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'))]
-            num_files = len(image_files)
-
-            if num_files == 0:
-                messagebox.showinfo("提示", "输入文件夹中没有找到支持的图像文件")
-                self.process_button.config(state=tk.NORMAL)
-                return
-
-            self.progress_bar["maximum"] = num_files
-            self.progress_bar["value"] = 0
-
-            #  提交任务到 *全局* 线程池
-            for filename in image_files:
-                self.executor.submit(self.process_single_image, filename)
-
-
-        except Exception as e:
-            self.logger.exception(f"处理过程中发生错误: {e}")
-            self.gui_queue.put(("error", "处理过程中发生错误，请查看日志"))
-        finally:
-            #  处理完成/出错，发送 "done" 消息
-            self.gui_queue.put(("done",))
-
-    def process_gui_queue(self):
-        try:
-            while True:
-                message = self.gui_queue.get_nowait()
-                if message[0] == "progress":
-                    self.progress_bar["value"] += message[1]
-                elif message[0] == "log":
-                    self.logger.info(message[1])
-                elif message[0] == "error":
-                    messagebox.showerror("错误", message[1])
-                elif message[0] == "done":
-                    messagebox.showinfo("完成", "图片处理完成/或出错!")
-                    self.logger.info("所有图片处理完成/或出错")
-                    self.process_button.config(state=tk.NORMAL)
-                    self.progress_bar["value"] = 0
-
-        except queue.Empty:
-            pass
-        finally:
-            self.master.after(100, self.process_gui_queue)
-
-
-root = tkdnd.TkinterDnD.Tk()
-root.title("批量图片处理工具-韵网小工具")
-app = ImageBatchProcessor(root)
-root.mainloop()
\ No newline at end of file
+import time
+
+# 启动耗时报告的起点之一, 要在导入其它模块之前读取
+_SCRIPT_START = time.perf_counter()
+
+import argparse
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import os
+import tkinterdnd2 as tkdnd
+import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# PIL、批处理引擎和预览 (都依赖 PIL) 在窗口显示之后才在后台导入, 见 finish_startup
+from imgbatch import (AUTO_WORKERS, BACKENDS, DEDUP_LINK, DEFAULT_PRESET, DEFAULT_REDUCING_GAP, ENCODER_PRESETS,
+                      OUTPUT_FORMATS, RESAMPLE_FILTERS, JobSpec, default_backend, default_workers)
+from imgbatch.archives import archive_stem, is_archive
+from imgbatch.logs import console_handler, json_file_handler, setup_async_logging
+from imgbatch.memory import default_memory_budget
+from imgbatch.pipeline import DEFAULT_PREFETCH_BYTES, DEFAULT_READERS, DEFAULT_WRITERS
+from imgbatch.scanner import scan_images
+from imgbatch.progress import ProgressTracker
+from imgbatch.startup import StartupTimer
+from imgbatch.stats import StageStats
+from imgbatch.watch import watch_folder
+
+# 完成后的汇总对话框中最多列出的错误数 (全部错误都会写入日志)
+MAX_ERRORS_SHOWN = 10
+# 预览列表中最多列出的文件数, 预览区域的大小
+MAX_PREVIEW_FILES = 500
+PREVIEW_BOX = (360, 270)
+# 日志文件中每个文件的处理记录每 LOG_SAMPLE 条保留一条 (警告和错误全部保留)
+LOG_SAMPLE = 10
+
+STARTUP = StartupTimer()
+STARTUP.mark("script", at=_SCRIPT_START)
+STARTUP.mark("imports")
+
+
+class ImageBatchProcessor:
+
+    def __init__(self, master, startup_report=None):
+        self.master = master
+        self.startup_report = startup_report  # 启动耗时报告的 JSON 文件
+        # self.master.geometry("750x550")  # 调整窗口大小
+
+        # 变量初始化
+        self.input_dir = ""
+        self.output_dir = ""
+        self.scale_factor = tk.DoubleVar(value=10.0)
+        self.output_format = tk.StringVar(value="JPEG")
+        self.encoder_preset = tk.StringVar(value=DEFAULT_PRESET)
+        self.output_width = tk.IntVar()
+        self.output_height = tk.IntVar()
+        self.resize_mode = tk.IntVar(value=1)
+        self.resample = tk.StringVar(value="bicubic")
+        self.reducing_gap = tk.StringVar(value=str(DEFAULT_REDUCING_GAP))
+        self.recursive = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=True)
+        self.collect_stats = tk.BooleanVar(value=False)
+        self.dedup = tk.BooleanVar(value=False)
+        self.output_zip = tk.BooleanVar(value=False)
+        self.stage_stats = None
+        self.stats_sent_at = 0.0
+        self.progress = None  # 当前批次的 ProgressTracker
+        self.watch_stop = None  # 监视文件夹时为 threading.Event, 设置后停止监视
+        self.watch_totals = None  # 监视开始以来的 [成功, 失败, 跳过]
+        self.executor_backend = tk.StringVar(value=default_backend())
+        self.max_workers = tk.IntVar(value=default_workers())
+        self.auto_workers = tk.BooleanVar(value=False)
+        self.memory_budget_mb = tk.IntVar(value=(default_memory_budget() or 0) // (1024 * 1024))
+        self.readers = tk.IntVar(value=DEFAULT_READERS)
+        self.writers = tk.IntVar(value=DEFAULT_WRITERS)
+        self.prefetch_mb = tk.IntVar(value=DEFAULT_PREFETCH_BYTES // (1024 * 1024))
+
+        # 日志记录器
+        self.logger = self.setup_logger()
+
+        # 创建一个队列用于线程间通信
+        self.gui_queue = queue.Queue()
+
+        # 批处理引擎 (第一次处理时按所选后端创建, 设置不变时复用)
+        self.engine = None
+        self.engine_workers = None  # 创建引擎时的并发数设置 (整数或 AUTO_WORKERS)
+
+        # 预览: 代理图像缓存 (第一次预览时创建), 解码在单独的后台线程中进行
+        self.preview_cache = None
+        self.preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+        self.preview_files = []
+        self.preview_loading = set()
+        self.preview_photo = None  # 保持 PhotoImage 的引用, 否则会被回收
+        self.preview_after = None
+
+        # UI 样式
+        style = ttk.Style(self.master)
+        style.configure("TButton", padding=6, relief="flat")
+        style.configure("TEntry", padding=5)
+        style.configure("TLabel", font=("Arial", 10))
+        style.configure("TScale", background="lightgray")
+        style.configure("Horizontal.TProgressbar", troughcolor='lightgray', background='green')
+
+        self.create_widgets()
+        self.master.after(0, self.finish_startup)
+
+        # 启动定时器，定期检查队列
+        self.master.after(100, self.process_gui_queue)
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+
+
+    def setup_logger(self):
+        # 写日志线程负责格式化和写盘; 日志文件为 JSON 行, 追加写入并按大小轮转,
+        # 崩溃后重新启动时上次运行的日志仍然保留。每个文件的处理记录只保留 1/LOG_SAMPLE
+        setup_async_logging([console_handler(logging.INFO), json_file_handler("image_processor.log")],
+                            sample_every=LOG_SAMPLE)
+        return logging.getLogger("ImageProcessor")
+
+    def create_widgets(self):
+        # ... (文件选择、尺寸调整、格式选择部分的代码不变，与之前版本相同) ...
+        # 1. 文件选择
+        input_frame = ttk.Frame(self.master)
+        input_frame.pack(pady=10, padx=10, fill=tk.X)
+
+        ttk.Label(input_frame, text="输入文件夹:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.input_entry = ttk.Entry(input_frame, width=40)
+        self.input_entry.grid(row=0, column=1, padx=5, pady=5)
+        self.input_entry.drop_target_register(tkdnd.DND_FILES)
+        self.input_entry.dnd_bind('<<Drop>>', self.handle_drop)
+
+        ttk.Button(input_frame, text="选择", command=self.select_input_dir).grid(row=0, column=2, pady=5)
+
+        ttk.Label(input_frame, text="输出文件夹:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.output_entry = ttk.Entry(input_frame, width=40)
+        self.output_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Button(input_frame, text="选择", command=self.select_output_dir).grid(row=1, column=2, pady=5)
+        options_frame = ttk.Frame(input_frame)
+        options_frame.grid(row=2, column=1, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="包含子文件夹", variable=self.recursive).pack(side=tk.LEFT)
+        ttk.Checkbutton(options_frame, text="跳过未变化的文件", variable=self.incremental).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(options_frame, text="统计各阶段用时", variable=self.collect_stats).pack(side=tk.LEFT)
+        ttk.Checkbutton(options_frame, text="相同内容只处理一次", variable=self.dedup).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(options_frame, text="输出为 ZIP", variable=self.output_zip).pack(side=tk.LEFT)
+
+        # 2. 尺寸调整
+        size_frame = ttk.Frame(self.master)
+        size_frame.pack(pady=10, padx=10, fill=tk.X)
+
+        # 等比
+        scale_frame = ttk.Frame(size_frame)
+        scale_frame.pack(fill=tk.X)
+        ttk.Radiobutton(scale_frame, text="等比缩放", variable=self.resize_mode, value=1).pack(side=tk.LEFT)
+        self.scale_slider = ttk.Scale(scale_frame, from_=1, to=20, orient=tk.HORIZONTAL,
+                                      variable=self.scale_factor)
+        self.scale_slider.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
+        self.scale_label = ttk.Label(scale_frame, text="100%")
+        self.scale_label.pack(side=tk.LEFT)
+        self.scale_slider.config(command=self.update_scale_label)
+
+        # 指定尺寸
+        dimension_frame = ttk.Frame(size_frame)
+        dimension_frame.pack(fill=tk.X, pady=5)
+        ttk.Radiobutton(dimension_frame, text="指定尺寸", variable=self.resize_mode, value=2).pack(side=tk.LEFT)
+
+        ttk.Label(dimension_frame, text="宽度:").pack(side=tk.LEFT, padx=(10, 2))
+        self.width_entry = ttk.Entry(dimension_frame, width=8, textvariable=self.output_width)
+        self.width_entry.pack(side=tk.LEFT)
+        ttk.Label(dimension_frame, text="px").pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(dimension_frame, text="高度:").pack(side=tk.LEFT)
+        self.height_entry = ttk.Entry(dimension_frame, width=8, textvariable=self.output_height)
+        self.height_entry.pack(side=tk.LEFT)
+        ttk.Label(dimension_frame, text="px").pack(side=tk.LEFT, padx=5)
+
+        # 重采样滤镜和快速缩小 (速度/质量权衡)
+        quality_frame = ttk.Frame(size_frame)
+        quality_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(quality_frame, text="缩放算法:").pack(side=tk.LEFT)
+        ttk.Combobox(quality_frame, values=list(RESAMPLE_FILTERS), width=10,
+                     textvariable=self.resample, state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(quality_frame, text="快速缩小 (越小越快):").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Combobox(quality_frame, values=["关闭", "1.0", "2.0", "3.0"], width=6,
+                     textvariable=self.reducing_gap, state="readonly").pack(side=tk.LEFT, padx=5)
+
+        # 3. 格式选择
+        format_frame = ttk.Frame(self.master)
+        format_frame.pack(pady=10, padx=10, fill=tk.X)
+
+        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT)
+        format_combo = ttk.Combobox(format_frame, values=list(OUTPUT_FORMATS),
+                                    textvariable=self.output_format, state="readonly")
+        format_combo.pack(side=tk.LEFT, padx=5)
+        format_combo.set("JPEG")
+
+        # 编码预设: 只影响编码速度和文件大小, 不影响画质
+        ttk.Label(format_frame, text="编码:").pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Combobox(format_frame, values=list(ENCODER_PRESETS), width=9,
+                     textvariable=self.encoder_preset, state="readonly").pack(side=tk.LEFT, padx=5)
+
+        # 执行后端 (多进程 / 多线程) 和并发数
+        ttk.Label(format_frame, text="执行方式:").pack(side=tk.LEFT, padx=(10, 0))
+        backend_combo = ttk.Combobox(format_frame, values=list(BACKENDS), width=10,
+                                     textvariable=self.executor_backend, state="readonly")
+        backend_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(format_frame, text="并发数:").pack(side=tk.LEFT)
+        workers_spin = ttk.Spinbox(format_frame, from_=1, to=256, width=5, textvariable=self.max_workers)
+        workers_spin.pack(side=tk.LEFT, padx=5)
+        # 自动: 运行中按吞吐量调整并发数, 并按输入/输出位置记住
+        ttk.Checkbutton(format_frame, text="自动", variable=self.auto_workers).pack(side=tk.LEFT)
+
+        ttk.Label(format_frame, text="内存上限(MB, 0=不限):").pack(side=tk.LEFT)
+        ttk.Entry(format_frame, width=7, textvariable=self.memory_budget_mb).pack(side=tk.LEFT, padx=5)
+
+        # 流水线: 预读 / 写出线程数 (0 表示由工作进程自己读写, 适合本地磁盘)
+        io_frame = ttk.Frame(self.master)
+        io_frame.pack(padx=10, fill=tk.X)
+        ttk.Label(io_frame, text="读取线程:").pack(side=tk.LEFT)
+        ttk.Spinbox(io_frame, from_=0, to=64, width=5, textvariable=self.readers).pack(side=tk.LEFT, padx=5)
+        ttk.Label(io_frame, text="写出线程:").pack(side=tk.LEFT)
+        ttk.Spinbox(io_frame, from_=0, to=64, width=5, textvariable=self.writers).pack(side=tk.LEFT, padx=5)
+        ttk.Label(io_frame, text="预读上限(MB, 0=不限):").pack(side=tk.LEFT)
+        ttk.Entry(io_frame, width=7, textvariable=self.prefetch_mb).pack(side=tk.LEFT, padx=5)
+
+        # 4. 处理按钮和进度条
+        button_frame = ttk.Frame(self.master)
+        button_frame.pack(pady=20, padx=10)
+
+        self.process_button = ttk.Button(button_frame, text="开始处理", command=self.process_images, width=15)
+        self.process_button.pack(side=tk.LEFT, padx=5)
+        # 继续上次的处理: 跳过断点续传日志中已经完成的文件
+        self.resume_button = ttk.Button(button_frame, text="继续上次的处理", width=15,
+                                        command=lambda: self.process_images(resume=True))
+        self.resume_button.pack(side=tk.LEFT, padx=5)
+        # 监视文件夹: 持续处理新放入输入文件夹的图片, 再点一次停止
+        self.watch_button = ttk.Button(button_frame, text="监视文件夹", command=self.toggle_watch, width=15)
+        self.watch_button.pack(side=tk.LEFT, padx=5)
+
+        self.progress_bar = ttk.Progressbar(self.master, orient="horizontal", mode="determinate")
+        self.progress_bar.pack(fill=tk.X, padx=10, pady=(0, 2))
+        self.status_label = ttk.Label(self.master, text="")
+        self.status_label.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        # 5. 各阶段用时统计 (勾选"统计各阶段用时"后显示)
+        stats_frame = ttk.LabelFrame(self.master, text="阶段用时")
+        stats_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        self.stats_label = ttk.Label(stats_frame, text="", font=("Courier", 9), justify=tk.LEFT)
+        self.stats_label.pack(anchor=tk.W, padx=5, pady=5)
+
+        # 6. 预览: 左侧选择输入图片, 右侧按当前设置显示输出效果
+        preview_frame = ttk.LabelFrame(self.master, text="预览")
+        preview_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.preview_list = tk.Listbox(preview_frame, width=30, height=12, exportselection=False)
+        self.preview_list.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
+        self.preview_list.bind("<<ListboxSelect>>", lambda event: self.update_preview())
+        preview_right = ttk.Frame(preview_frame)
+        preview_right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.preview_label = ttk.Label(preview_right, anchor=tk.CENTER)
+        self.preview_label.pack(fill=tk.BOTH, expand=True)
+        self.preview_info = ttk.Label(preview_right, text="选择输入文件夹后, 在左侧选择图片预览")
+        self.preview_info.pack(fill=tk.X)
+
+        # 设置变化后重新渲染预览 (只从缓存的代理图像缩放)
+        for var in (self.scale_factor, self.output_width, self.output_height, self.resize_mode, self.output_format,
+                    self.encoder_preset, self.resample, self.reducing_gap):
+            var.trace_add("write", self.schedule_preview)
+        # 是否包含子文件夹改变了可以预览的文件
+        self.recursive.trace_add("write", lambda *args: self.load_preview_files())
+
+
+    def update_scale_label(self, *args):
+        scale_value = self.scale_factor.get() / 10.0
+        self.scale_label.config(text=f"{int(scale_value * 100)}%")
+
+    def select_input_dir(self):
+        self.input_dir = filedialog.askdirectory()
+        self.input_entry.delete(0, tk.END)
+        self.input_entry.insert(0, self.input_dir)
+        self.load_preview_files()
+
+    def select_output_dir(self):
+        self.output_dir = filedialog.askdirectory()
+        self.output_entry.delete(0, tk.END)
+        self.output_entry.insert(0, self.output_dir)
+
+    def handle_drop(self, event):
+        path = event.data
+        path = path.strip('{}')
+        # 文件夹或 ZIP / TAR 压缩包 (直接从压缩包中读取, 不解压到磁盘)
+        if os.path.isdir(path) or os.path.isfile(path) and is_archive(path):
+            self.input_dir = path
+            self.input_entry.delete(0, tk.END)
+            self.input_entry.insert(0, self.input_dir)
+            self.logger.info(f"通过拖放设置输入: {path}")
+            self.load_preview_files()
+        else:
+            self.logger.warning("拖放的不是文件夹或压缩包: %s", path)
+            messagebox.showwarning("警告", "请拖放文件夹或 ZIP / TAR 压缩包")
+
+
+    def load_preview_files(self):
+        """在后台线程中列出输入文件夹中的图片 (最多 MAX_PREVIEW_FILES 个)"""
+        if not self.input_dir or not os.path.isdir(self.input_dir):
+            if is_archive(self.input_dir):
+                self.preview_files = []
+                self.preview_list.delete(0, tk.END)
+                self.preview_info.config(text="压缩包中的图片不能预览")
+            return
+        input_dir, recursive = self.input_dir, self.recursive.get()
+
+        def scan():
+            try:
+                files = list(islice(scan_images(input_dir, recursive), MAX_PREVIEW_FILES))
+            except OSError as e:
+                self.logger.warning(f"预览: 读取输入文件夹失败: {e}")
+                files = []
+            self.gui_queue.put(("preview_files", input_dir, files))
+
+        self.preview_executor.submit(scan)
+
+    def finish_startup(self):
+        """窗口显示出来之后再在后台导入 PIL 和引擎, 第一次预览或处理时不用再等"""
+        self.master.update_idletasks()
+        STARTUP.mark("window")
+        STARTUP.report(self.startup_report)
+
+        def preload():
+            import PIL.ImageTk  # noqa: F401
+            import imgbatch.engine  # noqa: F401
+            import imgbatch.preview  # noqa: F401
+            STARTUP.mark("engine")
+
+        threading.Thread(target=preload, name="preload", daemon=True).start()
+
+    def get_preview_cache(self):
+        if self.preview_cache is None:
+            from imgbatch.preview import ProxyCache
+            self.preview_cache = ProxyCache()
+        return self.preview_cache
+
+    def load_preview_proxy(self, path):
+        """解码一张图片并放入代理图像缓存 (在预览线程中运行)"""
+        from imgbatch.preview import load_proxy
+        try:
+            self.preview_cache.put(path, load_proxy(path))
+            self.gui_queue.put(("preview", path, None))
+        except Exception as e:
+            self.logger.warning(f"预览: 打开图像 {path} 失败: {e}")
+            self.gui_queue.put(("preview", path, f"打开图像失败: {e}"))
+
+    def request_preview_proxy(self, path):
+        if path not in self.preview_loading and path not in self.get_preview_cache():
+            self.preview_loading.add(path)
+            self.preview_executor.submit(self.load_preview_proxy, path)
+
+    def schedule_preview(self, *args):
+        """拖动滑块时合并连续的变化, 最多每 30 毫秒渲染一次"""
+        if self.preview_after is None:
+            self.preview_after = self.master.after(30, self.update_preview)
+
+    def selected_preview_path(self):
+        selection = self.preview_list.curselection()
+        if not selection:
+            return None
+        return os.path.join(self.input_dir, self.preview_files[selection[0]])
+
+    def update_preview(self):
+        """按当前设置渲染所选图片; 代理图像不在缓存中时先在后台解码"""
+        self.preview_after = None
+        selection = self.preview_list.curselection()
+        path = self.selected_preview_path()
+        if path is None:
+            return
+        # 顺便预先解码后面的两张, 切换图片时不用等待
+        for filename in self.preview_files[selection[0] + 1:selection[0] + 3]:
+            self.request_preview_proxy(os.path.join(self.input_dir, filename))
+        proxy = self.get_preview_cache().get(path)
+        if proxy is None:
+            self.request_preview_proxy(path)
+            self.preview_info.config(text="正在解码...")
+            return
+        from PIL import ImageTk
+        from imgbatch.preview import render_preview
+        try:
+            job = self.build_job()
+            start = time.perf_counter()
+            image, text = render_preview(proxy, job, PREVIEW_BOX)
+        except (tk.TclError, ValueError, ZeroDivisionError):
+            # 尺寸输入框为空或正在输入
+            self.preview_info.config(text="请输入有效的尺寸")
+            return
+        self.preview_photo = ImageTk.PhotoImage(image)
+        self.preview_label.config(image=self.preview_photo)
+        self.preview_info.config(text=f"{text}  ({(time.perf_counter() - start) * 1000:.0f} 毫秒)")
+
+    def get_engine(self):
+        """按当前设置返回批处理引擎, 后端或并发数变化时重新创建"""
+        from imgbatch.engine import BatchEngine
+        backend, workers = self.executor_backend.get(), max(1, self.max_workers.get())
+        if self.auto_workers.get():
+            workers = AUTO_WORKERS
+        if self.engine is None or (self.engine.backend, self.engine_workers) != (backend, workers):
+            if self.engine is not None:
+                self.engine.shutdown(wait=False)
+            self.engine = BatchEngine(backend, workers)
+            self.engine_workers = workers
+        # 内存预算只影响派发, 不需要重新创建执行池
+        self.engine.memory_budget = max(0, self.memory_budget_mb.get()) * 1024 * 1024 or None
+        self.engine.prefetch_bytes = max(0, self.prefetch_mb.get()) * 1024 * 1024 or None
+        readers, writers = max(0, self.readers.get()), max(0, self.writers.get())
+        if (self.engine.readers, self.engine.writers) != (readers, writers):
+            # 读写线程池按新的线程数重新创建
+            self.engine.shutdown_io()
+            self.engine.readers, self.engine.writers = readers, writers
+        return self.engine
+
+    def build_job(self):
+        """一次性读取界面上的设置, 生成可以发送到子进程的任务描述"""
+        return JobSpec(
+            input_dir=self.input_dir,
+            # 输出为 ZIP 时写入输出文件夹中与输入同名的压缩包
+            output_dir=(os.path.join(self.output_dir, archive_stem(self.input_dir) + ".zip") if self.output_zip.get()
+                        else self.output_dir),
+            resize_mode=self.resize_mode.get(),
+            scale=self.scale_factor.get() / 10.0,
+            width=self.output_width.get(),
+            height=self.output_height.get(),
+            output_format=self.output_format.get(),
+            encoder_preset=self.encoder_preset.get(),
+            resample=self.resample.get(),
+            reducing_gap=None if self.reducing_gap.get() == "关闭" else float(self.reducing_gap.get()),
+            recursive=self.recursive.get(),
+            incremental=self.incremental.get(),
+            collect_stats=self.collect_stats.get(),
+            dedup=DEDUP_LINK if self.dedup.get() else "",
+        )
+
+    def on_image_done(self, result):
+        """单个图像完成的回调 (在后台线程中运行); 进度由 ProgressTracker 汇总, 这里只更新统计"""
+        if result.ok and not result.skipped and "first_image" not in STARTUP.marks:
+            STARTUP.mark("first_image")
+            STARTUP.report(self.startup_report)
+        self.send_stats()
+
+    def send_stats(self, force=False):
+        """把阶段用时统计发给界面 (最多每 0.5 秒一次)"""
+        if self.stage_stats is None:
+            return
+        now = time.monotonic()
+        if force or now - self.stats_sent_at >= 0.5:
+            self.stats_sent_at = now
+            self.gui_queue.put(("stats", self.stage_stats.format_table()))
+
+    def run_batch(self, engine, job, progress, resume=False):
+        """在后台线程中运行引擎 (边扫描边处理), 所有任务结束后再发送 "done" 消息"""
+        summary = None
+        try:
+            summary = engine.run(job, on_result=self.on_image_done, progress=progress, stats=self.stage_stats,
+                                 resume=resume)
+            self.send_stats(force=True)
+            self.logger.info(f"完成: 共 {summary.total} 个, 成功 {summary.succeeded} 个, 失败 {summary.failed} 个, "
+                             f"跳过 {summary.skipped} 个, 用时 {summary.elapsed:.2f} 秒")
+        except Exception as e:
+            self.logger.exception(f"处理过程中发生错误: {e}")
+            self.gui_queue.put(("error", "处理过程中发生错误，请查看日志"))
+        finally:
+            self.gui_queue.put(("done", summary))
+
+    def check_dirs(self):
+        if not self.input_dir or not self.output_dir:
+            messagebox.showerror("错误", "请选择输入和输出文件夹")
+            return False
+
+        input_ok = os.path.isdir(self.input_dir) or os.path.isfile(self.input_dir) and is_archive(self.input_dir)
+        if not input_ok or not os.path.isdir(self.output_dir):
+            messagebox.showerror("错误", "输入或输出文件夹不存在")
+            return False
+        return True
+
+    def process_images(self, resume=False):
+        if not self.check_dirs():
+            return
+        prepared = self.prepare_run()
+        if prepared is None:
+            return
+        engine, job = prepared
+
+        self.process_button.config(state=tk.DISABLED)
+        self.resume_button.config(state=tk.DISABLED)
+        self.watch_button.config(state=tk.DISABLED)
+        self.progress_bar["maximum"] = 1
+        self.progress_bar["value"] = 0
+
+        self.stage_stats = StageStats() if job.collect_stats else None
+        self.stats_label.config(text="")
+        self.progress = ProgressTracker()
+        threading.Thread(target=self.run_batch, args=(engine, job, self.progress, resume), daemon=True).start()
+
+    def prepare_run(self):
+        """在禁用按钮之前读取设置、创建引擎; 出错时提示并返回 None, 按钮保持可用"""
+        try:
+            job = self.build_job()
+            return self.get_engine(), job
+        except Exception as e:
+            self.logger.exception(f"无法开始处理: {e}")
+            messagebox.showerror("错误", f"无法开始处理: {e}")
+            return None
+
+    def toggle_watch(self):
+        """开始/停止监视输入文件夹; 监视期间使用开始时的设置, 修改设置后需要重新开始"""
+        if self.watch_stop is not None:
+            # 处理完当前这一批再停止
+            self.watch_stop.set()
+            self.watch_button.config(text="正在停止...", state=tk.DISABLED)
+            return
+        if not self.check_dirs():
+            return
+        if not os.path.isdir(self.input_dir) or self.output_zip.get():
+            messagebox.showerror("错误", "监视文件夹时输入和输出都必须是文件夹")
+            return
+        prepared = self.prepare_run()
+        if prepared is None:
+            return
+        engine, job = prepared
+        self.stage_stats = StageStats() if job.collect_stats else None
+        self.stats_label.config(text="")
+        self.watch_stop = threading.Event()
+        self.watch_totals = [0, 0, 0]
+        self.process_button.config(state=tk.DISABLED)
+        self.resume_button.config(state=tk.DISABLED)
+        self.watch_button.config(text="停止监视")
+        self.status_label.config(text=f"正在监视 {self.input_dir}")
+        threading.Thread(target=self.run_watch, args=(engine, job, self.watch_stop), daemon=True).start()
+
+    def run_watch(self, engine, job, stop):
+        """后台线程: 监视输入文件夹, 每处理完一批发送 "watch" 消息"""
+        try:
+            watch_folder(engine, job, stop, on_batch=lambda summary: self.gui_queue.put(("watch", summary)),
+                         on_result=self.on_image_done, stats=self.stage_stats)
+        except Exception as e:
+            self.logger.exception(f"监视文件夹时发生错误: {e}")
+            self.gui_queue.put(("error", "监视文件夹时发生错误，请查看日志"))
+        finally:
+            self.send_stats(force=True)
+            self.gui_queue.put(("watch_stopped",))
+
+    def update_progress(self):
+        """每次定时刷新时读取一次进度快照"""
+        if self.progress is None:
+            return
+        snapshot = self.progress.snapshot()
+        # 预扫描得到像素数后按像素加权, 大图和小图对进度的贡献与处理时间成正比
+        self.progress_bar["maximum"] = 1000
+        self.progress_bar["value"] = int(snapshot.fraction * 1000)
+        self.status_label.config(text=snapshot.describe())
+
+    def show_summary(self, summary):
+        """批处理结束后汇总显示一次, 不再为每个失败的文件弹出对话框"""
+        if summary is None:
+            return
+        if summary.total == 0:
+            messagebox.showinfo("提示", "输入文件夹中没有找到支持的图像文件")
+            return
+        text = (f"共 {summary.total} 个, 成功 {summary.succeeded} 个, 失败 {summary.failed} 个, "
+                f"跳过 {summary.skipped} 个, 用时 {summary.elapsed:.1f} 秒")
+        if summary.decodes_saved:
+            text += f"\n内容重复 {summary.decodes_saved} 个, 节省解码 {summary.decodes_saved} 次、编码 {summary.encodes_saved} 次"
+        if not summary.failed:
+            messagebox.showinfo("完成", text)
+            return
+        shown = summary.errors[:MAX_ERRORS_SHOWN]
+        more = summary.failed - len(shown)
+        details = "\n".join(shown) + (f"\n... 另有 {more} 个错误" if more > 0 else "")
+        messagebox.showwarning("完成 (有错误)", f"{text}\n\n{details}\n\n详细信息请查看日志")
+
+    def process_gui_queue(self):
+        try:
+            self.update_progress()
+            while True:
+                message = self.gui_queue.get_nowait()
+                if message[0] == "error":
+                    messagebox.showerror("错误", message[1])
+                elif message[0] == "stats":
+                    self.stats_label.config(text=message[1])
+                elif message[0] == "preview_files":
+                    if message[1] == self.input_dir:
+                        self.preview_files = message[2]
+                        self.preview_list.delete(0, tk.END)
+                        for filename in self.preview_files:
+                            self.preview_list.insert(tk.END, filename)
+                        if self.preview_files:
+                            self.preview_list.selection_set(0)
+                            self.update_preview()
+                elif message[0] == "preview":
+                    _, path, error = message
+                    self.preview_loading.discard(path)
+                    if path == self.selected_preview_path():
+                        if error:
+                            self.preview_info.config(text=error)
+                        else:
+                            self.update_preview()
+                elif message[0] == "watch":
+                    summary = message[1]
+                    totals = self.watch_totals
+                    totals[0] += summary.succeeded
+                    totals[1] += summary.failed
+                    totals[2] += summary.skipped
+                    self.status_label.config(
+                        text=f"正在监视: 已处理 {totals[0]} 个, 失败 {totals[1]} 个, 跳过 {totals[2]} 个"
+                             f"  (最近一批 {summary.total} 个, {summary.elapsed:.1f} 秒)")
+                elif message[0] == "watch_stopped":
+                    self.watch_stop = None
+                    self.process_button.config(state=tk.NORMAL)
+                    self.resume_button.config(state=tk.NORMAL)
+                    self.watch_button.config(text="监视文件夹", state=tk.NORMAL)
+                    self.status_label.config(text="已停止监视")
+                elif message[0] == "done":
+                    self.update_progress()
+                    self.progress = None
+                    self.logger.info("所有图片处理完成/或出错")
+                    self.process_button.config(state=tk.NORMAL)
+                    self.resume_button.config(state=tk.NORMAL)
+                    self.watch_button.config(state=tk.NORMAL)
+                    self.show_summary(message[1])
+                    self.progress_bar["value"] = 0
+
+        except queue.Empty:
+            pass
+        finally:
+            self.master.after(100, self.process_gui_queue)
+
+
+    def on_close(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+        if self.engine is not None:
+            self.engine.shutdown(wait=False, cancel_futures=True)
+        self.preview_executor.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
+
+
+if __name__ == "__main__":
+    # 进程池在 Windows / PyInstaller 打包后需要 freeze_support
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="批量图片处理工具")
+    parser.add_argument("--startup-report",
+                        help="把启动耗时 (窗口可见、第一张图片处理完成等) 写入 JSON 文件, 用于发现启动变慢")
+    args = parser.parse_args()
+    root = tkdnd.TkinterDnD.Tk()
+    root.title("批量图片处理工具-韵网小工具")
+    app = ImageBatchProcessor(root, startup_report=args.startup_report)
+    root.mainloop()
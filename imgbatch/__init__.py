@@ -0,0 +1,5 @@
+"""批量图片处理引擎 (与界面无关的部分)"""
+from .executors import AUTO_WORKERS, BACKENDS, create_executor, default_backend, default_workers
+from .job import (DEDUP_COPY, DEDUP_LINK, DEDUP_MODES, DEFAULT_PRESET, DEFAULT_REDUCING_GAP,
+                  DEFAULT_STREAM_THRESHOLD, ENCODER_PRESETS, OUTPUT_FORMATS, RESAMPLE_FILTERS, RESIZE_SCALE,
+                  RESIZE_SIZE, SUPPORTED_EXTENSIONS, ImageResult, JobSpec, Rendition, is_supported_image)
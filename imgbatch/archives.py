@@ -0,0 +1,182 @@
+"""ZIP / TAR 压缩包的输入和输出
+
+输入压缩包按存档中的顺序逐个读出图片的内容 (tar 以流的方式读取, .tar.gz 等也不需要随机访问),
+直接交给工作进程从内存解码, 不解压到磁盘。输出压缩包由一个写出线程按输入的顺序写入,
+先写到同一目录下的临时文件, 全部完成后再改名。
+"""
+import io
+import logging
+import os
+import posixpath
+import tarfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from dataclasses import dataclass, replace
+
+from .job import is_supported_image
+
+logger = logging.getLogger("ImageProcessor.archives")
+
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ARCHIVE_EXTENSIONS = ZIP_EXTENSIONS + TAR_EXTENSIONS
+# 写 tar 时按扩展名选择压缩方式
+TAR_WRITE_MODES = {".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz", ".tar.bz2": "w:bz2", ".tbz2": "w:bz2",
+                   ".tar.xz": "w:xz", ".txz": "w:xz"}
+# 已经压缩过的输出格式在 zip 中直接存储, 再压缩只浪费时间
+STORED_FORMATS = (".jpeg", ".jpg", ".png", ".gif")
+
+# 与 os.stat_result 相同的字段名, 增量清单可以直接使用
+MemberStat = namedtuple("MemberStat", "st_size st_mtime_ns")
+
+
+@dataclass
+class ArchiveMember:
+    """压缩包中的一个图片文件 (内容已读入内存)"""
+    name: str        # 存档中的路径 ("/" 分隔), 作为相对路径使用
+    stat: MemberStat
+    data: bytes
+    read_time: float  # 读取 (解压) 用时 (秒)
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_stem(path):
+    """去掉压缩包扩展名后的文件名, 例如 photos.tar.gz -> photos"""
+    name = os.path.basename(path)
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def safe_member_name(name):
+    """规范化存档中的路径; 绝对路径或包含 .. 的路径 (会写到输出文件夹之外) 返回 None"""
+    name = posixpath.normpath(name.replace("\\", "/"))
+    if name.startswith("/") or name == ".." or name.startswith("../") or ":" in name.split("/")[0]:
+        return None
+    return name
+
+
+def _wanted(name):
+    if name is None or not is_supported_image(name):
+        return False
+    # macOS 打包时附带的资源文件 (__MACOSX/._photo.jpg) 不是图片
+    return not (name.startswith("__MACOSX/") or posixpath.basename(name).startswith("._"))
+
+
+def iter_archive(path):
+    """按存档中的顺序逐个产生支持的图片 (ArchiveMember), 一次只把一个文件读入内存
+
+    总是包含子文件夹中的文件 (job.recursive 只影响文件夹输入)。
+    """
+    if path.lower().endswith(ZIP_EXTENSIONS):
+        yield from _iter_zip(path)
+    else:
+        yield from _iter_tar(path)
+
+
+def _iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = safe_member_name(info.filename)
+            if not _wanted(name):
+                if name is None:
+                    logger.warning(f"跳过路径不安全的文件: {info.filename}")
+                continue
+            start = time.perf_counter()
+            data = archive.read(info)
+            mtime_ns = int(time.mktime(info.date_time + (0, 0, -1)) * 1e9)
+            yield ArchiveMember(name, MemberStat(info.file_size, mtime_ns), data, time.perf_counter() - start)
+
+
+def _iter_tar(path):
+    # "r|*": 以流的方式顺序读取, 自动识别压缩方式
+    with tarfile.open(path, "r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            name = safe_member_name(info.name)
+            if not _wanted(name):
+                if name is None:
+                    logger.warning(f"跳过路径不安全的文件: {info.name}")
+                continue
+            start = time.perf_counter()
+            data = archive.extractfile(info).read()
+            yield ArchiveMember(name, MemberStat(info.size, int(info.mtime * 1e9)), data,
+                                time.perf_counter() - start)
+
+
+class ArchiveWriter:
+    """把输出写入一个压缩包 (只在一个写出线程中使用)
+
+    先写到临时文件, commit() 后改名为目标文件; abort() 删除临时文件, 中途失败不会留下不完整的压缩包。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.names = set()
+        lower = path.lower()
+        if lower.endswith(ZIP_EXTENSIONS):
+            self.archive = zipfile.ZipFile(self.temp_path, "w", zipfile.ZIP_DEFLATED)
+            self.is_zip = True
+        else:
+            ext = next(ext for ext in sorted(TAR_WRITE_MODES, key=len, reverse=True) if lower.endswith(ext))
+            self.archive = tarfile.open(self.temp_path, TAR_WRITE_MODES[ext])
+            self.is_zip = False
+
+    def add(self, name, data):
+        # 压缩包中不能覆盖已有的文件 (例如 a.jpg 和 a.png 都输出为 a.jpeg)
+        if name in self.names:
+            raise ValueError(f"压缩包中已有同名文件 {name}")
+        self.names.add(name)
+        if self.is_zip:
+            compress = zipfile.ZIP_STORED if name.lower().endswith(STORED_FORMATS) else zipfile.ZIP_DEFLATED
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = compress
+            info.external_attr = 0o644 << 16
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def commit(self):
+        self.archive.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        try:
+            self.archive.close()
+        except Exception:
+            pass
+        try:
+            os.unlink(self.temp_path)
+        except OSError:
+            pass
+
+
+def write_to_archive(writer, result):
+    """把工作进程编码好的输出写入压缩包 (在唯一的压缩包写出线程中按顺序调用)"""
+    start = time.perf_counter()
+    try:
+        for output_filename, data in zip(result.outputs, result.encoded):
+            writer.add(output_filename.replace(os.sep, "/"), data)
+    except Exception as e:
+        logger.exception("  保存图像失败: %s", e)
+        return replace(result, ok=False, encoded=(), error=f"保存图像 {result.filename} 到压缩包失败: {e}")
+    elapsed = time.perf_counter() - start
+    timings = result.timings
+    if timings is not None:
+        timings = {**timings, "write": timings.get("write", 0.0) + elapsed}
+    return replace(result, encoded=(), elapsed=result.elapsed + elapsed, timings=timings)
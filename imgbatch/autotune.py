@@ -0,0 +1,162 @@
+"""自动并发: 在批处理过程中用爬山法调整同时处理的任务数
+
+最合适的并发数取决于核心数、存储速度 (本地 SSD 和网络盘可以差 4 倍) 和图片的大小。
+执行池按上限 (auto_worker_limit) 创建, 引擎只派发 active 个任务, 其余工作进程空闲。
+从较小的值 (或上次为这个输入/输出位置选定的值) 开始, 每个测量窗口统计完成的张数/秒和
+百万像素/秒; 吞吐量提高时继续沿同一方向调整, 不再提高时反向试一次, 然后停在最好的值。
+内存预算挡住派发时不再增加; 系统可用内存不足时立即退回较小的并发。
+选定的值按输入/输出位置保存在 TUNING_FILE 中, 下次运行从它开始。
+"""
+import json
+import logging
+import os
+import time
+
+from .memory import available_memory, physical_memory
+from .pipeline import atomic_write
+
+logger = logging.getLogger("ImageProcessor.autotune")
+
+TUNING_FILE = os.path.join(os.path.expanduser("~"), ".imgbatch", "autotune.json")
+# 每个测量窗口至少这么多秒, 并且每个任务槽至少完成这么多张, 避免被个别大图干扰
+WINDOW_SECONDS = 2.0
+MIN_IMAGES_PER_SLOT = 2
+# 吞吐量至少提高这么多才算改进 (小于测量噪声的变化不追)
+MIN_GAIN = 0.05
+# 每次调整当前并发数的这个比例 (至少 1)
+STEP_FRACTION = 0.25
+# 系统可用内存低于物理内存的这个比例时认为内存紧张
+LOW_MEMORY_FRACTION = 0.1
+
+
+def tuning_key(job, backend):
+    """输入/输出位置 + 执行后端: 同一台机器上处理同一个位置时最合适的并发数基本不变"""
+    return f"{backend}:{os.path.abspath(job.input_dir)} -> {os.path.abspath(job.output_dir)}"
+
+
+class TuningStore:
+    """按位置记住选定的并发数 (JSON 文件, 读写失败时只记录警告)"""
+
+    def __init__(self, path=TUNING_FILE):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取自动并发记录失败: {e}")
+            return {}
+
+    def get(self, key):
+        value = self.load().get(key)
+        return value if isinstance(value, int) and value > 0 else None
+
+    def put(self, key, workers):
+        entries = self.load()
+        if entries.get(key) == workers:
+            return
+        entries[key] = workers
+        try:
+            atomic_write(self.path, json.dumps(entries, ensure_ascii=False, indent=1).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"保存自动并发记录失败: {e}")
+
+
+class WorkerTuner:
+    """爬山法调整 active (同时派发的任务数), 只在引擎的协调线程中使用"""
+
+    def __init__(self, limit, start):
+        self.limit = limit
+        self.active = max(1, min(limit, start))
+        self.direction = 1
+        self.reversed = False   # 已经反向试过
+        self.converged = False
+        self.best = None        # (吞吐量, active)
+        self._reset(time.monotonic())
+
+    def _reset(self, now):
+        self.window_start = now
+        self.images = 0
+        self.pixels = 0
+        self.pressure = False
+
+    def memory_blocked(self):
+        """内存预算挡住了派发 (在途任务少于 active)"""
+        self.pressure = True
+
+    def record(self, pixels):
+        """完成一张图片 (pixels 为预扫描估算的像素数, 未预扫描时为 0)"""
+        self.images += 1
+        self.pixels += pixels
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed >= WINDOW_SECONDS and self.images >= self.active * MIN_IMAGES_PER_SLOT:
+            self._evaluate(elapsed)
+            self._reset(now)
+
+    def _evaluate(self, elapsed):
+        images_rate = self.images / elapsed
+        pixel_rate = self.pixels / 1e6 / elapsed
+        # 图片大小不一时按像素吞吐量比较, 没有预扫描时按张数
+        score = pixel_rate if self.pixels else images_rate
+        previous = self.active
+        if self._low_memory():
+            # 退回较小的并发, 以后不再超过它
+            self.limit = max(1, self.active - self._step())
+            self.active = min(self.active, self.limit)
+            self.converged = True
+            reason = "系统可用内存不足"
+        elif self.converged:
+            return
+        else:
+            if self.pressure:
+                # 内存预算已经挡住了派发, 再增加并发也不会提高吞吐量
+                self.limit = self.active
+            reason = self._climb(score)
+        logger.info(f"自动并发: {previous} 个任务时 {images_rate:.1f} 张/秒, {pixel_rate:.1f} 百万像素/秒; "
+                    f"{reason}, {'选定' if self.converged else '调整为'} {self.active}")
+
+    def _climb(self, score):
+        if self.best is None or score > self.best[0] * (1 + MIN_GAIN):
+            self.best = (score, self.active)
+            self._move(self.active)
+            return "吞吐量提高"
+        if not self.reversed and self.direction > 0:
+            self.direction = -1
+            self.reversed = True
+            self.active = self.best[1]
+            self._move(self.active)
+            return "吞吐量没有提高" if self.converged else "吞吐量没有提高, 反向尝试"
+        self.active = min(self.best[1], self.limit)
+        self.converged = True
+        return "吞吐量没有提高"
+
+    def _step(self):
+        return max(1, round(self.active * STEP_FRACTION))
+
+    def _move(self, origin):
+        """从 origin 沿当前方向走一步; 到达边界时反向一次, 再到边界就停在最好的值"""
+        target = origin + self.direction * self._step()
+        if 1 <= target <= self.limit:
+            self.active = target
+        elif not self.reversed:
+            self.direction = -self.direction
+            self.reversed = True
+            self._move(self.best[1] if self.best else origin)
+        else:
+            self.active = self.best[1] if self.best else origin
+            self.converged = True
+
+    def _low_memory(self):
+        available, total = available_memory(), physical_memory()
+        return available is not None and total is not None and available < total * LOW_MEMORY_FRACTION
+
+    @property
+    def chosen(self):
+        """测量过的最好值 (不超过内存限制的上限); 还没有完成一个测量窗口时为 None"""
+        if self.best is None:
+            return None
+        return min(self.best[1], self.limit)
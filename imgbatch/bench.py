@@ -0,0 +1,334 @@
+"""基准测试: 合成图片集 + 吞吐量报告
+
+    # 生成确定性的合成图片集 (内容只由尺寸、格式和序号决定)
+    python -m imgbatch.bench corpus bench_corpus --sizes thumb,hd,24mp --formats JPEG,PNG,TIFF,BMP,GIF
+
+    # 按 并发数 x 执行后端 x 缩放比例 x 输出格式 x 编码预设 的矩阵运行, 输出 JSON 和文本表格
+    python -m imgbatch.bench run bench_corpus --workers 1,4,8 --backends processes,threads \\
+        --scales 0.25,0.5 --formats JPEG,PNG --presets fastest,balanced,smallest --json before.json
+
+    # 比较两次运行, 吞吐量下降超过阈值时退出码为 1
+    python -m imgbatch.bench compare before.json after.json --threshold 0.05
+
+每个测试用例都在单独的子进程中运行, 峰值内存 (RSS) 互不影响。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .engine import BatchEngine
+from .executors import BACKENDS, default_workers
+from .imaging import Image
+from .job import DEFAULT_PRESET, ENCODER_PRESETS, OUTPUT_FORMATS, JobSpec
+from .manifest import MANIFEST_NAME
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CORPUS_INDEX = "corpus.json"
+
+# 合成图片的尺寸档位: 从缩略图到 50 MP
+SIZE_PRESETS = {
+    "thumb": (160, 120),
+    "vga": (640, 480),
+    "hd": (1920, 1080),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+    "50mp": (8660, 5774),
+}
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "TIFF": ".tiff", "BMP": ".bmp", "GIF": ".gif"}
+
+
+def split_list(text, convert=str):
+    return [convert(item.strip()) for item in text.split(",") if item.strip()]
+
+
+# ---------------------------------------------------------------- 合成图片集
+
+def synthetic_image(size, seed):
+    """生成内容确定的测试图片: 分形 + 渐变 + 少量噪声 (接近照片的压缩难度)"""
+    rng = random.Random(seed)
+    width, height = size
+    # 分形在较小尺寸上生成再放大, 大图也能很快生成
+    base_size = (min(width, 1024), max(1, min(height, round(1024 * height / width))))
+    x, y = rng.uniform(-2.0, -0.5), rng.uniform(-1.0, 0.0)
+    span = rng.uniform(0.5, 2.0)
+    fractal = Image.effect_mandelbrot(base_size, (x, y, x + span, y + span * base_size[1] / base_size[0]), 64)
+    gradient = Image.linear_gradient("L").resize(base_size).rotate(rng.choice((0, 90, 180, 270)))
+    img = Image.merge("RGB", (fractal, gradient, Image.eval(fractal, lambda v: 255 - v)))
+    img = img.resize(size, Image.Resampling.BICUBIC)
+    noise = Image.frombytes("L", size, rng.randbytes(width * height)).convert("RGB")
+    return Image.blend(img, noise, 0.08)
+
+
+def generate_corpus(output_dir, sizes, formats, count):
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for size_name in sizes:
+        size = SIZE_PRESETS[size_name]
+        for index in range(count):
+            img = synthetic_image(size, f"{size_name}-{index}")
+            for fmt in formats:
+                # 文件名带格式, 否则不同格式的同一张图输出到同一个文件, 互相覆盖
+                name = f"{size_name}_{index:03d}_{fmt.lower()}{FORMAT_EXTENSIONS[fmt]}"
+                out = img.convert("P", palette=Image.Palette.ADAPTIVE) if fmt == "GIF" else img
+                out.save(os.path.join(output_dir, name), format=fmt)
+                files.append({"name": name, "width": size[0], "height": size[1], "format": fmt})
+            img.close()
+    with open(os.path.join(output_dir, CORPUS_INDEX), "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2)
+    return files
+
+
+def load_corpus_pixels(corpus_dir):
+    """图片集的总像素数 (优先读取索引文件, 没有时读取图像文件头)"""
+    index_path = os.path.join(corpus_dir, CORPUS_INDEX)
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            return sum(item["width"] * item["height"] for item in json.load(f)["files"])
+    total = 0
+    for name in os.listdir(corpus_dir):
+        try:
+            with Image.open(os.path.join(corpus_dir, name)) as img:
+                total += img.width * img.height
+        except OSError:
+            pass
+    return total
+
+
+# ---------------------------------------------------------------- 运行测试用例
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def self_peak_rss():
+    """本进程的最大常驻内存 (在工作进程中运行)"""
+    time.sleep(0.2)  # 让每个工作进程各领到一个任务
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss_mb(engine):
+    """本进程及各工作进程中的最大常驻内存
+
+    工作进程由 forkserver 启动, 不是本进程的直接子进程, RUSAGE_CHILDREN 统计不到,
+    因此在执行池中逐个询问。
+    """
+    if resource is None:
+        return None
+    executor = engine.get_executor()
+    workers = [executor.submit(self_peak_rss) for _ in range(engine.max_workers)]
+    peak = max([resource.getrusage(resource.RUSAGE_SELF).ru_maxrss] + [f.result() for f in workers])
+    # Linux 上单位是 KB, macOS 上是字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def warm_up(engine):
+    """先把所有工作进程启动起来, 进程启动时间不计入测试"""
+    executor = engine.get_executor()
+    for future in [executor.submit(time.sleep, 0.01) for _ in range(engine.max_workers)]:
+        future.result()
+
+
+def output_size(output_dir):
+    """输出文件的总字节数 (不含增量清单)"""
+    total = 0
+    for root, _, files in os.walk(output_dir):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files
+                     if not name.startswith(MANIFEST_NAME))
+    return total
+
+
+def run_case(case):
+    """在当前进程中运行一个测试用例, 返回测量结果"""
+    output_dir = tempfile.mkdtemp(prefix="imgbatch_bench_")
+    try:
+        job = JobSpec(case["corpus"], output_dir, scale=case["scale"], output_format=case["format"],
+                      encoder_preset=case.get("preset", DEFAULT_PRESET), incremental=False, collect_stats=True,
+                      **case.get("options", {}))
+        engine = BatchEngine(case["backend"], case["workers"])
+        warm_up(engine)
+        latencies = []
+        start = time.perf_counter()
+        summary = engine.run(job, on_result=lambda result: latencies.append(result.elapsed))
+        wall = time.perf_counter() - start
+        peak_rss = peak_rss_mb(engine)
+        engine.shutdown()
+        output_bytes = output_size(output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    megapixels = load_corpus_pixels(case["corpus"]) / 1e6
+    encode = summary.stats.to_dict().get("all", {}).get("encode", {})
+    return {
+        **{key: case[key] for key in ("backend", "workers", "scale", "format")},
+        "preset": case.get("preset", DEFAULT_PRESET),
+        "images": summary.succeeded,
+        "failed": summary.failed,
+        "seconds": round(wall, 4),
+        "images_per_sec": round(summary.succeeded / wall, 2) if wall else 0.0,
+        "mp_per_sec": round(megapixels / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "peak_rss_mb": peak_rss,
+        "encode_ms": encode.get("mean_ms", 0.0),
+        "output_mb": round(output_bytes / (1024 * 1024), 2),
+    }
+
+
+def run_case_subprocess(case):
+    # 保证子进程能导入 imgbatch, 不依赖当前工作目录
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-m", "imgbatch.bench", "case", json.dumps(case)],
+                            check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def environment():
+    import PIL
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_matrix(args):
+    cases = [{"corpus": os.path.abspath(args.corpus), "backend": backend, "workers": workers,
+              "scale": scale, "format": fmt, "preset": preset}
+             for backend in args.backends for workers in args.workers
+             for scale in args.scales for fmt in args.formats for preset in args.presets]
+    results = []
+    for case in cases:
+        for _ in range(args.repeat):
+            result = run_case_subprocess(case)
+            results.append(result)
+            print(format_row(result), file=sys.stderr)
+    return {"environment": environment(), "results": results}
+
+
+# ---------------------------------------------------------------- 报告和比较
+
+COLUMNS = ("backend", "workers", "scale", "format", "preset", "images", "failed", "images_per_sec", "mp_per_sec",
+           "p50_ms", "p95_ms", "peak_rss_mb", "encode_ms", "output_mb")
+
+
+def format_row(row, columns=COLUMNS):
+    return "  ".join(f"{str(row.get(column, '')):>14}" for column in columns)
+
+
+def format_table(results, columns=COLUMNS):
+    lines = [format_row({column: column for column in columns}, columns)]
+    lines += [format_row(row, columns) for row in results]
+    return "\n".join(lines)
+
+
+CASE_KEYS = ("backend", "workers", "scale", "format", "preset")
+
+
+def case_key(row):
+    # 加入编码预设之前的结果都是默认预设
+    return tuple(row.get(key, DEFAULT_PRESET) for key in CASE_KEYS)
+
+
+def compare(base, new, threshold):
+    """按用例比较两次运行的吞吐量, 返回 (比较结果, 是否有退化)"""
+    base_rows = {case_key(row): row for row in base["results"]}
+    rows, regressed = [], False
+    for row in new["results"]:
+        old = base_rows.get(case_key(row))
+        if old is None or not old["images_per_sec"]:
+            continue
+        change = row["images_per_sec"] / old["images_per_sec"] - 1
+        status = "退化" if change < -threshold else "正常"
+        regressed |= change < -threshold
+        rows.append({**dict(zip(CASE_KEYS, case_key(row))),
+                     "base_ips": old["images_per_sec"], "new_ips": row["images_per_sec"],
+                     "change": f"{change:+.1%}", "status": status})
+    return rows, regressed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m imgbatch.bench", description="批处理基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    corpus = sub.add_parser("corpus", help="生成合成图片集")
+    corpus.add_argument("output", help="输出文件夹")
+    corpus.add_argument("--sizes", type=split_list, default=["thumb", "vga", "hd", "12mp"],
+                        help=f"尺寸档位, 可选 {','.join(SIZE_PRESETS)}")
+    corpus.add_argument("--formats", type=lambda t: split_list(t.upper()), default=list(FORMAT_EXTENSIONS),
+                        help="图片格式, 默认 JPEG,PNG,TIFF,BMP,GIF")
+    corpus.add_argument("--count", type=int, default=4, help="每种尺寸生成的图片数")
+
+    run = sub.add_parser("run", help="运行基准测试矩阵")
+    run.add_argument("corpus", help="图片集文件夹")
+    run.add_argument("--workers", type=lambda t: split_list(t, int), default=[1, default_workers()])
+    run.add_argument("--backends", type=split_list, default=list(BACKENDS))
+    run.add_argument("--scales", type=lambda t: split_list(t, float), default=[0.25, 0.5])
+    run.add_argument("--formats", type=lambda t: split_list(t.upper()), default=["JPEG", "PNG"])
+    run.add_argument("--presets", type=lambda t: split_list(t.lower()), default=[DEFAULT_PRESET],
+                     help=f"编码预设, 例如 {','.join(ENCODER_PRESETS)} (比较编码用时和输出大小)")
+    run.add_argument("--repeat", type=int, default=1, help="每个用例重复运行的次数")
+    run.add_argument("--json", help="把结果写入 JSON 文件")
+
+    cmp_parser = sub.add_parser("compare", help="比较两次运行的结果")
+    cmp_parser.add_argument("base", help="基准结果 JSON")
+    cmp_parser.add_argument("new", help="新结果 JSON")
+    cmp_parser.add_argument("--threshold", type=float, default=0.05, help="允许的吞吐量下降比例, 默认 0.05")
+
+    case = sub.add_parser("case", help=argparse.SUPPRESS)  # 内部使用: 在子进程中运行单个用例
+    case.add_argument("spec")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "corpus":
+        unknown = [s for s in args.sizes if s not in SIZE_PRESETS] + \
+                  [f for f in args.formats if f not in FORMAT_EXTENSIONS]
+        if unknown:
+            print(f"未知的尺寸或格式: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        files = generate_corpus(args.output, args.sizes, args.formats, args.count)
+        print(f"已生成 {len(files)} 个文件: {args.output}")
+    elif args.command == "run":
+        unknown = [f for f in args.formats if f not in OUTPUT_FORMATS] + \
+                  [p for p in args.presets if p not in ENCODER_PRESETS]
+        if unknown:
+            print(f"未知的输出格式或编码预设: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        report = run_matrix(args)
+        print(format_table(report["results"]))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+    elif args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        rows, regressed = compare(base, new, args.threshold)
+        print(format_table(rows, CASE_KEYS + ("base_ips", "new_ips", "change", "status")))
+        return 1 if regressed else 0
+    elif args.command == "case":
+        print(json.dumps(run_case(json.loads(args.spec))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""命令行入口 (无界面, 不导入 Tk)
+
+用法示例:
+    python -m imgbatch -i 输入文件夹 -o 输出文件夹 --scale 0.5 -f PNG
+    python -m imgbatch -i in -o out --size 800x600 -w 16 --summary summary.json
+    python -m imgbatch -i 收件夹 -o out --scale 0.5 --watch
+    python -m imgbatch -i photos.zip -o thumbs.zip --size 200x200
+    python -m imgbatch -i /mnt/nas/in -o /mnt/nas/out --claim      (在每台机器上运行)
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+from dataclasses import replace
+
+from .archives import is_archive
+from .executors import AUTO_WORKERS, BACKENDS, default_backend, default_workers
+from .logs import console_handler, json_file_handler, setup_async_logging
+from .memory import default_memory_budget, parse_bytes
+from .pipeline import DEFAULT_PREFETCH_BYTES, DEFAULT_READERS, DEFAULT_WRITERS
+from .shard import DEFAULT_CLAIM_TIMEOUT, ClaimBoard, StaticShard, parse_shard
+from .watch import DEFAULT_INTERVAL, DEFAULT_SETTLE
+from .job import (DEDUP_MODES, DEFAULT_PRESET, DEFAULT_REDUCING_GAP, DEFAULT_STREAM_THRESHOLD, ENCODER_PRESETS,
+                  OUTPUT_FORMATS, RESAMPLE_FILTERS, RESIZE_SCALE, RESIZE_SIZE, JobSpec, Rendition)
+
+
+def parse_scale(text):
+    try:
+        scale = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"缩放比例应为数字: {text}")
+    if not scale > 0 or scale == float("inf"):
+        raise argparse.ArgumentTypeError(f"缩放比例必须大于 0: {text}")
+    return scale
+
+
+def parse_size(text):
+    """宽x高, 其中一个为 0 时保持宽高比"""
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"尺寸格式应为 宽x高, 例如 800x600: {text}")
+    if width < 0 or height < 0 or not (width or height):
+        raise argparse.ArgumentTypeError(f"宽和高不能为负数, 并且至少一个大于 0: {text}")
+    return width, height
+
+
+def parse_reducing_gap(text):
+    gap = float(text)
+    if gap == 0:
+        return None
+    if gap < 1.0:
+        raise argparse.ArgumentTypeError("reducing gap 必须 >= 1.0 (0 表示关闭)")
+    return gap
+
+
+def parse_workers(text):
+    if text.lower() == AUTO_WORKERS:
+        return AUTO_WORKERS
+    workers = int(text)
+    if workers < 1:
+        raise argparse.ArgumentTypeError(f"并发数至少为 1: {text}")
+    return workers
+
+
+def parse_stream_threshold(text):
+    """单位为百万像素, 0 表示关闭流式缩放"""
+    megapixels = float(text)
+    if megapixels < 0:
+        raise argparse.ArgumentTypeError("流式缩放阈值不能为负数")
+    return int(megapixels * 1_000_000)
+
+
+def parse_memory_budget(text):
+    try:
+        return parse_bytes(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_shard_arg(text):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_renditions(text):
+    """JSON 列表, 或者 @文件名 表示从文件读取"""
+    try:
+        if text.startswith("@"):
+            with open(text[1:], encoding="utf-8") as f:
+                text = f.read()
+        items = json.loads(text)
+        if not isinstance(items, list) or not items:
+            raise ValueError("应为非空的 JSON 列表")
+        return tuple(Rendition.from_dict(item) for item in items)
+    except (OSError, ValueError, TypeError) as e:
+        raise argparse.ArgumentTypeError(f"无效的输出规格: {e}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m imgbatch", description="批量图片尺寸调整/格式转换")
+    parser.add_argument("-i", "--input", required=True, help="输入文件夹, 或 ZIP / TAR 压缩包")
+    parser.add_argument("-o", "--output", required=True,
+                        help="输出文件夹 (不存在时自动创建); 以 .zip / .tar / .tar.gz 等结尾时写入一个压缩包")
+    size_group = parser.add_mutually_exclusive_group()
+    size_group.add_argument("--scale", type=parse_scale, default=1.0, help="等比缩放比例, 默认 1.0")
+    size_group.add_argument("--size", type=parse_size, help="指定输出尺寸, 例如 800x600 (800x0 表示宽 800、保持宽高比)")
+    parser.add_argument("-f", "--format", default="JPEG", type=str.upper, choices=OUTPUT_FORMATS,
+                        help="输出格式, 默认 JPEG")
+    parser.add_argument("--preset", default=DEFAULT_PRESET, type=str.lower, choices=ENCODER_PRESETS,
+                        help=f"编码预设: fastest 最快 / balanced 均衡 / smallest 文件最小 (画质相同), 默认 {DEFAULT_PRESET}")
+    parser.add_argument("--renditions", type=parse_renditions,
+                        help='一次输出多种规格 (JSON 列表或 @文件), 例如 '
+                             '\'[{"width":150,"format":"JPEG"}, {"scale":0.5,"format":"PNG"}]\', '
+                             '指定后忽略 --scale/--size/--format; 每种规格可以用 "preset" 指定自己的编码预设')
+    parser.add_argument("--resample", default="bicubic", type=str.lower, choices=RESAMPLE_FILTERS,
+                        help="重采样滤镜, 默认 bicubic")
+    parser.add_argument("--reducing-gap", type=parse_reducing_gap, default=DEFAULT_REDUCING_GAP,
+                        help=f"快速缩小间隔, 越小越快, 0 表示关闭, 默认 {DEFAULT_REDUCING_GAP}")
+    parser.add_argument("-w", "--workers", type=parse_workers, default=default_workers(),
+                        help="并发数, 默认为 CPU 核心数; auto 表示在运行中自动调整并按输入/输出位置记住")
+    parser.add_argument("--backend", choices=BACKENDS, default=default_backend(), help="执行后端")
+    parser.add_argument("-r", "--recursive", action="store_true", help="包含子文件夹, 输出时保留目录结构 (压缩包总是包含全部子文件夹)")
+    parser.add_argument("--force", action="store_true", help="忽略增量清单, 重新处理所有文件")
+    parser.add_argument("--hash", action="store_true",
+                        help="增量判断时, 修改时间变化的文件再比较内容哈希")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="相同内容的输入只处理一次, 其它文件的输出用硬链接 (link, 不支持时复制) 或复制 (copy) 生成; "
+                             "输出文件夹中会记住处理过的内容, 以后的批次也可以复用")
+    parser.add_argument("--max-in-flight", type=int, help="同时提交到执行池的最大任务数, 默认为并发数的 4 倍")
+    parser.add_argument("--summary", help="把结果汇总写入 JSON 文件 ('-' 表示标准输出)")
+    parser.add_argument("--no-prescan", action="store_true",
+                        help="不预扫描文件头, 按扫描顺序处理 (默认按像素数从大到小处理)")
+    parser.add_argument("--schedule-window", type=int,
+                        help="按成本排序的窗口大小 (文件数), 默认 10000")
+    parser.add_argument("--memory-budget", type=parse_memory_budget, default=default_memory_budget(),
+                        help="同时解码的图像估算内存上限, 例如 2GB, 0 表示不限制; 默认物理内存的一半")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS,
+                        help=f"预读输入文件的线程数, 0 表示由工作进程自己读取, 默认 {DEFAULT_READERS}")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS,
+                        help=f"写出输出文件的线程数, 0 表示由工作进程自己写出, 默认 {DEFAULT_WRITERS}")
+    parser.add_argument("--prefetch", type=parse_memory_budget, default=DEFAULT_PREFETCH_BYTES,
+                        help="已预读、尚未处理完的输入文件字节数上限, 例如 512MB, 0 表示不限制; "
+                             "默认 256MB")
+    parser.add_argument("--stream-threshold", type=parse_stream_threshold, default=DEFAULT_STREAM_THRESHOLD,
+                        help=f"超过这个像素数 (百万) 的图像按条带流式缩放, 0 表示关闭, "
+                             f"默认 {DEFAULT_STREAM_THRESHOLD // 1_000_000}")
+    parser.add_argument("--stats", help="记录各阶段用时并写入报告 (.json 或 .csv)")
+    parser.add_argument("--watch", action="store_true",
+                        help="持续监视输入文件夹, 处理新放入或修改过的图片, 按 Ctrl+C 停止")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"监视时扫描输入文件夹的间隔 (秒), 默认 {DEFAULT_INTERVAL}")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help=f"监视时文件大小保持不变多久 (秒) 才认为已经写完, 默认 {DEFAULT_SETTLE}")
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument("--shard", type=parse_shard_arg, metavar="i/N",
+                             help="多台机器分担: 只处理按相对路径哈希分到第 i 片 (共 N 片) 的文件")
+    shard_group.add_argument("--claim", action="store_true",
+                             help="多台机器分担: 在共享的输出文件夹中认领文件, 快的机器处理得多")
+    parser.add_argument("--claim-timeout", type=float, default=DEFAULT_CLAIM_TIMEOUT,
+                        help=f"认领超过这么多秒没有更新时 (节点崩溃) 由其它节点接管, 默认 {DEFAULT_CLAIM_TIMEOUT:g}")
+    parser.add_argument("--resume", action="store_true",
+                        help="读取输出文件夹中的断点续传日志, 跳过上次已经完成的文件 (中断或崩溃后继续)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文件的处理信息")
+    parser.add_argument("--log-file", help="把日志写入 JSON 行文件 (按大小轮转, 包含每个文件的处理记录)")
+    parser.add_argument("--log-sample", type=int, default=1,
+                        help="每个文件的处理记录每 N 条只保留一条 (警告和错误全部保留), 默认 1")
+    return parser
+
+
+def setup_logging(verbose, log_file=None, sample_every=1):
+    """日志由写日志线程输出; 不需要每个文件的记录时 DEBUG 日志在调用处就被跳过"""
+    handlers = [console_handler(logging.DEBUG if verbose else logging.INFO)]
+    if log_file:
+        handlers.append(json_file_handler(log_file))
+    setup_async_logging(handlers, logging.DEBUG if verbose or log_file else logging.INFO, sample_every)
+    return logging.getLogger("ImageProcessor")
+
+
+def build_job(args):
+    options = dict(output_format=args.format, resample=args.resample, reducing_gap=args.reducing_gap,
+                   recursive=args.recursive, incremental=not args.force, verify_hash=args.hash,
+                   renditions=args.renditions or (), collect_stats=bool(args.stats),
+                   stream_threshold=args.stream_threshold, dedup=args.dedup or "", encoder_preset=args.preset)
+    if args.size:
+        width, height = args.size
+        return JobSpec(args.input, args.output, RESIZE_SIZE, width=width, height=height, **options)
+    return JobSpec(args.input, args.output, RESIZE_SCALE, scale=args.scale, **options)
+
+
+def write_summary(path, summary):
+    text = json.dumps(summary.to_dict(), ensure_ascii=False, indent=2)
+    if path == "-":
+        print(text)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def watch(engine, job, args, run_options):
+    """监视模式: 一直运行到 Ctrl+C 或 SIGTERM, 返回各批累计的汇总"""
+    from .engine import BatchSummary
+    from .stats import StageStats
+    from .watch import watch_folder
+
+    total = BatchSummary(stats=StageStats() if job.collect_stats else None)
+
+    def add_batch(summary):
+        for name in ("total", "succeeded", "failed", "skipped", "elapsed", "decodes_saved", "encodes_saved"):
+            setattr(total, name, getattr(total, name) + getattr(summary, name))
+        total.errors.extend(summary.errors)
+
+    # 作为服务运行时 SIGTERM 处理完当前这一批再退出
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        watch_folder(engine, job, stop, args.poll_interval, args.settle, on_batch=add_batch, stats=total.stats,
+                     **run_options)
+    except KeyboardInterrupt:
+        logging.getLogger("ImageProcessor").info("已停止监视")
+    return total
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logger = setup_logging(args.verbose, args.log_file, max(1, args.log_sample))
+
+    if not (os.path.isdir(args.input) or is_archive(args.input) and os.path.isfile(args.input)):
+        logger.error(f"输入文件夹不存在: {args.input}")
+        return 2
+    if args.watch and (not os.path.isdir(args.input) or is_archive(args.output)):
+        logger.error("监视模式的输入和输出都必须是文件夹")
+        return 2
+    if args.claim and is_archive(args.output):
+        logger.error("--claim 需要输出到 (共享的) 文件夹")
+        return 2
+    if is_archive(args.output):
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+
+    # 引擎依赖 PIL, 在参数检查之后再导入
+    from .engine import BatchEngine
+
+    engine = BatchEngine(args.backend, args.workers, args.max_in_flight, prescan=not args.no_prescan,
+                         schedule_window=args.schedule_window, memory_budget=args.memory_budget,
+                         readers=args.readers, writers=args.writers, prefetch_bytes=args.prefetch)
+    job = build_job(args)
+    run_options = {}
+    sharder = None
+    if args.shard:
+        sharder = StaticShard(*args.shard)
+    elif args.claim:
+        sharder = ClaimBoard(args.output, job.fingerprint(), args.claim_timeout)
+        if args.resume:
+            logger.info("动态认领不使用断点续传日志, 已完成的文件由认领的完成标记跳过")
+        if args.schedule_window is None:
+            # 只提前认领马上要处理的文件, 其余的留给其它节点
+            engine.schedule_window = engine.max_in_flight
+    if sharder is not None:
+        job = replace(job, manifest_name=sharder.manifest_name, node=sharder.node)
+        run_options = dict(select=sharder.select, on_result=sharder.finished)
+    try:
+        if args.watch:
+            summary = watch(engine, job, args, run_options)
+        else:
+            summary = engine.run(job, resume=args.resume, **run_options)
+    finally:
+        engine.shutdown()
+        if sharder is not None:
+            sharder.close()
+
+    logger.info(f"完成: 共 {summary.total} 个, 成功 {summary.succeeded} 个, 失败 {summary.failed} 个, "
+                f"跳过 {summary.skipped} 个, 用时 {summary.elapsed:.2f} 秒")
+    if args.claim:
+        logger.info(f"认领: 处理 {sharder.claimed} 个 (其中接管超时的 {sharder.reclaimed} 个), "
+                    f"其它节点已完成 {sharder.done_elsewhere} 个, 之前失败且输入未变化 {sharder.failed_elsewhere} 个")
+    if summary.decodes_saved:
+        logger.info(f"去重: 内容重复 {summary.decodes_saved} 个, 节省解码 {summary.decodes_saved} 次、"
+                    f"编码 {summary.encodes_saved} 次")
+    if args.summary:
+        write_summary(args.summary, summary)
+    if args.stats:
+        summary.stats.save(args.stats)
+    return 1 if summary.failed else 0
@@ -0,0 +1,65 @@
+"""编码预设: fastest / balanced / smallest 对应各输出格式的保存参数
+
+编码 (尤其是 PNG 的 zlib 压缩) 往往是单张图片处理中最慢的一步。balanced (默认) 不传任何参数,
+输出与加入预设之前完全相同; fastest 和 smallest 只改变压缩方式, 不改变画质: JPEG 的质量和
+色度抽样保持 Pillow 的默认值, optimize / progressive 只影响文件大小, 解码出来的像素完全相同。
+"""
+
+# 格式 -> 预设 -> Image.save 的参数
+ENCODER_OPTIONS = {
+    "JPEG": {
+        "fastest": {},
+        "balanced": {},
+        "smallest": {"optimize": True, "progressive": True},
+    },
+    "PNG": {
+        "fastest": {"compress_level": 1},
+        "balanced": {},
+        "smallest": {"compress_level": 9},
+    },
+    "GIF": {
+        "fastest": {},
+        "balanced": {},
+        "smallest": {"optimize": True},
+    },
+    "BMP": {
+        "fastest": {},
+        "balanced": {},
+        "smallest": {},
+    },
+    "TIFF": {
+        "fastest": {},
+        "balanced": {},
+        "smallest": {"compression": "tiff_adobe_deflate"},
+    },
+}
+
+# 各格式能直接保存的模式, 其它模式先转换 (例如 GIF 的 P 模式不能直接保存为 JPEG)
+SAVE_MODES = {
+    "JPEG": ("L", "RGB", "CMYK"),
+    "BMP": ("1", "L", "P", "RGB", "RGBA"),
+    "PNG": ("1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA"),
+}
+
+
+def encoder_options(output_format, preset):
+    return ENCODER_OPTIONS[output_format][preset]
+
+
+def convert_for_format(img, output_format):
+    """转换为 output_format 能保存的模式, 不需要转换时返回 img 本身"""
+    modes = SAVE_MODES.get(output_format)
+    if modes is None or img.mode in modes:
+        return img
+    has_alpha = "A" in img.mode or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha and "RGBA" in modes else "RGB")
+
+
+def save_image(img, fp, output_format, preset):
+    """按预设的参数把图像保存到 fp (文件名或文件对象)"""
+    converted = convert_for_format(img, output_format)
+    try:
+        converted.save(fp, format=output_format, **encoder_options(output_format, preset))
+    finally:
+        if converted is not img:
+            converted.close()
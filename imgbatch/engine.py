@@ -0,0 +1,626 @@
+"""批处理引擎: 不依赖 Tk, 界面和命令行都通过它处理图片"""
+import heapq
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields, replace
+
+from .archives import ArchiveMember, ArchiveWriter, is_archive, iter_archive, write_to_archive
+from .autotune import TuningStore, WorkerTuner, tuning_key
+from .executors import AUTO_WORKERS, auto_worker_limit, create_executor, default_backend, default_workers
+from .job import ImageResult
+from .journal import Journal
+from .manifest import Manifest, bytes_digest
+from .memory import estimate_working_set, format_size
+from .pipeline import (DEFAULT_PREFETCH_BYTES, DEFAULT_READERS, DEFAULT_WRITERS, StageQueue, link_outputs,
+                       read_input, write_outputs)
+from .prescan import WorkItem, probe
+from .progress import ProgressTracker
+from .scanner import same_folder, scan_images
+from .stats import StageStats
+from .worker import process_single_image
+
+logger = logging.getLogger("ImageProcessor.engine")
+
+
+# 每个工作进程/线程最多排队的任务数, 限制同时存在的 future 数量
+IN_FLIGHT_PER_WORKER = 4
+# 按成本排序的窗口: 最多这么多个已扫描、未派发的文件参与排序
+DEFAULT_SCHEDULE_WINDOW = 10000
+# 每轮循环最多扫描的文件数, 保证扫描大目录时也能及时派发和收集结果
+SCAN_BATCH = 64
+# 预扫描 (读取文件头) 的线程数, 以及同时在预扫描中的文件数上限
+PROBE_WORKERS = 4
+PROBE_IN_FLIGHT = PROBE_WORKERS * 8
+
+
+@dataclass
+class BatchSummary:
+    """一次批处理的结果汇总"""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+    decodes_saved: int = 0  # 去重: 与其它输入内容相同、没有解码的文件数
+    encodes_saved: int = 0  # 去重: 由已有结果链接/复制而来、没有编码的输出数
+    stats: object = field(default=None, repr=False)  # StageStats, 只在 job.collect_stats 时记录
+    queues: dict = field(default_factory=dict)  # 流水线各阶段的队列深度: 当前/峰值/平均
+    workers: int = 0  # 自动并发: 选定的同时处理任务数 (还没有完成一个测量窗口时为当时的值)
+
+    def to_dict(self):
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "stats"}
+        if self.stats is not None:
+            data["stats"] = self.stats.to_dict()
+        return data
+
+
+class BatchEngine:
+    """持有执行池并运行批处理任务
+
+    执行池在第一次运行时创建, 之后的批次复用, 避免每次都重新启动子进程。
+    同时提交到执行池的任务数不超过 max_in_flight, 目录再大内存占用也保持平稳。
+    prescan 为 True 时先在线程池中读取文件头估算成本, 按成本从大到小派发 (LPT);
+    排序只在最多 schedule_window 个已预扫描、未派发的文件之间进行。
+    memory_budget (字节) 限制同时处理的任务估算工作集之和; 超过预算的单个大图只在
+    没有其它任务时运行, 并且运行期间不再派发其它任务。None 表示不限制。
+
+    处理分为三段流水线: readers 个线程预读输入文件 (已预读未处理完的字节数不超过
+    prefetch_bytes, None 表示不限制), 工作进程从内存解码、编码到内存, writers 个线程
+    把输出写入临时文件再改名。readers / writers 为 0 时由工作进程自己读 / 写。
+
+    job.input_dir 也可以是 ZIP / TAR 压缩包, 其中的图片按存档顺序读入内存后直接处理 (已读入、
+    未处理完的字节数同样不超过 prefetch_bytes); job.output_dir 是压缩包时, 输出由一个线程按输入的
+    顺序写入这个压缩包, 此时不做增量跳过和去重。
+
+    max_workers 为 AUTO_WORKERS 时执行池按 auto_worker_limit() 创建, 每次运行中由 WorkerTuner
+    调整同时派发的任务数, 选定的值按输入/输出位置记住, 下次从它开始 (见 autotune.py)。
+    """
+
+    def __init__(self, backend=None, max_workers=None, max_in_flight=None, prescan=True, schedule_window=None,
+                 memory_budget=None, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS,
+                 prefetch_bytes=DEFAULT_PREFETCH_BYTES):
+        self.backend = backend or default_backend()
+        self.auto_workers = max_workers == AUTO_WORKERS
+        self.max_workers = auto_worker_limit() if self.auto_workers else max_workers or default_workers()
+        self.tuning_store = TuningStore() if self.auto_workers else None
+        self.max_in_flight = max_in_flight or self.max_workers * IN_FLIGHT_PER_WORKER
+        self.prescan = prescan
+        self.schedule_window = max(1, schedule_window or DEFAULT_SCHEDULE_WINDOW)
+        self.memory_budget = memory_budget
+        self.readers = readers
+        self.writers = writers
+        self.prefetch_bytes = prefetch_bytes
+        self.executor = None
+        self.probe_executor = None
+        self.reader_executor = None
+        self.writer_executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            workers = f"自动 (上限 {self.max_workers})" if self.auto_workers else self.max_workers
+            logger.info(f"创建执行池: 后端={self.backend}, 并发数={workers}")
+            self.executor = create_executor(self.backend, self.max_workers)
+        return self.executor
+
+    def discard_executor(self, executor):
+        """工作进程异常退出后执行池不能再用: 丢弃它, 下次派发时重新创建"""
+        if self.executor is executor:
+            logger.warning("执行池已损坏 (工作进程异常退出), 下次派发时重新创建")
+            executor.shutdown(wait=False)
+            self.executor = None
+
+    def create_tuner(self, job):
+        """自动并发时从上次为这个位置选定的值 (没有时从核心数的一半) 开始调整"""
+        if not self.auto_workers:
+            return None
+        start = self.tuning_store.get(tuning_key(job, self.backend)) or max(1, default_workers() // 2)
+        logger.info(f"自动并发: 从 {start} 个任务开始 (上限 {self.max_workers})")
+        return WorkerTuner(self.max_workers, start)
+
+    def get_probe_executor(self):
+        """预扫描只读文件头, 以 I/O 为主, 用线程池即可"""
+        if self.probe_executor is None:
+            self.probe_executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="prescan")
+        return self.probe_executor
+
+    def get_reader_executor(self):
+        if self.reader_executor is None:
+            # readers 为 0 时仍然需要一个线程计算去重用的哈希
+            self.reader_executor = ThreadPoolExecutor(max_workers=max(1, self.readers), thread_name_prefix="reader")
+        return self.reader_executor
+
+    def get_writer_executor(self):
+        if self.writer_executor is None:
+            self.writer_executor = ThreadPoolExecutor(max_workers=max(1, self.writers), thread_name_prefix="writer")
+        return self.writer_executor
+
+    def run(self, job, files=None, on_result=None, progress=None, stats=None, select=None, resume=False):
+        """处理 job 指定的输入文件夹, 阻塞到所有图像处理完成
+
+        files 为 None 时边扫描输入文件夹边处理 (job.recursive 决定是否包含子文件夹);
+        job.incremental 为 True 时跳过增量清单中未变化的文件;
+        progress (ProgressTracker) 随扫描和处理更新计数, 其它线程可以随时读取快照;
+        on_result 在每个图像完成 (或跳过) 后以 ImageResult 调用 (在调用 run 的线程中运行)。
+        job.collect_stats 为 True 时各阶段用时汇总到 stats (StageStats, 不传时新建), 见 summary.stats。
+        select(相对路径, stat) 返回 False 的文件不处理也不计入总数 (分片运行时由其它节点处理, 见 shard.py)。
+        每个文件的结果都追加到输出文件夹中的断点续传日志 (journal.py); resume 为 True 时读取上次的日志,
+        已完成的文件直接跳过 (不再 stat), 否则清空日志重新开始 (指定 files 时只追加)。
+        输出为压缩包或动态认领 (job.node) 时不记录。
+        """
+        start = time.perf_counter()
+        # 指定了文件列表 (监视模式的一批) 时接着之前的日志追加
+        append = files is not None
+        if is_archive(job.output_dir) and (job.incremental or job.dedup):
+            # 输出压缩包每次重新生成: 没有可以跳过的旧输出, 也不能用硬链接去重
+            if job.dedup:
+                logger.info("输出为压缩包, 不使用去重")
+            job = replace(job, incremental=False, dedup="")
+        if files is None:
+            if is_archive(job.input_dir):
+                files = iter_archive(job.input_dir)
+            else:
+                files = scan_images(job.input_dir, job.recursive, exclude=[job.output_dir])
+        batch = _BatchRun(self, job, progress if progress is not None else ProgressTracker(), on_result, select,
+                          resume, append)
+        if job.collect_stats:
+            batch.summary.stats = stats if stats is not None else StageStats()
+        try:
+            batch.execute(iter(files))
+            batch.completed = True
+        finally:
+            batch.close()
+        batch.summary.elapsed = time.perf_counter() - start
+        return batch.summary
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self.executor = None
+        if self.probe_executor is not None:
+            self.probe_executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self.probe_executor = None
+        self.shutdown_io(wait, cancel_futures)
+
+    def shutdown_io(self, wait=True, cancel_futures=False):
+        """关闭读取/写出线程池 (修改 readers / writers 后下次运行时重新创建)"""
+        if self.reader_executor is not None:
+            self.reader_executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self.reader_executor = None
+        if self.writer_executor is not None:
+            self.writer_executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self.writer_executor = None
+
+
+class _BatchRun:
+    """一次 run() 的状态, 全部在调用 run 的线程中协调:
+    扫描 -> 预扫描 -> 按成本排序 -> 预读 -> 派发给工作进程 -> 写出 -> 收集结果"""
+
+    def __init__(self, engine, job, progress, on_result, select=None, resume=False, append=False):
+        self.engine = engine
+        self.job = job
+        self.progress = progress
+        self.on_result = on_result
+        self.select = select
+        self.summary = BatchSummary()
+        # 输出为压缩包时没有增量清单, 输出由唯一的写出线程按输入顺序写入
+        self.archive = ArchiveWriter(job.output_dir) if is_archive(job.output_dir) else None
+        self.archive_executor = None
+        if self.archive is not None:
+            self.archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self.manifest = None
+        if self.archive is None:
+            self.manifest = Manifest(job.output_dir, job.verify_hash, job.manifest_name, shared=job.node is not None)
+        # 动态认领时已完成的文件由认领的完成标记跳过, 不需要日志
+        self.journal = Journal(job, resume, append) if self.archive is None and job.node is None else None
+        self.reads_archive = is_archive(job.input_dir)
+        # 输出到输入文件夹时, 扫描会看到本任务生成的输出: 清单中记录的和正在处理的文件的输出都跳过
+        self.same_folder = self.manifest is not None and same_folder(job.input_dir, job.output_dir)
+        # 已发现、还没有结果的文件的输出 (规范化的相对路径) -> 输入; 有了结果之后由清单记录,
+        # 只有在途的文件留在内存中
+        self.claimed_outputs = {}
+        # 输出压缩包没有清单: 不含扩展名的相对路径 -> 第一个这样命名的输入 (压缩包写出时本来也要记住所有文件名)
+        self.stems = {} if self.archive is not None else None
+        self.tuner = engine.create_tuner(job)
+        self.completed = False
+        self.params = job.fingerprint()
+        self.scanning = True
+        self.probing = {}  # 预扫描 future -> WorkItem
+        self.ready = []    # 已预扫描、等待派发的任务: (-成本, 序号, WorkItem) 的堆
+        self.reading = {}  # 预读 future -> WorkItem
+        self.loaded = deque()  # 已预读、等待派发的 (WorkItem, 文件内容)
+        self.pending = {}  # 处理 future -> WorkItem
+        self.pools = {}    # 处理 future -> 提交到的执行池 (工作进程异常退出时只丢弃损坏的那个)
+        self.writing = {}  # 写出 (或去重链接) future -> WorkItem
+        self.leaders = {}  # 内容哈希 -> (正在处理的 WorkItem, [内容相同、等它处理完的 (WorkItem, 内容)])
+        self.sequence = 0
+        self.order = 0  # 下一个压缩包成员的顺序号
+        self.unwritten = {}  # 顺序号 -> (WorkItem, ImageResult): 处理完、等待按顺序写入输出压缩包
+        self.next_order = 0
+        self.memory_in_use = 0  # 在途任务的估算工作集之和
+        self.prefetched = 0  # 已预读 (或正在预读)、尚未处理完的字节数
+        self.queues = {"read": StageQueue(), "cpu": StageQueue(), "write": StageQueue()}
+
+    def execute(self, files):
+        engine = self.engine
+        while True:
+            # 1. 继续扫描, 把新文件交给预扫描 (每轮最多 SCAN_BATCH 个, 尽快开始派发)
+            if self.scanning:
+                for _ in range(SCAN_BATCH):
+                    if not self._can_scan():
+                        break
+                    filename = next(files, None)
+                    if filename is None:
+                        self.scanning = False
+                        self.progress.scan_complete()
+                        break
+                    self._discover(filename)
+
+            # 2. 按成本从大到小预读, 预读的字节数不超过 prefetch_bytes
+            while self.ready and self._can_prefetch(self.ready[0][2]):
+                _, _, item = heapq.heappop(self.ready)
+                self._prefetch(item)
+
+            # 3. 派发给工作进程, 在途任务不超过 max_in_flight (背压), 工作集不超过内存预算;
+            # 自动并发时在途任务数就是同时处理的任务数 (执行池按需启动工作进程, 不会多于在途任务)
+            limit = self.tuner.active if self.tuner is not None else engine.max_in_flight
+            while self.loaded and len(self.pending) < limit and self._admit(self.loaded[0][0]):
+                item, data = self.loaded.popleft()
+                self.memory_in_use += item.memory
+                future = self._submit(item, data)
+                self.pending[future] = item
+            if self.tuner is not None and self.loaded and len(self.pending) < limit:
+                self.tuner.memory_blocked()
+            self._update_queues()
+
+            if not (self.scanning or self.probing or self.ready or self.reading or self.loaded or self.pending
+                    or self.writing):
+                break
+
+            # 4. 等待任意一段完成; 还能继续扫描时不阻塞
+            done, _ = wait([*self.probing, *self.reading, *self.pending, *self.writing],
+                           timeout=0 if self._can_scan() else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in self.probing:
+                    self._ready(self.probing.pop(future))
+                elif future in self.reading:
+                    self._loaded(future)
+                elif future in self.pending:
+                    self._collect(future)
+                else:
+                    self._finish(self.writing.pop(future), future.result())
+
+    def _submit(self, item, data):
+        args = (process_single_image, self.job, item.filename, data, not (self.engine.writers or self.archive))
+        executor = self.engine.get_executor()
+        try:
+            future = executor.submit(*args)
+        except BrokenExecutor:
+            # 执行池在上次收集结果之后才损坏
+            self.engine.discard_executor(executor)
+            executor = self.engine.get_executor()
+            future = executor.submit(*args)
+        self.pools[future] = executor
+        return future
+
+    def _admit(self, item):
+        """内存预算: 放得进预算时派发; 超过预算的大图等到没有其它任务时单独运行"""
+        budget = self.engine.memory_budget
+        if budget is None or not self.pending:
+            if budget is not None and item.memory > budget:
+                logger.warning(f"{item.filename} 估算需要 {format_size(item.memory)} 内存, "
+                               f"超过预算 {format_size(budget)}, 单独处理")
+            return True
+        # 队首的大图放不进去时先不派发更小的任务, 避免大图一直等待
+        return self.memory_in_use + item.memory <= budget
+
+    def _reads_ahead(self, item):
+        """分条缩放的图像和单个就超过预读上限的文件不整个读入内存, 由工作进程自己读取"""
+        limit = self.engine.prefetch_bytes
+        return self.engine.readers and not item.streamed and (limit is None or item.stat.st_size <= limit)
+
+    def _can_prefetch(self, item):
+        """预读深度不超过 max_in_flight, 预读的字节数不超过 prefetch_bytes"""
+        if len(self.reading) + len(self.loaded) >= self.engine.max_in_flight:
+            return False
+        if item.data is not None or not self._reads_ahead(item) or self.engine.prefetch_bytes is None:
+            return True
+        return self.prefetched + item.stat.st_size <= self.engine.prefetch_bytes
+
+    def _prefetch(self, item):
+        if item.data is not None:
+            # 压缩包中的文件在扫描时已经读入内存
+            data, item.data = item.data, None
+            self._queue(item, data)
+            return
+        keep = self._reads_ahead(item)
+        # 去重和增量清单比较哈希都需要内容哈希: 在读取线程中顺便计算, 清单记录时不再读一遍
+        need_digest = bool(self.job.dedup or self.job.verify_hash)
+        if not keep and not need_digest:
+            self.loaded.append((item, None))
+            return
+        if keep:
+            item.prefetched = item.stat.st_size
+            self.prefetched += item.prefetched
+        # 需要哈希时不预读内容的文件也在读取线程中计算
+        future = self.engine.get_reader_executor().submit(read_input, item.input_path, keep, need_digest)
+        self.reading[future] = item
+
+    def _loaded(self, future):
+        item = self.reading.pop(future)
+        try:
+            data, item.read_time, item.digest = future.result()
+        except OSError as e:
+            self.prefetched -= item.prefetched
+            self._record_result(ImageResult(item.filename, False, error=f"读取文件 {item.filename} 失败: {e}"),
+                                item.cost)
+            return
+        self._queue(item, data)
+
+    def _queue(self, item, data):
+        """已读入内存 (或由工作进程自己读取) 的文件: 去重后等待派发"""
+        if self.job.dedup and item.digest is not None and self._deduplicate(item, data):
+            return
+        self.loaded.append((item, data))
+
+    def _deduplicate(self, item, data):
+        """相同内容以前处理过 (清单中) 或本批次正在处理时返回 True, 不再派发给工作进程
+
+        不跳过未变化的文件 (--force) 时不复用以前批次的输出, 全部重新生成;
+        以前的输出就是本文件自己的输出时也不复用 (输出可能已经损坏, 而且算不上节省了解码)。
+        """
+        sources = self.manifest.find_content(item.digest, self.params) if self.job.incremental else None
+        if sources is not None and not set(sources) & set(self.job.output_names(item.filename)):
+            self._release(item)
+            self._link(item, sources)
+            return True
+        leader = self.leaders.get(item.digest)
+        if leader is not None:
+            # 领头的文件处理失败时跟随的文件要自己处理: 压缩包中的文件没有路径可以重新读取, 保留内容
+            if not self.reads_archive:
+                self._release(item)
+                data = None
+            leader[1].append((item, data))
+            return True
+        self.leaders[item.digest] = (item, [])
+        return False
+
+    def _release(self, item):
+        """不再需要预读的内容"""
+        self.prefetched -= item.prefetched
+        item.prefetched = 0
+
+    def _link(self, item, sources):
+        self.writing[self.engine.get_writer_executor().submit(link_outputs, self.job, item.filename, sources)] = item
+
+    def _can_scan(self):
+        if self.reads_archive and self.engine.prefetch_bytes is not None:
+            # 压缩包中的文件扫描时就读入内存, 已读入、未处理完的字节数不超过预读上限
+            if self.prefetched >= self.engine.prefetch_bytes:
+                return False
+        return (self.scanning and len(self.probing) < PROBE_IN_FLIGHT
+                and len(self.probing) + len(self.ready) < self.engine.schedule_window)
+
+    def _discover(self, filename):
+        if isinstance(filename, ArchiveMember):
+            self._discover_member(filename)
+            return
+        if self.same_folder and self._is_output(filename):
+            return
+        if self._journaled(filename):
+            return
+        input_path = os.path.join(self.job.input_dir, filename)
+        try:
+            st = os.stat(input_path)
+        except OSError as e:
+            self.summary.total += 1
+            self.progress.discovered()
+            self._record_result(ImageResult(filename, False, error=f"读取文件 {filename} 失败: {e}"))
+            return
+        if self.select is not None and not self.select(filename, st):
+            return
+        self.summary.total += 1
+        self.progress.discovered()
+        if self._collides(filename):
+            return
+        if self.job.incremental and self.manifest.is_up_to_date(filename, input_path, st, self.params):
+            self._record_result(ImageResult(filename, True, self.job.output_names(filename), skipped=True))
+            return
+        item = WorkItem(filename, input_path, st)
+        self._probe(item)
+
+    def _discover_member(self, member):
+        """压缩包中的文件: 内容已经读入内存, 不需要 stat 和预读"""
+        if self._journaled(member.name) or self.select is not None and not self.select(member.name, member.stat):
+            return
+        self.summary.total += 1
+        self.progress.discovered()
+        if self._collides(member.name):
+            return
+        input_path = os.path.join(self.job.input_dir, member.name)
+        digest = bytes_digest(member.data) if self.job.dedup or self.job.verify_hash else None
+        if self.job.incremental and self.manifest.is_up_to_date(member.name, input_path, member.stat, self.params,
+                                                                digest):
+            self._record_result(ImageResult(member.name, True, self.job.output_names(member.name), skipped=True))
+            return
+        item = WorkItem(member.name, input_path, member.stat, prefetched=len(member.data),
+                        read_time=member.read_time, digest=digest, data=member.data, order=self.order)
+        self.order += 1
+        self.prefetched += item.prefetched
+        self._probe(item)
+
+    def _is_output(self, filename):
+        """输出到输入文件夹时: filename 是清单中记录的或正在处理的文件的输出"""
+        return os.path.normcase(filename) in self.claimed_outputs or self.manifest.output_owner(filename) is not None
+
+    def _collides(self, filename):
+        """与另一个输入输出到同一个文件 (例如 a.jpg 和 a.png 都输出为 a.jpeg) 时报告错误并返回 True
+
+        先处理的输入 (正在处理的, 或者清单中记录的、仍然存在的) 保留, 不覆盖它的输出; 输出到文件夹
+        和压缩包时一样, 监视模式的各批之间也一样。没有冲突时记下本文件的输出, 有结果时再去掉。
+        """
+        outputs = self.job.output_names(filename)
+        if self.stems is not None:
+            owner = self.stems.setdefault(os.path.normcase(os.path.splitext(filename)[0]), filename)
+            owner = owner if owner != filename else None
+        else:
+            owner = next(filter(None, (self._output_owner(filename, output) for output in outputs)), None)
+        if owner is not None:
+            self._record_result(ImageResult(filename, False, error=f"{filename} 与 {owner} 输出到同一个文件 "
+                                                                   f"({', '.join(outputs)}), 只处理 {owner}"))
+            return True
+        if self.stems is None:
+            self.claimed_outputs.update((os.path.normcase(output), filename) for output in outputs)
+        return False
+
+    def _output_owner(self, filename, output):
+        """生成 output 的另一个输入, 没有时返回 None"""
+        owner = self.claimed_outputs.get(os.path.normcase(output))
+        if owner is None:
+            owner = self.manifest.output_owner(output)
+            # 清单中的输入已经删除时不算冲突 (压缩包中的文件没有路径可以检查)
+            if owner is not None and not self.reads_archive and not os.path.exists(
+                    os.path.join(self.job.input_dir, owner)):
+                owner = None
+        return owner if owner != filename else None
+
+    def _journaled(self, filename):
+        """续传时日志中已完成的文件直接记为跳过"""
+        if self.journal is None or filename not in self.journal.done:
+            return False
+        self.summary.total += 1
+        self.progress.discovered()
+        self._record_result(ImageResult(filename, True, self.job.output_names(filename), skipped=True))
+        return True
+
+    def _probe(self, item):
+        if self.engine.prescan or self.engine.memory_budget is not None:
+            self.probing[self.engine.get_probe_executor().submit(probe, item, self.job)] = item
+        else:
+            self._ready(item)
+
+    def _update_queues(self):
+        """各阶段的队列深度: 读取中, 等待派发 + 处理中, 写出中"""
+        depths = (len(self.reading), len(self.loaded) + len(self.pending), len(self.writing) + len(self.unwritten))
+        for queue, depth in zip(self.queues.values(), depths):
+            queue.update(depth)
+        self.progress.set_queues(*depths)
+
+    def _ready(self, item):
+        item.memory = estimate_working_set(item, self.job)
+        self.progress.add_pixels(item.cost)
+        self.sequence += 1
+        # 成本相同 (或未预扫描) 时保持扫描顺序; 输出压缩包按输入顺序写入, 也按输入顺序派发,
+        # 避免先处理完的结果长时间留在内存中等待
+        heapq.heappush(self.ready, (item.order if self.archive else -item.cost, self.sequence, item))
+
+    def _collect(self, future):
+        item = self.pending.pop(future)
+        executor = self.pools.pop(future)
+        self.memory_in_use -= item.memory
+        self.prefetched -= item.prefetched
+        if self.tuner is not None:
+            self.tuner.record(item.cost)
+        try:
+            result = future.result()
+        except BrokenExecutor as e:
+            # 工作进程崩溃 (例如解码器段错误或被 OOM 杀掉): 同一执行池中在途的任务都失败,
+            # 无法判断是哪一个引起的, 全部报告为失败; 执行池重新创建, 批次继续
+            self.engine.discard_executor(executor)
+            result = ImageResult(item.filename, False, error=f"处理 {item.filename} 时工作进程异常退出: {e}")
+        if result.timings is not None and item.read_time is not None:
+            result = replace(result, timings={"read": item.read_time, **result.timings})
+        if self.archive is not None:
+            self.unwritten[item.order] = (item, result)
+            self._write_archive()
+            return
+        if result.ok and result.encoded:
+            self.writing[self.engine.get_writer_executor().submit(write_outputs, self.job, result)] = item
+            return
+        self._finish(item, result)
+
+    def _write_archive(self):
+        """按输入顺序把结果交给压缩包写出线程; 前面的文件还没处理完时, 后面的结果先留在内存中"""
+        while self.next_order in self.unwritten:
+            item, result = self.unwritten.pop(self.next_order)
+            self.next_order += 1
+            if result.ok and result.encoded:
+                self.writing[self.archive_executor.submit(write_to_archive, self.archive, result)] = item
+            else:
+                self._finish(item, result)
+
+    def _finish(self, item, result):
+        if result.ok and self.manifest is not None:
+            self.manifest.record(item.filename, item.input_path, item.stat, self.params, result.outputs, item.digest)
+            if self.job.dedup and item.digest is not None and not result.deduplicated:
+                self.manifest.record_content(item.digest, self.params, result.outputs)
+        self._record_result(result, item.cost)
+
+        leader = self.leaders.get(item.digest) if item.digest is not None else None
+        if leader is not None and leader[0] is item:
+            del self.leaders[item.digest]
+            for follower, data in leader[1]:
+                if result.ok:
+                    self._release(follower)
+                    self._link(follower, result.outputs)
+                else:
+                    # 处理失败时内容相同的文件各自正常处理, 报告各自的错误
+                    self.loaded.append((follower, data))
+
+    def _record_result(self, result, pixels=0):
+        summary = self.summary
+        if self.claimed_outputs:
+            # 有了结果: 成功时输出已由清单记录
+            for output in self.job.output_names(result.filename):
+                if self.claimed_outputs.get(os.path.normcase(output)) == result.filename:
+                    del self.claimed_outputs[os.path.normcase(output)]
+        self.progress.record(result, pixels)
+        if self.journal is not None:
+            self.journal.record(result)
+        if summary.stats is not None and result.timings:
+            summary.stats.add(result.input_format, result.timings)
+        if result.deduplicated:
+            summary.decodes_saved += 1
+            summary.encodes_saved += len(result.outputs)
+        if result.skipped:
+            summary.skipped += 1
+        elif result.ok:
+            summary.succeeded += 1
+            # 每个文件一条结构化记录; 没有处理器接收 DEBUG 时连日志记录都不创建
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("已处理: %s (%s) -> %s", result.filename, result.input_format, ", ".join(result.outputs),
+                             extra={"file": result.filename, "stage": "process", "duration": round(result.elapsed, 6)})
+        else:
+            summary.failed += 1
+            summary.errors.append(result.error)
+            logger.error(result.error)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def close(self):
+        self.summary.queues = {name: queue.to_dict() for name, queue in self.queues.items()}
+        if self.engine.readers or self.engine.writers:
+            logger.info("流水线队列深度 (平均/峰值): " + ", ".join(
+                f"{label} {self.queues[name].mean():.1f}/{self.queues[name].peak}"
+                for name, label in (("read", "读取"), ("cpu", "处理"), ("write", "写出"))))
+        if self.archive is not None:
+            self.archive_executor.shutdown()
+            if self.completed:
+                self.archive.commit()
+                logger.info(f"已写入压缩包: {self.job.output_dir}")
+            else:
+                self.archive.abort()
+        if self.tuner is not None:
+            # 报告选定的值 (与记住的相同), 批次结束时 active 可能还是正在试探的值
+            self.summary.workers = self.tuner.chosen or self.tuner.active
+            if self.tuner.chosen is not None:
+                self.engine.tuning_store.put(tuning_key(self.job, self.engine.backend), self.tuner.chosen)
+                logger.info(f"自动并发: 记住 {self.tuner.chosen} 个任务, 下次处理这个位置时从它开始")
+        if self.journal is not None:
+            self.journal.close(self.completed)
+        if self.manifest is not None:
+            self.manifest.close()
+        self.progress.finish()
@@ -0,0 +1,51 @@
+"""可替换的执行后端: 线程池 / 进程池
+
+解码、缩放、编码都是 CPU 密集型操作, 在线程池中会互相争抢 GIL,
+因此多核机器上默认使用进程池。
+"""
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_PROCESSES = "processes"
+BACKEND_THREADS = "threads"
+BACKENDS = (BACKEND_PROCESSES, BACKEND_THREADS)
+# 并发数为 AUTO_WORKERS 时由引擎在运行中自动调整 (见 autotune.py)
+AUTO_WORKERS = "auto"
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def auto_worker_limit():
+    """自动调整时执行池的大小上限: 输入/输出在网络盘上时, 多于核心数的工作进程可以掩盖 I/O 等待"""
+    return default_workers() * 2
+
+
+def default_backend():
+    """多核机器默认使用进程池, 单核机器上进程池只有额外开销"""
+    return BACKEND_PROCESSES if default_workers() > 1 else BACKEND_THREADS
+
+
+def process_context():
+    """子进程的启动方式
+
+    预扫描线程和界面线程运行时再 fork 出的子进程可能继承被其他线程持有的锁而卡死,
+    POSIX 上改用 forkserver (从单线程的服务进程 fork); Windows/macOS 默认已是 spawn。
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def create_executor(backend=None, max_workers=None):
+    backend = backend or default_backend()
+    max_workers = max_workers or default_workers()
+    if backend == BACKEND_PROCESSES:
+        # 进程池模块在第一次创建时才导入 (约 10 毫秒), 不拖慢界面启动
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=process_context())
+    if backend == BACKEND_THREADS:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    raise ValueError(f"未知的执行后端: {backend}")
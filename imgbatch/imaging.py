@@ -0,0 +1,11 @@
+"""Pillow 的入口: 只注册工具支持的五种格式
+
+Image.open / save 第一次遇到未注册的格式时会调用 Image.init(), 导入 Pillow 自带的四十多个
+格式插件 (冷启动时约 0.2 秒, 打包成单个可执行文件后更慢)。这里只导入 JPEG、PNG、GIF、BMP、
+TIFF 的插件, 并告诉 Pillow 插件已经初始化完; 包内使用 PIL.Image 的模块都从这里导入。
+扩展名是这五种、内容却是其它格式的文件会报告为打不开。
+"""
+from PIL import BmpImagePlugin, GifImagePlugin, Image, JpegImagePlugin, PngImagePlugin, TiffImagePlugin  # noqa: F401
+
+# 2 表示 Image.init() 已经完成 (1 表示 preinit), Pillow 不再导入其它插件
+Image._initialized = 2
@@ -0,0 +1,163 @@
+"""批处理任务描述
+
+这里的对象只包含普通数据 (字符串/数字), 可以被 pickle 后发送到子进程,
+工作函数不再依赖 Tk 变量。
+"""
+import hashlib
+import os
+from dataclasses import dataclass, field
+
+# 支持的输入扩展名 / 输出格式
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
+OUTPUT_FORMATS = ("JPEG", "PNG", "GIF", "BMP", "TIFF")
+
+# 缩放方式 (与界面上单选按钮的取值一致)
+RESIZE_SCALE = 1  # 等比缩放
+RESIZE_SIZE = 2   # 指定尺寸
+
+# 重采样滤镜 (对应 PIL.Image.Resampling 的成员名)
+RESAMPLE_FILTERS = ("nearest", "box", "bilinear", "hamming", "bicubic", "lanczos")
+# 编码预设 (见 encoders.ENCODER_OPTIONS): 只改变压缩方式和编码速度, 不改变画质
+ENCODER_PRESETS = ("fastest", "balanced", "smallest")
+DEFAULT_PRESET = "balanced"
+# 快速缩小的默认间隔, 3.0 时与完整重采样的结果几乎没有差别
+DEFAULT_REDUCING_GAP = 3.0
+# 超过这个像素数 (且格式允许) 的图像按条带流式缩放
+DEFAULT_STREAM_THRESHOLD = 100_000_000
+# 去重: 相同内容的输入只处理一次, 其它文件的输出用硬链接 (不支持时复制) 或复制生成
+DEDUP_LINK = "link"
+DEDUP_COPY = "copy"
+DEDUP_MODES = (DEDUP_LINK, DEDUP_COPY)
+
+
+def is_supported_image(filename):
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+# Rendition.from_dict 接受的字段类型 (None 表示使用默认值)
+_RENDITION_TYPES = {"scale": (int, float, type(None)), "width": int, "height": int, "format": str,
+                    "suffix": (str, type(None)), "preset": (str, type(None))}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """一种输出规格: 尺寸 + 格式
+
+    尺寸可以是 scale (等比缩放), 也可以是 width/height (只给一个时保持宽高比);
+    suffix 加在输出文件名后面, None 表示按尺寸自动生成, "" 表示不加后缀;
+    preset 为 None 时使用任务的编码预设。
+    """
+    scale: float = None
+    width: int = 0
+    height: int = 0
+    format: str = "JPEG"
+    suffix: str = None
+    preset: str = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 {"width": 150, "format": "JPEG"} 这样的字典创建 (例如 JSON), 类型不对时抛出 TypeError"""
+        if not isinstance(data, dict):
+            raise TypeError(f"输出规格应为对象: {data!r}")
+        for key, value in data.items():
+            types = _RENDITION_TYPES.get(key)
+            # bool 是 int 的子类, JSON 中的 true/false 不能当作数字
+            if types is not None and (not isinstance(value, types) or isinstance(value, bool)):
+                raise TypeError(f"输出规格的 {key} 类型不对: {value!r}")
+        rendition = cls(**data)
+        if rendition.scale is not None and not 0 < rendition.scale < float("inf"):
+            raise ValueError(f"缩放比例必须大于 0: {data}")
+        if rendition.width < 0 or rendition.height < 0:
+            raise ValueError(f"宽和高不能为负数: {data}")
+        if rendition.format.upper() not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {rendition.format}")
+        if not rendition.scale and not rendition.width and not rendition.height:
+            raise ValueError(f"输出规格缺少 scale / width / height: {data}")
+        if rendition.preset is not None and rendition.preset not in ENCODER_PRESETS:
+            raise ValueError(f"未知的编码预设: {rendition.preset}")
+        return cls(**{**data, "format": rendition.format.upper()})
+
+    def target_size(self, size):
+        """根据原图尺寸计算输出尺寸"""
+        width, height = size
+        if self.scale:
+            return max(1, int(width * self.scale)), max(1, int(height * self.scale))
+        if self.width and self.height:
+            return self.width, self.height
+        if self.width:
+            return self.width, max(1, round(height * self.width / width))
+        return max(1, round(width * self.height / height)), self.height
+
+    def auto_suffix(self):
+        if self.scale:
+            return f"s{self.scale:g}"
+        if self.width and self.height:
+            return f"{self.width}x{self.height}"
+        return f"w{self.width}" if self.width else f"h{self.height}"
+
+    def output_name(self, filename):
+        """输入文件的相对路径 -> 输出文件的相对路径 (保留子文件夹结构)"""
+        suffix = self.auto_suffix() if self.suffix is None else self.suffix
+        stem = os.path.splitext(filename)[0]
+        if suffix:
+            stem = f"{stem}_{suffix}"
+        return stem + "." + self.format.lower()
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    """一次批处理的全部参数 (在 process_images 中一次性从界面读取)"""
+    input_dir: str
+    output_dir: str
+    resize_mode: int = RESIZE_SCALE
+    scale: float = 1.0
+    width: int = 0
+    height: int = 0
+    output_format: str = "JPEG"
+    resample: str = "bicubic"
+    reducing_gap: float = DEFAULT_REDUCING_GAP  # None 表示关闭快速缩小
+    recursive: bool = False  # 包含子文件夹, 输出时保留相同的目录结构 (压缩包输入总是包含全部子文件夹)
+    incremental: bool = True  # 跳过上次以相同参数处理过且未变化的文件
+    verify_hash: bool = False  # 修改时间变化时再比较内容哈希
+    renditions: tuple = ()  # 多种输出规格 (Rendition), 为空时按上面的缩放设置输出一种
+    collect_stats: bool = False  # 记录各阶段用时 (open/decode/resize/encode/write)
+    stream_threshold: int = DEFAULT_STREAM_THRESHOLD  # 流式缩放的像素阈值, 0 表示关闭
+    dedup: str = ""  # 去重方式 (DEDUP_MODES), 空字符串表示不去重
+    encoder_preset: str = DEFAULT_PRESET  # 编码预设 (ENCODER_PRESETS)
+    manifest_name: str = None  # 增量清单的文件名, None 表示默认; 分片运行时各分片/主机使用自己的清单
+    node: str = None  # 动态认领 (--claim) 时的节点名 (主机名-进程号), 同一台机器上的进程共用清单
+
+    def get_renditions(self):
+        """本次任务的所有输出规格"""
+        if self.renditions:
+            return self.renditions
+        if self.resize_mode == RESIZE_SCALE:
+            return (Rendition(scale=self.scale, format=self.output_format.upper(), suffix=""),)
+        return (Rendition(width=self.width, height=self.height, format=self.output_format.upper(), suffix=""),)
+
+    def fingerprint(self):
+        """影响输出内容的参数的指纹, 参数变化后增量清单中的记录失效"""
+        params = (self.get_renditions(), self.resample, self.reducing_gap, self.encoder_preset)
+        return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+    def preset_for(self, rendition):
+        return rendition.preset or self.encoder_preset
+
+    def output_names(self, filename):
+        """输入文件的相对路径 -> 所有输出文件的相对路径"""
+        return tuple(r.output_name(filename) for r in self.get_renditions())
+
+
+@dataclass(frozen=True)
+class ImageResult:
+    """单个图像的处理结果 (由工作函数返回给主进程)"""
+    filename: str
+    ok: bool
+    outputs: tuple = ()  # 输出文件的相对路径
+    error: str = ""
+    skipped: bool = False  # 输出已是最新, 没有重新处理
+    elapsed: float = 0.0  # 工作函数中的处理用时 (秒)
+    input_format: str = ""
+    timings: dict = None  # 各阶段用时 (秒), 只在 job.collect_stats 时记录
+    encoded: tuple = field(default=(), repr=False)  # 编码好、尚未写出的输出 (bytes), 与 outputs 对应
+    deduplicated: bool = False  # 与另一个输入内容相同, 输出由已有的结果链接/复制而来
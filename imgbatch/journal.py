@@ -0,0 +1,145 @@
+"""断点续传日志
+
+每个任务 (输入 + 参数) 在输出文件夹中有一个只追加的日志, 每处理完 (或失败) 一个文件追加一行。
+每行立即写入操作系统 (进程崩溃不会丢失), 每 SYNC_EVERY 行或 SYNC_INTERVAL 秒 fsync 一次
+(断电时最多丢失最后一小段, 这些文件续传时重新处理; 输出都是先写临时文件再改名, 不会有写了一半
+却看起来完整的文件)。续传时读一遍日志得到已完成的文件, 扫描时直接跳过, 不再 stat 和查清单。
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger("ImageProcessor.journal")
+
+JOURNAL_PREFIX = ".imgbatch_journal."
+SYNC_EVERY = 256
+SYNC_INTERVAL = 1.0
+
+STATUS_OK = "ok"
+STATUS_FAILED = "fail"
+STATUS_END = "end"  # 批次正常结束
+
+# 每行: 状态 \t 相对路径 [\t 错误信息], 字段中的 \ 、制表符和换行转义;
+# 比 JSON 解析快得多, 10 万行的日志约 0.1 秒读完
+_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n"}
+_UNESCAPES = {"\\": "\\", "t": "\t", "n": "\n"}
+_ESCAPE_RE = re.compile(r"[\\\t\n]")
+_UNESCAPE_RE = re.compile(r"\\(.)")
+
+
+def _escape(text):
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], text)
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def journal_path(job):
+    """任务的日志文件: 输入位置、参数指纹和清单名 (分片) 相同的运行共用一个日志"""
+    key = "\0".join((os.path.abspath(job.input_dir), job.fingerprint(), job.manifest_name or ""))
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(job.output_dir, f"{JOURNAL_PREFIX}{digest}.log")
+
+
+class Journal:
+    """只追加的处理日志 (只在引擎的协调线程中使用)
+
+    resume 为 True 时读取已有的日志, done 为其中已完成的文件, 新的记录追加在后面;
+    append 为 True 时只追加不读取 (监视模式的各批); 否则清空日志重新开始。
+    监视模式的一批正常结束时日志压缩成只有结束标记: 之前的文件都已经记录在增量清单中,
+    日志不会随监视时间无限增长。
+    """
+
+    def __init__(self, job, resume=False, append=False):
+        self.path = journal_path(job)
+        self.compact = append
+        self.done = set()
+        self.failed = {}  # 相对路径 -> 错误信息 (续传时会重试)
+        self.finished = False  # 上次运行是否正常结束
+        if resume:
+            self.load()
+        if resume or append:
+            self.file = open(self.path, "a+b", buffering=0)
+            self._trim_torn_tail()
+        else:
+            self.file = open(self.path, "wb", buffering=0)
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def load(self):
+        start = time.perf_counter()
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            logger.info("没有找到上次的处理记录, 从头开始")
+            return
+        # 最后一个换行之后是崩溃时写了一半的行
+        text = data[:data.rfind(b"\n") + 1].decode("utf-8", "surrogateescape")
+        for line in text.splitlines():
+            status, _, rest = line.partition("\t")
+            if status == STATUS_OK:
+                filename = _unescape(rest)
+                self.done.add(filename)
+                self.failed.pop(filename, None)
+            elif status == STATUS_FAILED:
+                filename, _, error = rest.partition("\t")
+                filename = _unescape(filename)
+                self.done.discard(filename)
+                self.failed[filename] = _unescape(error)
+            self.finished = status == STATUS_END
+        state = "上次的处理已经全部完成, 只处理新增的文件" if self.finished else "继续上次的处理"
+        logger.info(f"{state}: 已完成 {len(self.done)} 个, 失败 {len(self.failed)} 个 (将重试), "
+                    f"读取记录用时 {time.perf_counter() - start:.2f} 秒")
+
+    def _trim_torn_tail(self):
+        """去掉崩溃时写了一半的最后一行, 新的记录从完整的行之后开始"""
+        size = self.file.seek(0, os.SEEK_END)
+        offset = size
+        while offset > 0:
+            start = max(0, offset - 4096)
+            self.file.seek(start)
+            newline = self.file.read(offset - start).rfind(b"\n")
+            if newline >= 0:
+                offset = start + newline + 1
+                break
+            offset = start
+        if offset < size:
+            self.file.truncate(offset)
+
+    def record(self, result):
+        if result.ok:
+            if result.filename in self.done:
+                return
+            self.done.add(result.filename)
+            entry = (STATUS_OK, _escape(result.filename))
+        else:
+            entry = (STATUS_FAILED, _escape(result.filename), _escape(result.error))
+        self._append(entry)
+
+    def _append(self, entry):
+        # surrogateescape: Linux 上不是 UTF-8 的文件名也能原样记录
+        self.file.write(("\t".join(entry) + "\n").encode("utf-8", "surrogateescape"))
+        self.unsynced += 1
+        if self.unsynced >= SYNC_EVERY or time.monotonic() - self.synced_at >= SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        if self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def close(self, completed):
+        """completed 为 True 时记录批次正常结束 (监视模式的一批先清空日志)"""
+        if completed:
+            if self.compact:
+                self.file.truncate(0)
+            self._append((STATUS_END,))
+        self.sync()
+        self.file.close()
@@ -0,0 +1,90 @@
+"""异步日志: 处理线程只把日志记录放入队列, 由一个写日志线程格式化并写入
+
+同步的 FileHandler / StreamHandler 在调用 logger.debug 的线程中格式化并写盘, 所有工作线程
+共用处理器的锁。这里 logger 上只挂一个 QueueHandler, 记录原样放入队列 (不在调用线程中格式化),
+真正的处理器挂在 QueueListener 的线程上。日志文件为 JSON 行 (每行一条记录, 按文件的记录带
+file / stage / duration 字段), 按大小轮转。按文件的 DEBUG 记录可以抽样, 大批量的小图不会
+被日志拖慢; 警告和错误总是全部保留。
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(processName)s/%(threadName)s] %(message)s'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+# 结构化字段: 通过 extra={"file": ..., "stage": ..., "duration": ...} 传入
+STRUCTURED_FIELDS = ("file", "stage", "duration")
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON (在写日志线程中格式化)"""
+
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "thread": f"{record.processName}/{record.threadName}", "message": record.getMessage()}
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """按文件的 DEBUG 记录 (带 file 字段) 每 every 条只保留一条, 其它记录全部保留"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self.counter = itertools.count()  # next() 在 GIL 下是原子的
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or getattr(record, "file", None) is None:
+            return True
+        return next(self.counter) % self.every == 0
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """同一进程内的队列不需要序列化: 记录原样放入队列, 消息在写日志线程中才格式化"""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_async_logging(handlers, level=logging.DEBUG, sample_every=1, name="ImageProcessor"):
+    """把 handlers 挂到写日志线程上, 返回已启动的 QueueListener (程序退出时写完队列中的记录)"""
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LocalQueueHandler(log_queue)
+    if sample_every > 1:
+        queue_handler.addFilter(SampleFilter(sample_every))
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def console_handler(level=logging.INFO):
+    handler = logging.StreamHandler()
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def json_file_handler(path, level=logging.DEBUG, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """按大小轮转的 JSON 行日志文件 (追加写入, 超过 max_bytes 时改名为 .1、.2 ...)
+
+    文件在写第一条记录时才打开, 不拖慢启动。
+    """
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                   encoding="utf-8", delay=True)
+    handler.setLevel(level)
+    handler.setFormatter(JsonFormatter())
+    return handler
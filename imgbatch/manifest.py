@@ -0,0 +1,136 @@
+"""增量处理清单
+
+保存在输出文件夹中的 SQLite 数据库, 记录每个输入文件上次处理时的大小、修改时间、
+(可选) 内容哈希以及处理参数的指纹。再次运行时, 未变化且输出仍然存在的文件直接跳过。
+另有 输出文件 -> 输入文件 的索引, 用来发现输出到同一个文件的输入 (例如 a.jpg 和 a.png)。
+开启去重时还记录 内容哈希 + 参数 -> 输出文件, 以后的批次遇到相同内容的输入直接复用。
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger("ImageProcessor.manifest")
+
+MANIFEST_NAME = ".imgbatch_manifest.sqlite3"
+# 每记录这么多条提交一次, 避免每个文件一次磁盘同步
+COMMIT_EVERY = 500
+# 多个进程共用一个清单时, 等待其它进程释放写锁的最长秒数
+SHARED_BUSY_TIMEOUT = 60.0
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bytes_digest(data):
+    """与 file_digest 相同的哈希, 用于已经读入内存的文件"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class Manifest:
+    """输出文件夹中的处理清单 (只能在创建它的线程中使用)
+
+    shared 为 True 时同一台机器上的多个进程同时写这个清单 (--claim): 每条记录立即提交,
+    写锁只持有一瞬间, 遇到其它进程的写锁时最多等待 SHARED_BUSY_TIMEOUT 秒。
+    """
+
+    def __init__(self, output_dir, use_hash=False, name=None, shared=False):
+        self.output_dir = output_dir
+        self.use_hash = use_hash
+        self.path = os.path.join(output_dir, name or MANIFEST_NAME)
+        self.commit_every = 1 if shared else COMMIT_EVERY
+        self.conn = sqlite3.connect(self.path, timeout=SHARED_BUSY_TIMEOUT if shared else 5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " params TEXT, output TEXT, digest TEXT)")  # output: 所有输出文件, 以换行分隔
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS contents ("
+            " digest TEXT, params TEXT, output TEXT, PRIMARY KEY (digest, params))")
+        has_outputs = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outputs'").fetchone()
+        # output 按 os.path.normcase 规范化 (Windows 上不区分大小写)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS outputs (output TEXT PRIMARY KEY, path TEXT)")
+        if not has_outputs:
+            # 旧版本的清单: 从已有的记录建立索引
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO outputs (output, path) VALUES (?, ?)",
+                ((os.path.normcase(output), path) for path, outputs in self.conn.execute(
+                    "SELECT path, output FROM entries").fetchall() for output in outputs.split("\n")))
+            self.conn.commit()
+        self.uncommitted = 0
+
+    def is_up_to_date(self, filename, input_path, st, params, digest=None):
+        """输入未变化、参数相同且输出仍然存在时返回 True
+
+        digest 是已知的内容哈希 (压缩包中的文件已读入内存), 需要比较哈希时不再读取 input_path。
+        """
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, params, output, digest FROM entries WHERE path = ?",
+            (filename,)).fetchone()
+        if row is None:
+            return False
+        size, mtime_ns, old_params, outputs, old_digest = row
+        if old_params != params or size != st.st_size:
+            return False
+        if not all(os.path.exists(os.path.join(self.output_dir, output)) for output in outputs.split("\n")):
+            return False
+        if mtime_ns == st.st_mtime_ns:
+            return True
+        # 修改时间变了 (例如被复制/touch 过), 开启哈希时再比较内容
+        if self.use_hash and old_digest and (digest or file_digest(input_path)) == old_digest:
+            self.conn.execute("UPDATE entries SET mtime_ns = ? WHERE path = ?", (st.st_mtime_ns, filename))
+            self._maybe_commit()
+            return True
+        return False
+
+    def record(self, filename, input_path, st, params, outputs, digest=None):
+        if digest is None and self.use_hash:
+            digest = file_digest(input_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (path, size, mtime_ns, params, output, digest)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (filename, st.st_size, st.st_mtime_ns, params, "\n".join(outputs), digest))
+        self.conn.execute("DELETE FROM outputs WHERE path = ?", (filename,))
+        self.conn.executemany("INSERT OR REPLACE INTO outputs (output, path) VALUES (?, ?)",
+                              ((os.path.normcase(output), filename) for output in outputs))
+        self._maybe_commit()
+
+    def output_owner(self, output):
+        """输出文件 (相对路径) 是哪个输入生成的, 没有记录时返回 None"""
+        row = self.conn.execute("SELECT path FROM outputs WHERE output = ?", (os.path.normcase(output),)).fetchone()
+        return row[0] if row is not None else None
+
+    def find_content(self, digest, params):
+        """以相同参数处理过相同内容时, 返回当时的输出文件 (都还存在时), 否则返回 None"""
+        row = self.conn.execute(
+            "SELECT output FROM contents WHERE digest = ? AND params = ?", (digest, params)).fetchone()
+        if row is None:
+            return None
+        outputs = tuple(row[0].split("\n"))
+        if not all(os.path.exists(os.path.join(self.output_dir, output)) for output in outputs):
+            return None
+        return outputs
+
+    def record_content(self, digest, params, outputs):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO contents (digest, params, output) VALUES (?, ?, ?)",
+            (digest, params, "\n".join(outputs)))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
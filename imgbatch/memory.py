@@ -0,0 +1,128 @@
+"""解码内存预算
+
+在 load() 之前根据文件头中的尺寸和模式估算一个任务的工作集 (解码后的原图 + 输出图像),
+引擎只在估算值放得进预算时才派发任务, 避免几张超大的 TIFF/BMP 同时解码导致内存不足。
+"""
+import ctypes
+import math
+import os
+import re
+
+# Pillow 内部每个像素占用的字节数 (RGB 也按 4 字节存储)
+BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2, "LA": 4, "PA": 4,
+                   "RGB": 4, "RGBA": 4, "RGBa": 4, "RGBX": 4, "CMYK": 4, "YCbCr": 4, "LAB": 4,
+                   "HSV": 4, "I": 4, "F": 4}
+# 与 streaming.STRIP_BYTES 相同 (这里不导入 PIL)
+STRIP_BYTES = 32 * 1024 * 1024
+# 各滤镜的支撑半径 (与 Pillow 的实现一致)
+FILTER_SUPPORT = {"nearest": 0.5, "box": 0.5, "bilinear": 1.0, "hamming": 1.0, "bicubic": 2.0, "lanczos": 3.0}
+# 缩放时的临时缓冲 (reduce 中间结果、RGBA 预乘等) 按解码大小的比例估算
+WORKING_SET_OVERHEAD = 0.25
+
+
+def _windows_memory_status():
+    class MemoryStatus(ctypes.Structure):
+        _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+    status = MemoryStatus()
+    status.dwLength = ctypes.sizeof(MemoryStatus)
+    if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return status
+    return None
+
+
+def physical_memory():
+    """物理内存大小 (字节), 无法获取时返回 None"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        pass
+    if os.name == "nt":
+        status = _windows_memory_status()
+        if status is not None:
+            return status.ullTotalPhys
+    return None
+
+
+def available_memory():
+    """当前可用的物理内存 (字节, 包括可以回收的缓存), 无法获取时返回 None"""
+    if os.name == "nt":
+        status = _windows_memory_status()
+        return status.ullAvailPhys if status is not None else None
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def default_memory_budget():
+    """默认预算: 物理内存的一半"""
+    total = physical_memory()
+    return total // 2 if total else None
+
+
+def parse_bytes(text):
+    """"2GB"、"512MB"、"1073741824" -> 字节数; "0" 表示不限制 (返回 None)"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?\s*", text.upper())
+    if not match:
+        raise ValueError(f"无法识别的大小: {text}")
+    value = float(match.group(1)) * 1024 ** " KMGT".index(match.group(2) or " ")
+    return int(value) or None
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def draft_size(item, sizes, job):
+    """JPEG 在 draft 之后实际解码的尺寸 (按 1/2、1/4、1/8 缩小)"""
+    if item.format != "JPEG" or not job.reducing_gap or not sizes:
+        return item.width, item.height
+    largest = max(sizes, key=lambda size: size[0] * size[1])
+    want = (largest[0] * job.reducing_gap, largest[1] * job.reducing_gap)
+    for scale in (8, 4, 2):
+        if item.width / scale >= want[0] and item.height / scale >= want[1]:
+            return -(-item.width // scale), -(-item.height // scale)
+    return item.width, item.height
+
+
+def filter_margin(resample, scale_y):
+    """垂直缩小 scale_y 倍时, 一个输出行在原图中上下需要多读的行数 (滤镜支撑范围)"""
+    return math.ceil(FILTER_SUPPORT.get(resample, 3.0) * max(scale_y, 1.0)) + 1
+
+
+def band_rows(width, height, sizes, resample, strip_bytes=STRIP_BYTES):
+    """流式缩放的条带: (每次新读取的原图行数, 从上一个条带保留的行数)
+
+    保留的行数只取决于缩放比例和滤镜: 缩小很多倍的宽图可能比新读取的行数还多, 条带的内存要算上它。
+    """
+    strip_rows = max(1, strip_bytes // (width * 4))
+    overlap = max(2 * filter_margin(resample, height / out_h) + math.ceil(height / out_h) + 1 for _, out_h in sizes)
+    return strip_rows, overlap
+
+
+def estimate_working_set(item, job):
+    """估算处理 item 时的峰值内存 (字节)"""
+    if not item.width or not item.height:
+        return 0
+    bpp = BYTES_PER_PIXEL.get(item.mode, 4)
+    sizes = [r.target_size((item.width, item.height)) for r in job.get_renditions()]
+    outputs = sum(w * h * bpp for w, h in sizes)
+    if item.streamed:
+        # 流式缩放: 同时存在的是新读取的行、保留的行、拼接后的条带和输出图像
+        strip_rows, overlap = band_rows(item.width, item.height, sizes, job.resample)
+        return 2 * min(strip_rows + overlap, item.height) * item.width * 4 + outputs
+    width, height = draft_size(item, sizes, job)
+    decoded = width * height * bpp
+    return int(decoded * (1 + WORKING_SET_OVERHEAD)) + outputs
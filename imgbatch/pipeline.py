@@ -0,0 +1,138 @@
+"""三段流水线的 I/O 部分: 预读输入 -> (CPU 工作进程) -> 写出输出
+
+读取和写出都在线程池中进行, 工作进程只从内存解码、编码到内存, 不会在网络盘
+(NAS) 的 I/O 上空等。输出先写到同一目录下的临时文件再改名, 中途失败或中断时
+不会留下写了一半的图片。
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import replace
+
+from .job import DEDUP_LINK, ImageResult
+from .manifest import bytes_digest, file_digest
+
+logger = logging.getLogger("ImageProcessor.pipeline")
+
+# 读取线程数 / 写出线程数, 0 表示由工作进程自己读写
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 4
+# 已预读、尚未处理完的输入文件字节数上限
+DEFAULT_PREFETCH_BYTES = 256 * 1024 * 1024
+
+
+def read_input(path, keep=True, digest=False):
+    """读取输入文件 (在读取线程中运行), 返回 (内容, 用时, 内容哈希)
+
+    keep 为 False 时只计算哈希 (用于去重和增量清单), 不保留内容; digest 为 False 时不计算哈希。
+    """
+    start = time.perf_counter()
+    data = content = None
+    if keep:
+        with open(path, "rb") as f:
+            data = f.read()
+        if digest:
+            content = bytes_digest(data)
+    elif digest:
+        content = file_digest(path)
+    return data, time.perf_counter() - start, content
+
+
+def atomic_write(path, data):
+    """先写临时文件再改名, 目标文件要么是旧内容要么是完整的新内容"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def link_file(source, path, hardlink=True):
+    """用硬链接 (不支持时复制) 或复制生成 path, 同样先生成临时文件再改名"""
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        linked = False
+        if hardlink:
+            try:
+                os.link(source, temp_path)
+                linked = True
+            except OSError:
+                # 跨设备、文件系统不支持硬链接等情况下退回复制
+                pass
+        if not linked:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def link_outputs(job, filename, sources):
+    """内容相同的输入不再处理, 把已有的输出链接/复制为本文件的输出 (在写出线程中运行)"""
+    start = time.perf_counter()
+    outputs = job.output_names(filename)
+    try:
+        for source, output_filename in zip(sources, outputs):
+            if source != output_filename:
+                link_file(os.path.join(job.output_dir, source), os.path.join(job.output_dir, output_filename),
+                          job.dedup == DEDUP_LINK)
+    except Exception as e:
+        logger.exception("  保存图像失败: %s", e)
+        return ImageResult(filename, False, error=f"保存图像 {filename} 失败: {e}")
+    return ImageResult(filename, True, outputs, elapsed=time.perf_counter() - start, deduplicated=True)
+
+
+def write_outputs(job, result):
+    """把工作进程编码好的输出写入输出文件夹 (在写出线程中运行)"""
+    start = time.perf_counter()
+    try:
+        for output_filename, data in zip(result.outputs, result.encoded):
+            atomic_write(os.path.join(job.output_dir, output_filename), data)
+    except Exception as e:
+        logger.exception("  保存图像失败: %s", e)
+        return ImageResult(result.filename, False, error=f"保存图像 {result.filename} 失败: {e}",
+                           input_format=result.input_format)
+    elapsed = time.perf_counter() - start
+    timings = result.timings
+    if timings is not None:
+        timings = {**timings, "write": timings.get("write", 0.0) + elapsed}
+    return replace(result, encoded=(), elapsed=result.elapsed + elapsed, timings=timings)
+
+
+class StageQueue:
+    """一个阶段的队列深度: 当前值、峰值和按时间加权的平均值 (只在协调线程中更新)"""
+
+    def __init__(self):
+        self.depth = 0
+        self.peak = 0
+        self.area = 0.0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, depth):
+        now = time.perf_counter()
+        self.area += self.depth * (now - self.last)
+        self.last = now
+        self.depth = depth
+        self.peak = max(self.peak, depth)
+
+    def mean(self):
+        now = time.perf_counter()
+        span = now - self.start
+        area = self.area + self.depth * (now - self.last)
+        return area / span if span > 0 else 0.0
+
+    def to_dict(self):
+        return {"depth": self.depth, "peak": self.peak, "mean": round(self.mean(), 2)}
@@ -0,0 +1,52 @@
+"""只读文件头的预扫描, 用于估算每个文件的处理成本
+
+Image.open 只解析文件头, 不调用 load(), 可以很快得到尺寸和模式。
+引擎按成本从大到小派发任务 (LPT), 避免一个超大文件排在最后, 只有一个核在忙。
+"""
+import io
+from dataclasses import dataclass, field
+
+from .imaging import Image
+from .streaming import should_stream
+
+# 超大图像由引擎的内存预算控制, 不使用 Pillow 的解压炸弹检查 (否则 2 亿像素以上的图像无法打开)
+Image.MAX_IMAGE_PIXELS = None
+
+
+@dataclass
+class WorkItem:
+    """一个待处理的输入文件"""
+    filename: str      # 相对于输入文件夹的路径
+    input_path: str
+    stat: object       # os.stat_result, 用于增量清单
+    width: int = 0
+    height: int = 0
+    mode: str = ""
+    format: str = ""
+    memory: int = 0    # 估算的工作集 (字节), 见 memory.estimate_working_set
+    streamed: bool = False  # 会按条带流式缩放 (工作集与条带大小成正比)
+    prefetched: int = 0  # 预读占用的字节数
+    read_time: float = None  # 预读用时 (秒)
+    digest: str = None  # 内容哈希, 只在去重时计算
+    data: bytes = field(default=None, repr=False)  # 压缩包中的文件: 扫描时已读入内存的内容
+    order: int = 0  # 在压缩包中的顺序, 输出压缩包按这个顺序写入
+
+    @property
+    def cost(self):
+        """估算的处理成本: 像素数 (预扫描失败时为 0, 工作函数会报告错误)"""
+        return self.width * self.height
+
+
+def probe(item, job):
+    """读取文件头, 填写 item 的尺寸和模式 (在预扫描线程池中运行)"""
+    try:
+        with Image.open(io.BytesIO(item.data) if item.data is not None else item.input_path) as img:
+            item.width, item.height = img.size
+            item.mode = img.mode
+            item.format = img.format
+            # 已在内存中的文件不能按条带从磁盘读取
+            item.streamed = item.data is None and should_stream(img, job)
+    except Exception:
+        # 打不开的文件照常派发, 由工作函数报告具体错误
+        pass
+    return item
@@ -0,0 +1,108 @@
+"""预览: 缩小的代理图像 LRU 缓存 + 按当前设置渲染
+
+打开并解码原图很慢 (大图要几百毫秒), 而预览只需要很小的图像。每个文件只解码一次,
+缩小为代理图像 (最长边 PROXY_SIDE) 放入按字节数淘汰的 LRU 缓存; 修改缩放比例、
+尺寸或格式时只从代理图像重新缩放, 几毫秒就能完成。解码在后台线程中进行。
+"""
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .encoders import save_image
+from .imaging import Image
+from .memory import BYTES_PER_PIXEL, format_size
+from .resample import get_filter
+
+# 代理图像的最长边, 预览窗口不会比它更大
+PROXY_SIDE = 1024
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# 与 worker 相同, 大图也可以预览
+Image.MAX_IMAGE_PIXELS = None
+
+
+@dataclass(frozen=True)
+class Proxy:
+    image: object         # 缩小后的 PIL 图像 (RGB / RGBA / L)
+    original_size: tuple  # 原图尺寸, 用于计算输出尺寸
+    format: str           # 原图格式
+
+    @property
+    def nbytes(self):
+        width, height = self.image.size
+        return width * height * BYTES_PER_PIXEL.get(self.image.mode, 4)
+
+
+def load_proxy(path, side=PROXY_SIDE):
+    """解码原图并缩小为代理图像 (在后台线程中运行)"""
+    img = Image.open(path)
+    try:
+        original_size, input_format = img.size, img.format
+        # JPEG 直接按 1/2、1/4、1/8 缩小解码
+        img.draft(None, (side, side))
+        img.thumbnail((side, side), reducing_gap=3.0)
+        has_alpha = "A" in img.mode or "transparency" in img.info
+        mode = "L" if img.mode in ("1", "L") else "RGBA" if has_alpha else "RGB"
+        return Proxy(img.convert(mode), original_size, input_format)
+    finally:
+        img.close()
+
+
+class ProxyCache:
+    """按字节数淘汰的 LRU 缓存 (线程安全: 后台线程放入, 界面线程读取)"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 键 -> Proxy, 最近使用的在末尾
+        self.nbytes = 0
+
+    def get(self, key):
+        with self.lock:
+            proxy = self.entries.get(key)
+            if proxy is not None:
+                self.entries.move_to_end(key)
+            return proxy
+
+    def put(self, key, proxy):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self.entries[key] = proxy
+            self.nbytes += proxy.nbytes
+            # 至少保留刚放入的一项, 单个代理图像超过上限时也能预览
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def render_preview(proxy, job, box):
+    """按 job 的第一种输出规格渲染预览, 返回 (图像, 说明文字)
+
+    输出能完整放进 box 时按输出的实际像素渲染, 并经过一次编码/解码, 可以看到压缩效果
+    和输出文件的大小; 输出更大时缩小到 box 以内显示。
+    """
+    rendition = job.get_renditions()[0]
+    out_width, out_height = rendition.target_size(proxy.original_size)
+    fit = min(1.0, box[0] / out_width, box[1] / out_height)
+    size = (max(1, round(out_width * fit)), max(1, round(out_height * fit)))
+    image = proxy.image.resize(size, get_filter(job.resample), reducing_gap=job.reducing_gap)
+
+    width, height = proxy.original_size
+    text = f"{width}x{height} {proxy.format} -> {out_width}x{out_height} {rendition.format}"
+    if fit < 1.0:
+        return image, f"{text} (按 {fit:.0%} 显示)"
+    buffer = io.BytesIO()
+    save_image(image, buffer, rendition.format, job.preset_for(rendition))
+    encoded = Image.open(buffer)
+    encoded.load()
+    return encoded, f"{text}, 约 {format_size(buffer.tell())}"
@@ -0,0 +1,138 @@
+"""汇总的进度通道
+
+引擎在处理过程中只更新 ProgressTracker 中的计数 (加锁, 开销很小),
+界面每次定时刷新时读取一次 snapshot(), 不再为每张图片发送消息。
+
+预扫描得到像素数后, 进度和剩余时间按像素加权, 而不是按文件数。
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+# 计算速度时使用最近这么多秒内的采样
+RATE_WINDOW = 5.0
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    total: int        # 已发现的文件数 (扫描未结束时还会增加)
+    succeeded: int
+    failed: int
+    skipped: int
+    scanning: bool    # 是否仍在扫描输入文件夹
+    finished: bool    # 批处理是否已全部结束
+    elapsed: float    # 已用时间 (秒)
+    rate: float       # 最近的处理速度 (张/秒, 不含跳过的文件)
+    eta: float        # 预计剩余时间 (秒), 无法估计时为 None
+    total_pixels: int = 0   # 已预扫描文件的总像素数
+    done_pixels: int = 0
+    pixel_rate: float = 0.0  # 像素/秒
+    queues: tuple = None     # 流水线各阶段的队列深度 (读取, 处理, 写出)
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed + self.skipped
+
+    @property
+    def fraction(self):
+        """完成比例: 有像素数时按像素加权, 否则按文件数"""
+        if self.total_pixels:
+            return self.done_pixels / self.total_pixels
+        return self.completed / self.total if self.total else 0.0
+
+    def describe(self):
+        """给界面状态栏用的一行文字"""
+        text = f"{self.completed}/{self.total}{'+' if self.scanning else ''}"
+        if self.failed:
+            text += f"  失败 {self.failed}"
+        if self.skipped:
+            text += f"  跳过 {self.skipped}"
+        text += f"  {self.rate:.1f} 张/秒"
+        if self.total_pixels:
+            text += f"  {self.pixel_rate / 1e6:.1f} MP/秒"
+        if self.eta is not None and not self.finished:
+            minutes, seconds = divmod(int(self.eta), 60)
+            text += f"  剩余约 {minutes}:{seconds:02d}"
+        if self.queues and not self.finished:
+            text += "  队列 读 {} / 算 {} / 写 {}".format(*self.queues)
+        return text
+
+
+class ProgressTracker:
+    """线程安全的进度计数器: 引擎写, 界面读"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.scanning = True
+        self.finished = False
+        self.total_pixels = 0
+        self.done_pixels = 0
+        self.samples = deque()  # (时间, 已处理数, 已处理像素), 由 snapshot() 维护
+        self.queues = None
+
+    def discovered(self, count=1):
+        with self.lock:
+            self.total += count
+
+    def add_pixels(self, pixels):
+        """预扫描得到一个文件的像素数"""
+        with self.lock:
+            self.total_pixels += pixels
+
+    def set_queues(self, read, cpu, write):
+        """引擎更新流水线各阶段的队列深度"""
+        with self.lock:
+            self.queues = (read, cpu, write)
+
+    def scan_complete(self):
+        with self.lock:
+            self.scanning = False
+
+    def record(self, result, pixels=0):
+        with self.lock:
+            self.done_pixels += pixels
+            if result.skipped:
+                self.skipped += 1
+            elif result.ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def finish(self):
+        with self.lock:
+            self.scanning = False
+            self.finished = True
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            total, succeeded, failed, skipped = self.total, self.succeeded, self.failed, self.skipped
+            scanning, finished = self.scanning, self.finished
+            total_pixels, done_pixels = self.total_pixels, self.done_pixels
+            queues = self.queues
+
+        processed = succeeded + failed
+        self.samples.append((now, processed, done_pixels))
+        while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW:
+            self.samples.popleft()
+        first_time, first_processed, first_pixels = self.samples[0]
+        if now - first_time > 0.5:
+            span, rate = now - first_time, processed - first_processed
+            pixel_rate = done_pixels - first_pixels
+        else:
+            span, rate, pixel_rate = now - self.start, processed, done_pixels
+        rate = rate / span if span > 0 else 0.0
+        pixel_rate = pixel_rate / span if span > 0 else 0.0
+
+        if total_pixels:
+            eta = (total_pixels - done_pixels) / pixel_rate if pixel_rate > 0 else None
+        else:
+            eta = (total - processed - skipped) / rate if rate > 0 else None
+        return ProgressSnapshot(total, succeeded, failed, skipped, scanning, finished,
+                                now - self.start, rate, eta, total_pixels, done_pixels, pixel_rate, queues)
@@ -0,0 +1,58 @@
+"""缩放: 大比例缩小时走快速路径
+
+- JPEG: 先用 draft 让解码器直接按 1/2、1/4、1/8 缩小解码, 省掉大部分解码工作;
+- 其它格式: Image.resize 的 reducing_gap 会先用整数倍 reduce 缩小, 再做最后一次高质量重采样。
+
+reducing_gap 越小越快, 质量越差; None 表示关闭快速路径 (完整解码后直接重采样)。
+
+一次输出多种规格时, 原图只解码一次, 每种规格从已经缩小过的、最接近的中间结果再缩小。
+"""
+from .imaging import Image
+
+
+def get_filter(name):
+    return Image.Resampling[name.upper()]
+
+
+def is_proportional(size, original_size):
+    """size 与原图宽高比一致 (容许取整误差) 时才能作为其它规格的缩放来源"""
+    return abs(size[0] * original_size[1] - size[1] * original_size[0]) <= max(original_size)
+
+
+def request_draft(img, sizes, job):
+    """让 JPEG 解码器按最大的输出尺寸缩小解码, 必须在 load() 之前调用
+
+    只对 JPEG 有效, 其它格式的 draft 什么也不做。
+    """
+    gap = job.reducing_gap
+    if gap:
+        largest = max(sizes, key=lambda size: size[0] * size[1])
+        img.draft(None, (int(largest[0] * gap), int(largest[1] * gap)))
+
+
+def render_sizes(img, original_size, sizes, job):
+    """把图像缩放为 sizes 中的每个尺寸
+
+    original_size 是 draft 之前的原图尺寸。按尺寸从大到小依次生成,
+    返回与 sizes 顺序相同的图像列表, 调用方负责关闭返回的图像。
+    """
+    gap = job.reducing_gap
+    resample = get_filter(job.resample)
+    # 可以作为缩放来源的图像: 原图 + 宽高比一致且不大于原图的中间结果
+    sources = [img]
+    outputs = [None] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][0] * sizes[i][1], reverse=True)
+    for i in order:
+        size = sizes[i]
+        need = gap or 1.0
+        # 选择足够大的来源中最小的一个 (原图总是候选)
+        source = img
+        for candidate in sources:
+            if (candidate.width >= size[0] * need and candidate.height >= size[1] * need
+                    and candidate.width * candidate.height < source.width * source.height):
+                source = candidate
+        outputs[i] = source.resize(size, resample=resample, reducing_gap=gap)
+        if (is_proportional(size, original_size) and size[0] <= original_size[0]
+                and size[1] <= original_size[1]):
+            sources.append(outputs[i])
+    return outputs
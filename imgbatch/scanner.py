@@ -0,0 +1,56 @@
+"""流式目录扫描
+
+用 os.scandir 逐个产生图像文件的相对路径, 不会先把整个目录树读入内存,
+引擎可以在扫描结束之前就开始处理。
+"""
+import logging
+import os
+
+from .job import is_supported_image
+
+logger = logging.getLogger("ImageProcessor.scanner")
+
+
+def same_folder(first, second):
+    """两个路径是否指向同一个文件夹 (不存在的路径按字面比较)"""
+    try:
+        return os.path.samefile(first, second)
+    except OSError:
+        return os.path.normcase(os.path.abspath(first)) == os.path.normcase(os.path.abspath(second))
+
+
+def scan_images(root, recursive=False, exclude=()):
+    """逐个产生 root 下支持的图像文件的相对路径
+
+    recursive 为 True 时包含子文件夹 (深度优先, 不跟随符号链接);
+    exclude 中的目录 (例如位于输入文件夹内部的输出文件夹) 会被跳过。
+    """
+    for rel_path, _ in scan_image_entries(root, recursive, exclude):
+        yield rel_path
+
+
+def scan_image_entries(root, recursive=False, exclude=()):
+    """与 scan_images 相同, 但产生 (相对路径, os.DirEntry), 需要 stat 时可以直接用 entry.stat()"""
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in exclude}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir))
+        except OSError as e:
+            if not rel_dir:
+                raise
+            # 无法读取的子文件夹跳过, 不影响其它文件
+            logger.warning(f"无法读取子文件夹 {rel_dir}: {e}")
+            continue
+        with it:
+            subdirs = []
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                        subdirs.append(rel_path)
+                elif is_supported_image(entry.name) and entry.is_file():
+                    yield rel_path, entry
+        # 反向压栈, 让子文件夹按目录中的顺序处理
+        stack.extend(reversed(subdirs))
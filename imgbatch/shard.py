@@ -0,0 +1,182 @@
+"""多台机器分担一个批次 (输入/输出在共享存储上)
+
+两种方式:
+* 静态分片 (--shard i/N): 按相对路径的稳定哈希分配, 每个节点只处理属于自己的 1/N, 不需要协调。
+* 动态认领 (--claim): 每个节点处理一个文件前在共享输出文件夹的 .imgbatch_claims 中用
+  O_CREAT | O_EXCL 原子地创建认领文件, 创建成功才处理, 快的节点自然处理得多。处理完成后认领文件
+  改写为完成标记 (记录参数指纹和输入的大小/修改时间), 以后的运行遇到未变化的文件直接跳过;
+  处理失败时同样改写为失败标记, 其它节点 (和以后的运行) 在输入或参数变化之前不再重试。
+  节点崩溃后留下的认领文件超过 timeout 秒没有更新 (持有者每 timeout/4 秒刷新一次修改时间)
+  时由其它节点接管。
+
+接管时先把旧的认领文件改名 (只有一个节点能成功), 再重新创建。极少数竞争下同一个文件可能被
+两个节点处理, 输出都是先写临时文件再改名, 结果仍然正确, 只是多做了一次。
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger("ImageProcessor.shard")
+
+CLAIMS_DIR = ".imgbatch_claims"
+# 认领文件超过这么多秒没有刷新, 认为持有它的节点已经崩溃
+DEFAULT_CLAIM_TIMEOUT = 600.0
+
+
+def parse_shard(text):
+    """"i/N" -> (i, N), i 从 1 开始"""
+    try:
+        index, count = (int(v) for v in text.split("/"))
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N, 例如 1/4: {text}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片序号应在 1 到 {count} 之间: {text}")
+    return index, count
+
+
+def path_hash(filename):
+    """相对路径的稳定哈希 (与操作系统的路径分隔符和 Python 的哈希随机化无关)"""
+    return hashlib.blake2b(filename.replace(os.sep, "/").encode("utf-8"), digest_size=16).hexdigest()
+
+
+class StaticShard:
+    """静态分片: 只处理哈希落在第 index 片的文件"""
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+        self.manifest_name = f".imgbatch_manifest.shard{index}of{count}.sqlite3"
+        self.node = None  # 每个分片有自己的清单, 不需要区分进程
+
+    def select(self, filename, st):
+        return int(path_hash(filename), 16) % self.count == self.index - 1
+
+    def finished(self, result):
+        pass
+
+    def close(self):
+        pass
+
+
+class ClaimBoard:
+    """动态认领: 在共享输出文件夹中用原子创建的认领文件分配任务"""
+
+    def __init__(self, output_dir, params, timeout=DEFAULT_CLAIM_TIMEOUT, node=None):
+        self.dir = os.path.join(output_dir, CLAIMS_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        self.params = params
+        self.timeout = timeout
+        self.node = node or f"{socket.gethostname()}-{os.getpid()}"
+        # 同一台机器上的多个进程共用一个清单 (每条记录立即提交, 见 Manifest 的 shared),
+        # 不同机器各用各的: 网络文件系统上的 SQLite 文件锁不可靠
+        self.manifest_name = f".imgbatch_manifest.{socket.gethostname()}.sqlite3"
+        self.lock = threading.Lock()
+        self.held = {}  # 相对路径 -> (认领文件路径, 输入的 stat)
+        self.claimed = 0
+        self.reclaimed = 0  # 接管的超时认领
+        self.done_elsewhere = 0  # 已经处理过 (完成标记与输入一致) 的文件
+        self.failed_elsewhere = 0  # 已经失败过 (失败标记与输入一致) 的文件
+        self.stop = threading.Event()
+        self.heartbeat = threading.Thread(target=self._refresh, name="claim-heartbeat", daemon=True)
+        self.heartbeat.start()
+
+    def claim_path(self, filename):
+        return os.path.join(self.dir, path_hash(filename) + ".claim")
+
+    def done_marker(self, st):
+        return f"done {self.params} {st.st_size} {st.st_mtime_ns}"
+
+    def failed_marker(self, st):
+        return f"failed {self.params} {st.st_size} {st.st_mtime_ns}"
+
+    def select(self, filename, st):
+        """认领成功时返回 True (在引擎的协调线程中调用)"""
+        path = self.claim_path(filename)
+        if not self._create(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    content = f.read()
+                age = time.time() - os.stat(path).st_mtime
+            except FileNotFoundError:
+                # 刚被释放 (处理失败) 或正在被接管, 再试一次
+                content, age = None, 0.0
+            if content == self.done_marker(st):
+                self.done_elsewhere += 1
+                return False
+            if content == self.failed_marker(st):
+                self.failed_elsewhere += 1
+                return False
+            claimed = content is not None and not content.startswith(("done ", "failed "))
+            if claimed and age < self.timeout:
+                # 其它节点正在处理
+                return False
+            # 完成/失败标记已过期 (输入或参数变了)、认领超时, 或者文件刚刚消失
+            if not self._take_over(path):
+                return False
+            if claimed:
+                self.reclaimed += 1
+                logger.warning(f"接管超时的认领: {filename} ({content.strip()}, {age:.0f} 秒未更新)")
+        with self.lock:
+            self.held[filename] = (path, st)
+        self.claimed += 1
+        return True
+
+    def _create(self, path):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"claimed {self.node} {time.time():.0f}")
+        return True
+
+    def _take_over(self, path):
+        """把旧的认领文件改名后重新创建; 改名只有一个节点能成功"""
+        stale = f"{path}.{self.node}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            pass
+        else:
+            os.unlink(stale)
+        return self._create(path)
+
+    def finished(self, result):
+        """处理完成 (或跳过) 时写完成标记, 失败时写失败标记 (作为引擎的 on_result 调用)"""
+        with self.lock:
+            entry = self.held.pop(result.filename, None)
+        if entry is None:
+            return
+        path, st = entry
+        temp_path = f"{path}.{self.node}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.done_marker(st) if result.ok else self.failed_marker(st))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"更新认领文件失败: {result.filename}: {e}")
+
+    def _refresh(self):
+        """定期刷新持有的认领文件的修改时间, 处理时间长的文件不会被当成超时"""
+        while not self.stop.wait(self.timeout / 4):
+            with self.lock:
+                paths = [path for path, _ in self.held.values()]
+            for path in paths:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        """停止刷新, 释放没有处理完的认领 (例如被中断), 其它节点可以立即接手"""
+        self.stop.set()
+        with self.lock:
+            held, self.held = self.held, {}
+        for path, _ in held.values():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
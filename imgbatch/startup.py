@@ -0,0 +1,80 @@
+"""启动耗时报告: 从进程创建到各个里程碑 (窗口可见、第一张图片处理完成等) 的时间
+
+用来发现界面程序启动变慢的改动: python image_processor.py --startup-report 文件 把结果写入 JSON 文件。
+进程创建时间从操作系统读取, 包含 Python 解释器本身的启动; 打包成单个可执行文件时,
+解压发生在另一个 (引导) 进程中, 不计算在内。
+"""
+import ctypes
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("ImageProcessor.startup")
+
+# 里程碑 -> 报告中的说明
+MILESTONES = {
+    "script": "开始执行脚本",
+    "imports": "导入完成",
+    "window": "窗口可见",
+    "engine": "引擎就绪",
+    "first_image": "第一张图片处理完成",
+}
+
+
+def process_age():
+    """当前进程已经运行的秒数, 无法获取时返回 None"""
+    try:
+        if os.name == "nt":
+            return _windows_process_age()
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # 进程名可能包含空格, 从最后一个 ")" 之后开始数: starttime 是第 22 个字段
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _windows_process_age():
+    creation, exit_time, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+    kernel32 = ctypes.windll.kernel32
+    if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(creation), ctypes.byref(exit_time),
+                                    ctypes.byref(kernel), ctypes.byref(user)):
+        return None
+    now = ctypes.c_ulonglong()
+    kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+    # FILETIME 的单位是 100 纳秒
+    return max(0.0, (now.value - creation.value) / 1e7)
+
+
+class StartupTimer:
+    """记录各个里程碑距进程创建的秒数, 每个里程碑只记第一次 (线程安全: 字典赋值是原子的)"""
+
+    def __init__(self):
+        age = process_age()
+        self.origin = time.perf_counter() - (age or 0.0)
+        self.from_process_start = age is not None
+        self.marks = {}
+
+    def mark(self, name, at=None):
+        """记录里程碑; at 为 time.perf_counter() 的读数, 不传时为现在"""
+        if name not in self.marks:
+            self.marks[name] = (at if at is not None else time.perf_counter()) - self.origin
+
+    def to_dict(self):
+        return {"from_process_start": self.from_process_start,
+                "milestones": {name: round(seconds, 4) for name, seconds in self.marks.items()}}
+
+    def format(self):
+        start = "进程创建" if self.from_process_start else "开始计时"
+        return f"启动耗时 (从{start}起): " + ", ".join(
+            f"{MILESTONES.get(name, name)} {seconds * 1000:.0f} 毫秒" for name, seconds in self.marks.items())
+
+    def report(self, path=None):
+        """写日志, path 不为空时同时写入 JSON 文件"""
+        logger.info(self.format())
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
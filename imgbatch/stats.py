@@ -0,0 +1,130 @@
+"""各阶段用时统计 (read / open / decode / resize / encode / write)
+
+工作函数用 StageClock 记录每个阶段的用时并随结果返回, 主进程用 StageStats
+按阶段和输入格式汇总成直方图。关闭统计时工作函数使用 NULL_CLOCK, 没有额外开销。
+"""
+import bisect
+import csv
+import io
+import json
+import time
+
+STAGES = ("read", "open", "decode", "resize", "encode", "write")
+
+# 直方图的桶上限 (毫秒), 最后一个桶收集所有更慢的记录
+BUCKET_BOUNDS_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class StageClock:
+    """按顺序计时: 每次 lap(stage) 把上次 lap 之后的时间记到 stage 上"""
+
+    def __init__(self):
+        self.timings = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+class NullClock:
+    """关闭统计时使用, 什么也不做"""
+    timings = None
+
+    def lap(self, stage):
+        pass
+
+
+NULL_CLOCK = NullClock()
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, ms)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+
+    def percentile(self, pct):
+        """按桶估算的百分位数 (毫秒, 取桶的上限, 不超过最大值)"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKET_BOUNDS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, round(self.max, 3))
+        return round(self.max, 3)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 4),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": round(self.max, 3),
+            "buckets_ms": dict(zip([str(b) for b in BUCKET_BOUNDS_MS] + ["inf"], self.buckets)),
+        }
+
+
+class StageStats:
+    """按阶段、按输入格式汇总的用时直方图 (只在一个线程中更新)"""
+
+    def __init__(self):
+        self.stages = {}  # (输入格式 或 "all", 阶段) -> Histogram
+
+    def add(self, input_format, timings):
+        for stage, seconds in timings.items():
+            for scope in ("all", input_format or "unknown"):
+                key = (scope, stage)
+                if key not in self.stages:
+                    self.stages[key] = Histogram()
+                self.stages[key].add(seconds)
+
+    def rows(self):
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        for scope, stage in sorted(self.stages, key=lambda k: (k[0] != "all", k[0], order.get(k[1], 99))):
+            yield scope, stage, self.stages[(scope, stage)]
+
+    def to_dict(self):
+        result = {}
+        for scope, stage, hist in self.rows():
+            result.setdefault(scope, {})[stage] = hist.to_dict()
+        return result
+
+    def to_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["scope", "stage", "count", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+        for scope, stage, hist in self.rows():
+            d = hist.to_dict()
+            writer.writerow([scope, stage] + [d[k] for k in ("count", "total_s", "mean_ms", "p50_ms",
+                                                             "p95_ms", "max_ms")])
+        return out.getvalue()
+
+    def format_table(self, scope="all"):
+        """给界面统计面板用的简短文本"""
+        lines = [f"{'阶段':<8}{'次数':>7}{'平均ms':>9}{'p95ms':>8}{'合计s':>8}"]
+        for row_scope, stage, hist in self.rows():
+            if row_scope == scope:
+                d = hist.to_dict()
+                lines.append(f"{stage:<10}{d['count']:>7}{d['mean_ms']:>9.1f}{d['p95_ms']:>8}{d['total_s']:>8.1f}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        """按扩展名保存为 .csv 或 JSON"""
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                f.write(self.to_csv())
+            else:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
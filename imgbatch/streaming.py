@@ -0,0 +1,127 @@
+"""超大图像的分条 (strip) 流式缩放
+
+对于超过像素阈值的图像, 不一次解码整张图, 而是按行分条读取原图:
+- TIFF 按文件中的 strip / tile 读取 (只解码与当前条带重叠的部分);
+- 未压缩的单块图像 (BMP、PPM、未压缩单 strip TIFF) 直接按行计算文件偏移。
+每个条带带上上一个条带末尾滤镜支撑范围内的若干行 (保留在内存中, 不重新解码), 用 resize 的 box 参数
+只重采样属于本条带的输出行, 拼接后的结果与整图缩放一致 (缩放比例不是整数时, 个别像素可能因浮点舍入差 1)。
+原图的峰值内存与条带 (新读取的行 + 保留的行) 的大小成正比, 而不是与整张图成正比。
+
+压缩方式需要整体解码的图像 (PNG、GIF、JPEG、LZW/packbits 等 libtiff 压缩的 TIFF) 无法分条读取,
+仍走普通路径 (JPEG 会通过 draft 缩小解码)。
+"""
+
+from .imaging import Image
+from .memory import band_rows, filter_margin
+from .resample import get_filter
+
+# 每个条带读取的原图字节数 (按 Pillow 内部每像素 4 字节估算)
+STRIP_BYTES = 32 * 1024 * 1024
+
+
+def _line_bytes(img, rawmode):
+    """raw 解码器的一行字节数 (stride 为 0 时由像素格式决定)"""
+    return len(Image.new(img.mode, (img.width, 1)).tobytes("raw", rawmode))
+
+
+def can_stream(img):
+    """刚打开 (尚未 load) 的图像能否分条读取"""
+    tiles = img.tile
+    if not tiles or any(tile[0] == "libtiff" for tile in tiles):
+        return False
+    if len(tiles) > 1:
+        return True
+    tile = tiles[0]
+    if tile[0] != "raw" or tile[1] != (0, 0) + img.size:
+        return False
+    try:
+        rawmode = tile[3][0] if isinstance(tile[3], tuple) else tile[3]
+        _line_bytes(img, rawmode)
+    except Exception:
+        return False
+    return True
+
+
+def should_stream(img, job):
+    """超过 job.stream_threshold 像素且能分条读取时走流式缩放"""
+    return bool(job.stream_threshold) and img.width * img.height > job.stream_threshold and can_stream(img)
+
+
+def _replace_tile(tile, extents, offset, args):
+    return type(tile)(tile[0], extents, offset, args) if hasattr(tile, "_fields") else (tile[0], extents, offset, args)
+
+
+def read_band(path, top, bottom):
+    """读取原图的第 top 行到 bottom 行 (不含), 返回新的图像 (调色板图像转换为 RGB/RGBA)"""
+    img = Image.open(path)
+    width, height = img.size
+    tiles = img.tile
+    if len(tiles) == 1:
+        tile = tiles[0]
+        args = tile[3] if isinstance(tile[3], tuple) else (tile[3], 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        stride = stride or _line_bytes(img, rawmode)
+        # orientation 为 -1 时文件中的行从下往上存储 (BMP)
+        first_row = height - bottom if orientation < 0 else top
+        band_tiles = [_replace_tile(tile, (0, 0, width, bottom - top), tile[2] + first_row * stride,
+                                    (rawmode, stride, orientation))]
+        band_top, band_bottom = top, bottom
+    else:
+        selected = [tile for tile in tiles if tile[1][1] < bottom and tile[1][3] > top]
+        band_top = min(tile[1][1] for tile in selected)
+        band_bottom = max(tile[1][3] for tile in selected)
+        band_tiles = [_replace_tile(tile, (tile[1][0], tile[1][1] - band_top, tile[1][2], tile[1][3] - band_top),
+                                    tile[2], tile[3]) for tile in selected]
+
+    # 让解码器只解码这个条带: 图像尺寸改为条带大小, tile 只保留条带中的部分
+    img._size = (width, band_bottom - band_top)
+    img.tile = band_tiles
+    img.load()
+    band = img.crop((0, top - band_top, width, bottom - band_top))
+    img.close()
+    if band.mode == "P":
+        band = band.convert("RGBA" if "transparency" in band.info else "RGB")
+    return band
+
+
+def stream_resize(path, size, sizes, job):
+    """按条带读取 path (原图尺寸 size), 缩放到 sizes 中的每个尺寸, 返回与 sizes 顺序相同的图像列表"""
+    width, height = size
+    resample = get_filter(job.resample)
+    # 保留上一个条带末尾的 overlap 行, 保证每个输出行需要的原图行都在当前条带中
+    strip_rows, overlap = band_rows(width, height, sizes, job.resample, STRIP_BYTES)
+    # 每种输出: [已生成的行数, 垂直缩放比例, 边缘需要多读的行数]
+    states = [[0, height / out_h, filter_margin(job.resample, height / out_h)] for _, out_h in sizes]
+
+    results = [None] * len(sizes)
+    carry = None  # 上一个条带末尾的行 (到原图第 top 行为止)
+    top = 0
+    while top < height:
+        bottom = min(height, top + strip_rows)
+        band = read_band(path, top, bottom)
+        if carry is not None:
+            joined = Image.new(band.mode, (width, carry.height + band.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(band, (0, carry.height))
+            carry.close()
+            band.close()
+            band = joined
+        band_top = bottom - band.height
+        for index, state in enumerate(states):
+            out_w, out_h = sizes[index]
+            if results[index] is None:
+                results[index] = Image.new(band.mode, (out_w, out_h))
+            done, scale_y, margin = state
+            # 本条带能完整生成的输出行: 所需原图行 (含滤镜支撑) 都在 [band_top, bottom) 之内
+            end = out_h if bottom == height else min(out_h, int((bottom - margin) / scale_y))
+            if end > done:
+                box = (0, done * scale_y - band_top, width, end * scale_y - band_top)
+                part = band.resize((out_w, end - done), resample=resample, box=box)
+                results[index].paste(part, (0, done))
+                part.close()
+                state[0] = end
+        carry = band.crop((0, max(0, band.height - overlap), width, band.height))
+        band.close()
+        top = bottom
+    carry.close()
+    return results
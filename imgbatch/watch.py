@@ -0,0 +1,142 @@
+"""监视文件夹: 持续处理放入输入文件夹的新图片
+
+每隔 interval 秒用 os.scandir 扫描一次输入文件夹, 比较每个文件的大小和修改时间,
+只把新增或修改过的文件交给引擎。文件的大小和修改时间在连续两次扫描中保持不变、
+并且至少经过 settle 秒后才认为已经写完 (避免处理复制到一半的文件)。
+
+逐个 stat 大文件夹中的每个文件开销不小, 因此空闲时只检查各文件夹的修改时间:
+新增、删除、改名都会改变所在文件夹的修改时间, 没有变化时跳过这次扫描; 原地覆盖
+已有文件不改变文件夹, 由每 FULL_SCAN_INTERVAL 秒一次的完整扫描发现。
+引擎的执行池在各批之间复用, 空闲时几乎不占 CPU。
+"""
+import logging
+import os
+import time
+
+from .scanner import scan_image_entries
+
+logger = logging.getLogger("ImageProcessor.watch")
+
+# 扫描间隔和文件大小稳定的等待时间 (秒): 从放入文件到开始处理约 1 秒
+DEFAULT_INTERVAL = 0.5
+DEFAULT_SETTLE = 0.5
+# 文件夹没有变化时, 最多隔这么多秒做一次完整扫描
+FULL_SCAN_INTERVAL = 10.0
+# 修改时间距现在不到这么多秒的文件夹总是重新扫描: 修改时间精度较粗的文件系统上,
+# 扫描之后同一时刻的改动不会再改变文件夹的修改时间
+RACY_SECONDS = 2.0
+
+
+class FolderWatcher:
+    """轮询输入文件夹, 找出新增或修改过、并且已经写完的图片"""
+
+    def __init__(self, root, recursive=False, exclude=(), settle=DEFAULT_SETTLE):
+        self.root = root
+        self.recursive = recursive
+        self.exclude = exclude
+        self.settle = settle
+        self.known = {}     # 相对路径 -> 交给引擎处理时的 (大小, 修改时间)
+        self.changing = {}  # 相对路径 -> ((大小, 修改时间), 第一次看到这个状态的时间)
+        self.folders = {}   # 上次完整扫描时含有图片的文件夹 (相对路径) -> 修改时间
+        self.last_full_scan = None
+
+    def folder_mtimes(self, folders):
+        mtimes = {}
+        for folder in folders:
+            try:
+                mtimes[folder] = os.stat(os.path.join(self.root, folder)).st_mtime_ns
+            except OSError:
+                mtimes[folder] = None
+        return mtimes
+
+    def folders_changed(self):
+        mtimes = self.folder_mtimes(self.folders)
+        racy = (time.time() - RACY_SECONDS) * 1e9
+        return mtimes != self.folders or any(mtime is None or mtime > racy for mtime in mtimes.values())
+
+    def poll(self):
+        """扫描一次, 返回已经写完、需要处理的文件的相对路径"""
+        now = time.monotonic()
+        if (not self.changing and self.last_full_scan is not None
+                and now - self.last_full_scan < FULL_SCAN_INTERVAL and not self.folders_changed()):
+            return []
+        self.last_full_scan = now
+        ready = []
+        present = set()
+        for filename, entry in scan_image_entries(self.root, self.recursive, self.exclude):
+            try:
+                st = entry.stat()
+            except OSError:
+                # 扫描后被删除或改名
+                continue
+            present.add(filename)
+            state = (st.st_size, st.st_mtime_ns)
+            if self.known.get(filename) == state:
+                self.changing.pop(filename, None)
+                continue
+            seen = self.changing.get(filename)
+            if seen is None or seen[0] != state:
+                # 第一次看到, 或者上次扫描之后还在写入
+                self.changing[filename] = (state, now)
+            elif now - seen[1] >= self.settle:
+                del self.changing[filename]
+                self.known[filename] = state
+                ready.append(filename)
+        # 已经删除的文件不再记录, 以后出现同名文件时重新处理
+        for filename in self.known.keys() - present:
+            del self.known[filename]
+        for filename in self.changing.keys() - present:
+            del self.changing[filename]
+        self.folders = self.folder_mtimes({""} | {os.path.dirname(filename) for filename in present})
+        return ready
+
+    def forget(self, filenames):
+        """处理出错的文件下次完整扫描时重新处理"""
+        for filename in filenames:
+            self.known.pop(filename, None)
+
+
+def watch_folder(engine, job, stop, interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE, on_batch=None,
+                 **run_options):
+    """监视 job.input_dir, 直到 stop (threading.Event) 被设置
+
+    每次扫描得到的就绪文件作为一批交给 engine.run (run_options 原样传给 run, 例如 on_result / stats),
+    完成后以 BatchSummary 调用 on_batch。启动时已有的文件也会作为第一批, 开启增量处理时
+    未变化的文件由清单跳过。处理失败的文件在下次完整扫描时重试 (空闲时最多每 FULL_SCAN_INTERVAL 秒一次)。
+    """
+    watcher = FolderWatcher(job.input_dir, job.recursive, exclude=[job.output_dir], settle=settle)
+    on_result = run_options.pop("on_result", None)
+    failed = []
+
+    def record(result):
+        if not result.ok:
+            failed.append(result.filename)
+        if on_result is not None:
+            on_result(result)
+
+    logger.info(f"开始监视文件夹: {job.input_dir} (扫描间隔 {interval} 秒)")
+    while not stop.is_set():
+        try:
+            ready = watcher.poll()
+        except OSError as e:
+            logger.error("读取输入文件夹失败: %s", e)
+            ready = []
+        if ready:
+            failed.clear()
+            try:
+                summary = engine.run(job, files=ready, on_result=record, **run_options)
+            except Exception as e:
+                logger.exception("处理过程中发生错误: %s", e)
+                watcher.forget(ready)
+            else:
+                watcher.forget(failed)
+                if not summary.total:
+                    # 只有本任务生成的输出 (输出到输入文件夹时) 或其它节点认领的文件
+                    stop.wait(interval)
+                    continue
+                logger.info(f"监视: 处理 {summary.total} 个, 成功 {summary.succeeded} 个, 失败 {summary.failed} 个, "
+                            f"跳过 {summary.skipped} 个, 用时 {summary.elapsed:.2f} 秒")
+                if on_batch is not None:
+                    on_batch(summary)
+        stop.wait(interval)
+    logger.info("停止监视文件夹")
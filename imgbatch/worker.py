@@ -0,0 +1,102 @@
+"""工作函数: 处理单个图像
+
+该函数位于模块顶层, 可以在线程池或进程池中运行。所有参数都来自 JobSpec,
+结果以 ImageResult 返回, 由主进程负责更新界面和写日志。
+"""
+import io
+import logging
+import os
+import time
+
+from .encoders import save_image
+from .imaging import Image
+from .job import ImageResult, is_supported_image
+from .pipeline import atomic_write
+from .resample import render_sizes, request_draft
+from .stats import NULL_CLOCK, StageClock
+from .streaming import should_stream, stream_resize
+
+logger = logging.getLogger("ImageProcessor.worker")
+
+# 与 prescan 相同: 超大图像由引擎的内存预算控制, 不使用 Pillow 的解压炸弹检查
+Image.MAX_IMAGE_PIXELS = None
+
+
+def process_single_image(job, filename, data=None, write=True):
+    """处理单个图像 (在工作线程/子进程中运行)
+
+    data 是引擎预读的文件内容, None 时从磁盘读取; write 为 False 时不写文件,
+    编码结果放在 ImageResult.encoded 中交给引擎的写出线程。
+    不写警告和错误日志: 每个文件的处理记录 (包括错误信息) 由引擎在收集结果时写一条
+    (进程池中的子进程没有日志处理器, 记录只会输出到标准错误)。
+    """
+    start = time.perf_counter()
+    clock = StageClock() if job.collect_stats else NULL_CLOCK
+    try:
+        if not is_supported_image(filename):
+            return ImageResult(filename, False, error=f"不支持的文件类型: {filename}")
+
+        img_path = os.path.join(job.input_dir, filename)
+        try:
+            img = Image.open(io.BytesIO(data) if data is not None else img_path)
+        except Exception as e:
+            return ImageResult(filename, False, error=f"打开图像 {filename} 失败: {e}")
+        clock.lap("open")
+
+        input_format = img.format
+        renditions = job.get_renditions()
+        outputs = job.output_names(filename)
+        resized_imgs = []
+        encoded = []
+        try:
+            original_size = img.size
+            sizes = [r.target_size(original_size) for r in renditions]
+            if data is None and should_stream(img, job):
+                # 超大图像: 按条带读取原图并缩放 (解码和缩放交替进行, 都计入 resize)
+                logger.debug("  分条处理超大图像 %s", filename)
+                img.close()
+                try:
+                    resized_imgs = stream_resize(img_path, original_size, sizes, job)
+                except Exception as e:
+                    return ImageResult(filename, False, error=f"调整图像 {filename} 尺寸失败: {e}")
+                clock.lap("resize")
+            else:
+                try:
+                    request_draft(img, sizes, job)
+                    img.load()
+                except Exception as e:
+                    return ImageResult(filename, False, error=f"解码图像 {filename} 失败: {e}")
+                clock.lap("decode")
+
+                try:
+                    # 原图只解码一次, 每种输出规格从最接近的中间结果缩放
+                    resized_imgs = render_sizes(img, original_size, sizes, job)
+                except Exception as e:
+                    return ImageResult(filename, False, error=f"调整图像 {filename} 尺寸失败: {e}")
+                clock.lap("resize")
+
+            try:
+                for rendition, output_filename, resized_img in zip(renditions, outputs, resized_imgs):
+                    # 先编码到内存, 再一次写入文件 (分开统计编码和写盘用时)
+                    buffer = io.BytesIO()
+                    save_image(resized_img, buffer, rendition.format, job.preset_for(rendition))
+                    clock.lap("encode")
+                    if write:
+                        atomic_write(os.path.join(job.output_dir, output_filename), buffer.getbuffer())
+                        clock.lap("write")
+                    else:
+                        encoded.append(buffer.getvalue())
+            except Exception as e:
+                return ImageResult(filename, False, error=f"保存图像 {filename} 失败: {e}")
+        finally:
+            # 释放图像资源 (重要!)
+            for resized_img in resized_imgs:
+                resized_img.close()
+            img.close()
+
+        return ImageResult(filename, True, outputs, elapsed=time.perf_counter() - start,
+                           input_format=input_format, timings=clock.timings, encoded=tuple(encoded))
+
+    except Exception as e:
+        # 捕获 *所有* 异常, 保证工作进程不会因为单个文件退出
+        return ImageResult(filename, False, error=f"处理文件 {filename} 时发生未知错误: {e}")
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# 从仓库根目录导入 imgbatch (仓库没有安装包)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_image(path, size=(64, 48), color=(200, 30, 30), fmt=None):
+    """生成一张纯色加渐变的测试图片 (渐变让缩放结果对重采样方式敏感)"""
+    image = Image.new("RGB", size, color)
+    for x in range(size[0]):
+        image.putpixel((x, x * size[1] // size[0]), (x * 255 // size[0], 255 - color[1], color[2]))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image.save(path, fmt)
+    return path
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """含几张小图片的输入文件夹"""
+    root = tmp_path / "in"
+    for index in range(6):
+        make_image(str(root / f"img{index}.png"), color=(index * 40, 100, 50))
+    return root
+
+
+@pytest.fixture
+def engine():
+    """线程池后端的引擎 (测试中不启动子进程)"""
+    from imgbatch.engine import BatchEngine
+
+    engine = BatchEngine("threads", 2)
+    yield engine
+    engine.shutdown()
@@ -0,0 +1,24 @@
+import json
+
+from imgbatch.autotune import TuningStore, WorkerTuner
+from imgbatch.engine import BatchEngine
+from imgbatch.executors import AUTO_WORKERS
+from imgbatch.job import JobSpec
+
+
+def test_summary_reports_remembered_workers(image_dir, tmp_path):
+    """-w auto: 汇总中的并发数是选定 (并记住) 的值, 不是批次结束时正在试探的值"""
+    output = tmp_path / "out"
+    output.mkdir()
+    engine = BatchEngine("threads", AUTO_WORKERS)
+    engine.tuning_store = TuningStore(str(tmp_path / "autotune.json"))
+    tuner = WorkerTuner(limit=4, start=3)
+    tuner.best = (10.0, 2)  # 2 个任务时最快, 正在试探 3 个
+    engine.create_tuner = lambda job: tuner
+    try:
+        summary = engine.run(JobSpec(str(image_dir), str(output)))
+    finally:
+        engine.shutdown()
+    assert summary.workers == 2
+    with open(tmp_path / "autotune.json", encoding="utf-8") as f:
+        assert list(json.load(f).values()) == [2]
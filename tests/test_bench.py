@@ -0,0 +1,10 @@
+import os
+
+from imgbatch.bench import generate_corpus
+
+
+def test_corpus_formats_have_distinct_output_names(tmp_path):
+    """同一张图的不同格式输出到不同的文件, 不会互相覆盖"""
+    files = generate_corpus(str(tmp_path), ["thumb"], ["JPEG", "PNG", "TIFF"], 2)
+    stems = {os.path.splitext(item["name"])[0] for item in files}
+    assert len(stems) == len(files) == 6
@@ -0,0 +1,46 @@
+import pytest
+
+from imgbatch.cli import build_parser
+from imgbatch.job import Rendition
+
+
+def parse(*argv):
+    return build_parser().parse_args(["-i", "in", "-o", "out", *argv])
+
+
+@pytest.mark.parametrize("scale", ["0", "-0.5", "nan", "inf", "abc"])
+def test_invalid_scale_rejected(scale):
+    with pytest.raises(SystemExit):
+        parse("--scale", scale)
+
+
+@pytest.mark.parametrize("size", ["0x0", "-100x50", "100x-1", "100", "ax b"])
+def test_invalid_size_rejected(size):
+    with pytest.raises(SystemExit):
+        parse("--size", size)
+
+
+def test_valid_scale_and_size():
+    assert parse("--scale", "0.25").scale == 0.25
+    assert parse("--size", "800x600").size == (800, 600)
+    assert parse("--size", "800X0").size == (800, 0)
+
+
+def test_renditions_from_json_and_file(tmp_path):
+    text = '[{"width": 150}, {"scale": 0.5, "format": "png", "suffix": "half", "preset": "smallest"}]'
+    thumb, half = parse("--renditions", text).renditions
+    assert thumb == Rendition(width=150)
+    assert half == Rendition(scale=0.5, format="PNG", suffix="half", preset="smallest")
+    spec = tmp_path / "renditions.json"
+    spec.write_text(text, encoding="utf-8")
+    assert parse("--renditions", f"@{spec}").renditions == (thumb, half)
+
+
+@pytest.mark.parametrize("text", [
+    '{"width": 150}', "[]", "[150]", '[{"width": "150"}]', '[{"width": true}]', '[{"scale": -1}]',
+    '[{"width": -1, "height": 100}]', '[{"format": "webp", "width": 10}]', '[{"suffix": "x"}]',
+    '[{"width": 10, "colour": "red"}]', '[{"width": 10, "preset": "best"}]', "not json", "@missing.json",
+])
+def test_invalid_renditions_rejected(text):
+    with pytest.raises(SystemExit):
+        parse("--renditions", text)
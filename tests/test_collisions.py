@@ -0,0 +1,48 @@
+import zipfile
+
+from PIL import Image
+
+from imgbatch.job import JobSpec
+
+from conftest import make_image
+
+
+def test_same_stem_reported_for_folder_output(tmp_path, engine):
+    """a.jpg 和 a.png 都输出为 a.jpeg: 只处理先扫描到的, 另一个报告为错误"""
+    source, output = tmp_path / "in", tmp_path / "out"
+    make_image(str(source / "a.png"), size=(40, 30))
+    make_image(str(source / "a.jpg"), size=(20, 10))
+    output.mkdir()
+    summary = engine.run(JobSpec(str(source), str(output)))
+    assert summary.succeeded == 1 and summary.failed == 1
+    assert "a.jpeg" in summary.errors[0]
+    loser = "a.jpg" if summary.errors[0].startswith("a.jpg") else "a.png"
+    assert Image.open(output / "a.jpeg").size == ((40, 30) if loser == "a.jpg" else (20, 10))
+
+
+def test_same_stem_reported_for_archive_output_and_subfolders_included(tmp_path, engine):
+    archive = tmp_path / "in.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name in ("a.png", "a.jpg", "sub/b.png"):
+            zf.write(make_image(str(tmp_path / "src" / name)), name)
+    summary = engine.run(JobSpec(str(archive), str(tmp_path / "out.zip")))
+    assert summary.succeeded == 2 and summary.failed == 1
+    assert summary.errors[0].startswith("a.jpg")
+    with zipfile.ZipFile(tmp_path / "out.zip") as zf:
+        assert sorted(zf.namelist()) == ["a.jpeg", "sub/b.jpeg"]
+
+
+def test_collision_detected_across_watch_batches(tmp_path, engine):
+    """清单记录了 a.jpeg 由 a.jpg 生成: 以后一批中的 a.png 报告为冲突, 删除 a.jpg 之后才处理"""
+    source, output = tmp_path / "in", tmp_path / "out"
+    make_image(str(source / "a.jpg"), size=(20, 10))
+    output.mkdir()
+    job = JobSpec(str(source), str(output))
+    assert engine.run(job, files=["a.jpg"]).succeeded == 1
+    make_image(str(source / "a.png"), size=(40, 30))
+    summary = engine.run(job, files=["a.png"])
+    assert summary.failed == 1 and "a.jpg" in summary.errors[0]
+    assert Image.open(output / "a.jpeg").size == (20, 10)
+    (source / "a.jpg").unlink()
+    assert engine.run(job, files=["a.png"]).succeeded == 1
+    assert Image.open(output / "a.jpeg").size == (40, 30)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import zipfile
+from dataclasses import replace
+
+from imgbatch.job import DEDUP_LINK, JobSpec
+
+from conftest import make_image
+
+
+def test_duplicates_processed_once_and_linked(image_dir, tmp_path, engine):
+    for name in ("copy1.png", "copy2.png"):
+        shutil.copy(image_dir / "img0.png", image_dir / name)
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), scale=0.5, dedup=DEDUP_LINK)
+    summary = engine.run(job)
+    assert summary.succeeded == 8 and summary.decodes_saved == 2
+    assert os.path.samefile(output / "copy1.jpeg", output / "img0.jpeg")
+    assert os.path.samefile(output / "copy2.jpeg", output / "img0.jpeg")
+    # 以后的批次遇到相同内容的新文件, 直接复用清单中记录的输出
+    shutil.copy(image_dir / "img0.png", image_dir / "copy3.png")
+    summary = engine.run(job)
+    assert summary.decodes_saved == 1 and summary.skipped == 8
+    assert os.path.samefile(output / "copy3.jpeg", output / "img0.jpeg")
+
+
+def test_archive_followers_keep_content_when_leader_fails(tmp_path, engine):
+    """领头的文件处理失败时, 压缩包中内容相同的文件用自己的内容重新处理, 报告真实的错误"""
+    archive = tmp_path / "in.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name in ("a.png", "b.png"):
+            zf.writestr(name, b"not an image")
+        zf.write(make_image(str(tmp_path / "ok.png")), "ok.png")
+    output = tmp_path / "out"
+    output.mkdir()
+    summary = engine.run(JobSpec(str(archive), str(output), dedup=DEDUP_LINK))
+    assert summary.succeeded == 1 and summary.failed == 2
+    assert all("cannot identify image file" in error for error in summary.errors), summary.errors
+
+
+def test_force_reencodes_instead_of_reusing_own_output(image_dir, tmp_path, engine):
+    """--force 时不复用清单中的输出: 损坏的输出会重新生成, 也不算节省了解码"""
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), dedup=DEDUP_LINK)
+    assert engine.run(job).succeeded == 6
+    (output / "img0.jpeg").write_bytes(b"garbage")
+    summary = engine.run(replace(job, incremental=False))
+    assert summary.succeeded == 6 and summary.decodes_saved == 0
+    assert (output / "img0.jpeg").read_bytes()[:2] == b"\xff\xd8"
+
+
+def test_own_output_never_used_as_dedup_source(image_dir, tmp_path, engine):
+    """增量运行中输入变化 (修改时间) 但内容相同: 不把自己的旧输出当作来源"""
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), dedup=DEDUP_LINK)
+    assert engine.run(job).succeeded == 6
+    st = os.stat(image_dir / "img0.png")
+    os.utime(image_dir / "img0.png", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    summary = engine.run(job)
+    assert summary.succeeded == 1 and summary.decodes_saved == 0
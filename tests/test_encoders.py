@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from PIL import Image
+
+from imgbatch.encoders import save_image
+
+# 各预设传给 Image.save 的参数 (与 readme 中的说明一致); balanced 与加入预设之前的输出相同, 不传参数
+EXPECTED = {
+    "JPEG": ({}, {}, {"optimize": True, "progressive": True}),
+    "PNG": ({"compress_level": 1}, {}, {"compress_level": 9}),
+    "GIF": ({}, {}, {"optimize": True}),
+    "BMP": ({}, {}, {}),
+    "TIFF": ({}, {}, {"compression": "tiff_adobe_deflate"}),
+}
+
+
+@pytest.mark.parametrize("output_format", EXPECTED)
+def test_presets_reach_save_with_documented_options(output_format, monkeypatch):
+    calls = []
+    save = Image.Image.save
+
+    def recording_save(img, fp, format=None, **params):
+        calls.append((format, params))
+        return save(img, fp, format=format, **params)
+
+    monkeypatch.setattr(Image.Image, "save", recording_save)
+    img = Image.new("RGB", (16, 16), "red")
+    for preset in ("fastest", "balanced", "smallest"):
+        save_image(img, io.BytesIO(), output_format, preset)
+    assert calls == [(output_format, params) for params in EXPECTED[output_format]]
+
+
+def test_balanced_matches_plain_save():
+    img = Image.effect_noise((64, 64), 40).convert("RGB")
+    for output_format in EXPECTED:
+        plain, balanced = io.BytesIO(), io.BytesIO()
+        img.save(plain, format=output_format)
+        save_image(img, balanced, output_format, "balanced")
+        assert balanced.getvalue() == plain.getvalue()
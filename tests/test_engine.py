@@ -0,0 +1,41 @@
+import logging
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from imgbatch.job import JobSpec
+
+
+class CrashingPool(ThreadPoolExecutor):
+    """处理 crash.png 时表现得像工作进程崩溃了的执行池"""
+
+    def submit(self, fn, job, filename, *args):
+        if filename != "crash.png":
+            return super().submit(fn, job, filename, *args)
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+
+def test_broken_pool_fails_items_and_is_recreated(image_dir, tmp_path, engine):
+    (image_dir / "img0.png").rename(image_dir / "crash.png")
+    (tmp_path / "out").mkdir()
+    (tmp_path / "again").mkdir()
+    broken = engine.executor = CrashingPool(2)
+    summary = engine.run(JobSpec(str(image_dir), str(tmp_path / "out")))
+    assert summary.total == 6 and summary.failed == 1
+    assert "crash.png" in summary.errors[0]
+    assert engine.executor is not broken
+    summary = engine.run(JobSpec(str(image_dir), str(tmp_path / "again")))
+    assert summary.succeeded == 6
+
+
+def test_failed_file_logged_once_by_engine(image_dir, tmp_path, engine, caplog):
+    """工作函数不写错误日志, 每个失败的文件只有引擎写的一条记录"""
+    (image_dir / "img0.png").write_bytes(b"not an image")
+    (tmp_path / "out").mkdir()
+    summary = engine.run(JobSpec(str(image_dir), str(tmp_path / "out")))
+    assert summary.failed == 1
+    errors = [record for record in caplog.records if record.levelno >= logging.ERROR]
+    assert [record.name for record in errors] == ["ImageProcessor.engine"]
+    assert "img0.png" in errors[0].getMessage()
@@ -0,0 +1,87 @@
+import os
+
+from imgbatch.job import ImageResult, JobSpec
+from imgbatch.journal import Journal, journal_path
+
+
+def reload(job):
+    """读取日志后立即关闭, 返回读到的 Journal (不追加结束标记)"""
+    journal = Journal(job, resume=True)
+    journal.close(False)
+    return journal
+
+
+def test_resume_skips_done_and_retries_failed(tmp_path):
+    job = JobSpec(str(tmp_path / "in"), str(tmp_path))
+    journal = Journal(job)
+    journal.record(ImageResult("a.png", True))
+    journal.record(ImageResult("b\tname.png", True))
+    journal.record(ImageResult("c.png", False, error="坏\n文件"))
+    journal.close(False)
+    resumed = Journal(job, resume=True)
+    resumed.close(True)
+    assert resumed.done == {"a.png", "b\tname.png"}
+    assert resumed.failed == {"c.png": "坏\n文件"} and not resumed.finished
+    assert reload(job).finished
+
+
+def test_torn_tail_ignored_and_trimmed(tmp_path):
+    """崩溃时写了一半的最后一行不算完成, 续传时新的记录从完整的行之后开始"""
+    job = JobSpec(str(tmp_path / "in"), str(tmp_path))
+    journal = Journal(job)
+    journal.record(ImageResult("a.png", True))
+    journal.close(False)
+    with open(journal_path(job), "ab") as f:
+        f.write(b"ok\tb.pn")
+    resumed = Journal(job, resume=True)
+    assert resumed.done == {"a.png"}
+    resumed.record(ImageResult("c.png", True))
+    resumed.close(False)
+    assert reload(job).done == {"a.png", "c.png"}
+
+
+def test_new_run_truncates_and_watch_batches_append(tmp_path):
+    job = JobSpec(str(tmp_path / "in"), str(tmp_path))
+    journal = Journal(job)
+    journal.record(ImageResult("a.png", True))
+    journal.close(True)
+    batch = Journal(job, append=True)
+    batch.record(ImageResult("b.png", True))
+    batch.close(False)
+    assert reload(job).done == {"a.png", "b.png"}
+    Journal(job).close(False)
+    assert reload(job).done == set()
+
+
+def test_completed_watch_batch_compacts_journal(tmp_path):
+    """监视模式的一批正常结束后日志只剩结束标记, 不会随监视时间增长"""
+    job = JobSpec(str(tmp_path / "in"), str(tmp_path))
+    for name in ("a.png", "b.png"):
+        batch = Journal(job, append=True)
+        batch.record(ImageResult(name, True))
+        batch.record(ImageResult("bad.png", False, error="坏文件"))
+        batch.close(True)
+        with open(journal_path(job), "rb") as f:
+            assert f.read() == b"end\n"
+    journal = reload(job)
+    assert journal.finished and not journal.done and not journal.failed
+
+
+def test_claim_runs_write_no_journal(image_dir, tmp_path, engine):
+    """动态认领时已完成的文件由完成标记跳过, 不写日志"""
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), node="host-1")
+    assert engine.run(job).succeeded == 6
+    assert not os.path.exists(journal_path(job))
+
+
+def test_engine_resume_skips_journaled_files(image_dir, tmp_path, engine):
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), incremental=False)
+    assert engine.run(job).succeeded == 6
+    os.remove(output / "img0.jpeg")
+    summary = engine.run(job, resume=True)
+    # 续传时不再检查日志中已完成的文件 (包括输出被删除的)
+    assert summary.skipped == 6 and not (output / "img0.jpeg").exists()
@@ -0,0 +1,71 @@
+import os
+from dataclasses import replace
+
+import pytest
+
+from imgbatch import manifest
+from imgbatch.job import JobSpec
+from imgbatch.manifest import Manifest
+
+from conftest import make_image
+
+
+def test_shared_manifest_commits_each_record(tmp_path):
+    """同一台机器上的多个进程共用清单时, 一个连接的记录不能长时间占着写锁"""
+    path = tmp_path / "a.png"
+    path.write_bytes(b"x")
+    st = os.stat(path)
+    first = Manifest(str(tmp_path), name="shared.sqlite3", shared=True)
+    second = Manifest(str(tmp_path), name="shared.sqlite3", shared=True)
+    try:
+        first.record("a.png", str(path), st, "p", ["a.jpeg"])
+        second.record("b.png", str(path), st, "p", ["b.jpeg"])
+        count = second.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        assert count == 2
+    finally:
+        first.close()
+        second.close()
+
+
+def test_unchanged_files_skipped(image_dir, tmp_path, engine):
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), scale=0.5)
+    assert engine.run(job).succeeded == 6
+    summary = engine.run(job)
+    assert summary.skipped == 6 and summary.succeeded == 0
+    # 参数变化、输入变化或输出被删除时重新处理
+    assert engine.run(replace(job, scale=0.25)).succeeded == 6
+    make_image(str(image_dir / "img1.png"), color=(1, 2, 3))
+    os.remove(output / "img2.jpeg")
+    summary = engine.run(replace(job, scale=0.25))
+    assert summary.succeeded == 2 and summary.skipped == 4
+
+
+def test_hash_skips_touched_files_without_rereading(image_dir, tmp_path, engine, monkeypatch):
+    """--hash: 只有修改时间变化的文件按内容哈希跳过; 哈希由读取线程计算, 记录时不再读输入"""
+    output = tmp_path / "out"
+    output.mkdir()
+    job = JobSpec(str(image_dir), str(output), verify_hash=True)
+    monkeypatch.setattr(manifest, "file_digest", lambda path: pytest.fail(f"重复读取 {path}"))
+    assert engine.run(job).succeeded == 6
+    st = os.stat(image_dir / "img0.png")
+    os.utime(image_dir / "img0.png", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    monkeypatch.undo()
+    summary = engine.run(job)
+    assert summary.skipped == 6
+
+
+def test_output_index_built_for_old_manifest(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"x")
+    old = Manifest(str(tmp_path))
+    old.record("a.png", str(path), os.stat(path), "p", ["a.jpeg", "a_w150.jpeg"])
+    old.conn.execute("DROP TABLE outputs")
+    old.close()
+    reopened = Manifest(str(tmp_path))
+    try:
+        assert reopened.output_owner("a_w150.jpeg") == "a.png"
+        assert reopened.output_owner("b.jpeg") is None
+    finally:
+        reopened.close()
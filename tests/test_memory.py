@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from imgbatch.engine import BatchEngine, _BatchRun
+from imgbatch.job import JobSpec
+from imgbatch.memory import STRIP_BYTES, estimate_working_set
+from imgbatch.prescan import WorkItem
+from imgbatch.progress import ProgressTracker
+
+MB = 1024 * 1024
+
+
+def fake_item(name, memory):
+    return WorkItem(name, name, None, memory=memory)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    engine = BatchEngine("threads", 4, memory_budget=100 * MB)
+    run = _BatchRun(engine, JobSpec(str(tmp_path), str(tmp_path)), ProgressTracker(), None)
+    yield run
+    run.close()
+    engine.shutdown()
+
+
+def dispatch(batch, item):
+    """与 execute 中派发时一样记账 (不真正提交)"""
+    batch.pending[object()] = item
+    batch.memory_in_use += item.memory
+
+
+def test_budget_blocks_dispatch(batch):
+    dispatch(batch, fake_item("a.png", 60 * MB))
+    assert not batch._admit(fake_item("b.png", 50 * MB))
+    assert batch._admit(fake_item("c.png", 40 * MB))
+    dispatch(batch, fake_item("c.png", 40 * MB))
+    assert not batch._admit(fake_item("d.png", 1))
+
+
+def test_item_over_budget_runs_alone(batch):
+    huge = fake_item("huge.tif", 500 * MB)
+    # 没有其它任务时派发, 运行期间不再派发其它任务
+    assert batch._admit(huge)
+    dispatch(batch, huge)
+    assert not batch._admit(fake_item("small.png", 1))
+    # 有其它任务在运行时要等它们完成
+    batch.pending.clear()
+    batch.memory_in_use = 0
+    dispatch(batch, fake_item("a.png", 1))
+    assert not batch._admit(huge)
+
+
+def test_no_budget_admits_everything(batch):
+    batch.engine.memory_budget = None
+    dispatch(batch, fake_item("a.png", 500 * MB))
+    assert batch._admit(fake_item("b.png", 500 * MB))
+
+
+class CountingPool(ThreadPoolExecutor):
+    """记录同时在运行的任务数的峰值 (每个任务至少运行 50 毫秒, 不限制时一定会重叠)"""
+
+    def __init__(self, workers):
+        super().__init__(workers)
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def submit(self, fn, *args):
+        def counted():
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(0.05)
+            try:
+                return fn(*args)
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return super().submit(counted)
+
+
+def test_engine_runs_items_over_budget_one_at_a_time(image_dir, tmp_path):
+    (tmp_path / "out").mkdir()
+    engine = BatchEngine("threads", 4, memory_budget=1)
+    pool = engine.executor = CountingPool(4)
+    try:
+        summary = engine.run(JobSpec(str(image_dir), str(tmp_path / "out")))
+    finally:
+        engine.shutdown()
+    assert summary.succeeded == 6 and pool.peak == 1
+
+
+def test_streamed_estimate_uses_strips():
+    """流式缩放的工作集取决于条带大小, 与图像高度无关; 不流式时按整张解码估算"""
+    job = JobSpec("", "", scale=0.5)
+    estimates = {}
+    for height in (20000, 80000):
+        item = WorkItem("big.tif", "", None, width=20000, height=height, mode="RGB", streamed=True)
+        outputs = 10000 * (height // 2) * 4
+        estimates[height] = estimate_working_set(item, job) - outputs
+    assert estimates[20000] == estimates[80000]
+    assert 2 * STRIP_BYTES <= estimates[20000] < 3 * STRIP_BYTES
+    whole = WorkItem("big.tif", "", None, width=20000, height=20000, mode="RGB")
+    assert estimate_working_set(whole, job) == int(20000 * 20000 * 4 * 1.25) + 10000 * 10000 * 4
@@ -0,0 +1,38 @@
+from PIL import Image
+
+from conftest import make_image
+from imgbatch.preview import Proxy, ProxyCache, load_proxy
+
+
+def proxy(side):
+    return Proxy(Image.new("RGB", (side, side)), (side * 4, side * 4), "PNG")
+
+
+def test_lru_evicts_by_bytes():
+    cache = ProxyCache(max_bytes=3 * 100 * 100 * 4)
+    for key in "abc":
+        cache.put(key, proxy(100))
+    assert cache.nbytes == cache.max_bytes
+    # 读取过的 a 变成最近使用, 放入 d 时淘汰最久没用的 b
+    assert cache.get("a") is not None
+    cache.put("d", proxy(100))
+    assert "b" not in cache and all(key in cache for key in "acd")
+    # 同一个键重新放入不重复计算字节数; 一张大图淘汰其它所有项, 但自己保留
+    cache.put("d", proxy(100))
+    assert cache.nbytes == cache.max_bytes and len(cache) == 3
+    cache.put("big", proxy(400))
+    assert list(cache.entries) == ["big"] and cache.nbytes == 400 * 400 * 4
+
+
+def test_warm_ahead_keeps_current_image(tmp_path):
+    """与界面的预览一样: 显示当前图片后预先解码后面两张, 切换到下一张时直接命中缓存"""
+    paths = [str(make_image(tmp_path / f"img{i}.png", (800, 600))) for i in range(6)]
+    cache = ProxyCache(max_bytes=3 * 800 * 600 * 4)
+    cache.put(paths[0], load_proxy(paths[0]))
+    for i, path in enumerate(paths):
+        assert cache.get(path) is not None
+        for ahead in paths[i + 1:i + 3]:
+            if ahead not in cache:
+                cache.put(ahead, load_proxy(ahead))
+        # 缓存只放得下三张: 当前图片虽然最先放入, 预先解码后面两张时也不会被淘汰
+        assert set(paths[i:i + 3]) <= set(cache.entries) and len(cache) == 3
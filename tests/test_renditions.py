@@ -0,0 +1,70 @@
+import os
+
+from PIL import Image, ImageChops, ImageFilter
+
+from imgbatch.job import JobSpec, Rendition
+from imgbatch.manifest import Manifest
+from imgbatch.resample import render_sizes
+
+RENDITIONS = (Rendition(width=200, format="PNG"), Rendition(scale=0.25, format="PNG"),
+              Rendition(width=48, height=48, format="PNG", suffix="icon"), Rendition(height=90, format="JPEG"))
+
+
+def test_output_names():
+    names = [r.output_name(os.path.join("sub", "a.png")) for r in RENDITIONS]
+    assert names == [os.path.join("sub", name) for name in ("a_w200.png", "a_s0.25.png", "a_icon.png", "a_h90.jpeg")]
+    assert Rendition(scale=0.5, suffix="").output_name("a.png") == "a.jpeg"
+
+
+def test_largest_first_from_intermediate(monkeypatch):
+    """从大到小生成, 宽高比一致的中间结果作为更小规格的来源"""
+    img = Image.new("RGB", (800, 600), "blue")
+    calls = []
+    resize = Image.Image.resize
+
+    def recording_resize(self, size, **kwargs):
+        calls.append((self.size, size))
+        return resize(self, size, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "resize", recording_resize)
+    sizes = [(100, 75), (400, 300), (50, 50)]
+    outputs = render_sizes(img, img.size, sizes, JobSpec("", "", reducing_gap=None))
+    assert [out.size for out in outputs] == sizes
+    # 50x50 宽高比不同, 但 100x75 已经够大, 也从它缩放
+    assert calls == [((800, 600), (400, 300)), ((400, 300), (100, 75)), ((100, 75), (50, 50))]
+
+
+def test_renditions_match_direct_resizes(tmp_path, engine):
+    source = Image.effect_noise((640, 480), 30).convert("RGB").filter(ImageFilter.BoxBlur(4))
+    source.save(tmp_path / "photo.png")
+    (tmp_path / "out").mkdir()
+    job = JobSpec(str(tmp_path), str(tmp_path / "out"), renditions=RENDITIONS[:3], reducing_gap=None)
+    assert engine.run(job, files=["photo.png"]).succeeded == 1
+    for rendition in RENDITIONS[:3]:
+        size = rendition.target_size(source.size)
+        direct = source.resize(size, resample=Image.Resampling.LANCZOS)
+        with Image.open(tmp_path / "out" / rendition.output_name("photo.png")) as out:
+            assert out.size == size
+            # 从中间结果缩放与直接缩放只有很小的差别
+            diff = ImageChops.difference(out.convert("RGB"), direct)
+            assert max(high for _, high in diff.getextrema()) <= 4
+
+
+def test_manifest_tracks_every_output(image_dir, tmp_path, engine):
+    out = tmp_path / "out"
+    out.mkdir()
+    job = JobSpec(str(image_dir), str(out), renditions=RENDITIONS)
+    assert engine.run(job).succeeded == 6
+    manifest = Manifest(str(out))
+    try:
+        for i in range(6):
+            for rendition in RENDITIONS:
+                output = rendition.output_name(f"img{i}.png")
+                assert (out / output).exists() and manifest.output_owner(output) == f"img{i}.png"
+    finally:
+        manifest.close()
+    # 任何一种输出丢失时只重新处理那个文件
+    os.remove(out / RENDITIONS[2].output_name("img3.png"))
+    summary = engine.run(job)
+    assert summary.succeeded == 1 and summary.skipped == 5
+    assert (out / RENDITIONS[2].output_name("img3.png")).exists()
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from imgbatch.job import ImageResult
+from imgbatch.shard import ClaimBoard
+
+from conftest import ROOT, make_image
+
+
+def test_claim_race_each_file_claimed_once(tmp_path):
+    """几个节点同时认领同一批文件, 每个文件只有一个节点认领成功"""
+    st = os.stat(tmp_path)
+    boards = [ClaimBoard(str(tmp_path), "params", node=f"node{index}") for index in range(4)]
+    names = [f"{index}.png" for index in range(200)]
+    claims = {board.node: [] for board in boards}
+    start = threading.Barrier(len(boards))
+
+    def claim(board):
+        start.wait()
+        claims[board.node].extend(name for name in names if board.select(name, st))
+
+    threads = [threading.Thread(target=claim, args=(board,)) for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for board in boards:
+        board.close()
+    claimed = [name for node_claims in claims.values() for name in node_claims]
+    assert sorted(claimed) == sorted(names)
+
+
+def test_claim_done_failed_and_stale(tmp_path):
+    st = os.stat(tmp_path)
+    first = ClaimBoard(str(tmp_path), "params", timeout=60, node="first")
+    second = ClaimBoard(str(tmp_path), "params", timeout=60, node="second")
+    try:
+        assert first.select("done.png", st) and first.select("failed.png", st) and first.select("stuck.png", st)
+        first.finished(ImageResult("done.png", True))
+        first.finished(ImageResult("failed.png", False, error="x"))
+        # 完成和失败的文件都跳过 (输入没有变化), 正在处理的不能抢
+        assert not second.select("done.png", st) and second.done_elsewhere == 1
+        assert not second.select("failed.png", st) and second.failed_elsewhere == 1
+        assert not second.select("stuck.png", st)
+        # 持有者崩溃: 超时没有刷新的认领由其它节点接管
+        old = time.time() - 120
+        os.utime(first.claim_path("stuck.png"), (old, old))
+        assert second.select("stuck.png", st) and second.reclaimed == 1
+        # 参数变化后完成和失败标记都失效
+        third = ClaimBoard(str(tmp_path), "other", node="third")
+        assert third.select("done.png", st) and third.select("failed.png", st) and third.reclaimed == 0
+        third.close()
+    finally:
+        first.stop.set()  # first 模拟崩溃的节点, 不释放认领
+        second.close()
+
+
+def test_failed_claim_retried_after_input_changes(tmp_path):
+    source = tmp_path / "bad.png"
+    source.write_bytes(b"broken")
+    st = os.stat(source)
+    first = ClaimBoard(str(tmp_path), "params", node="first")
+    second = ClaimBoard(str(tmp_path), "params", node="second")
+    try:
+        assert first.select("bad.png", st)
+        first.finished(ImageResult("bad.png", False, error="x"))
+        with open(first.claim_path("bad.png"), encoding="utf-8") as f:
+            assert f.read() == first.failed_marker(st)
+        assert not first.select("bad.png", st) and not second.select("bad.png", st)
+        make_image(str(source))
+        assert second.select("bad.png", os.stat(source))
+    finally:
+        first.close()
+        second.close()
+
+
+def test_claim_processes_on_one_host(tmp_path):
+    """同一台机器上的几个 --claim 进程共用清单: 都正常退出, 每个文件都有输出"""
+    source, output = tmp_path / "in", tmp_path / "out"
+    names = [f"{index:03d}" for index in range(150)]
+    for name in names:
+        make_image(str(source / f"{name}.png"), size=(16, 12))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [sys.executable, "-m", "imgbatch", "-i", str(source), "-o", str(output), "--claim", "-w", "2"]
+    processes = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                 for _ in range(3)]
+    logs = [process.communicate(timeout=120)[0].decode("utf-8", "replace") for process in processes]
+    for process, log in zip(processes, logs):
+        assert process.returncode == 0, log
+        assert "database is locked" not in log
+    assert sorted(os.path.splitext(name)[0] for name in os.listdir(output) if name.endswith(".jpeg")) == names
@@ -0,0 +1,81 @@
+import pytest
+from PIL import Image, ImageChops, features
+
+from imgbatch import streaming, worker
+from imgbatch.job import JobSpec
+from imgbatch.memory import band_rows, estimate_working_set
+from imgbatch.prescan import WorkItem
+from imgbatch.resample import get_filter
+from imgbatch.streaming import can_stream, stream_resize
+
+
+def gradient_image(size):
+    """水平和垂直方向都有变化的图像, 条带接缝处的误差会显现出来"""
+    red = Image.linear_gradient("L").resize(size)
+    green = Image.linear_gradient("L").rotate(90).resize(size)
+    blue = Image.effect_noise(size, 60)
+    return Image.merge("RGB", (red, green, blue))
+
+
+@pytest.mark.parametrize("fmt, options", [("BMP", {}), ("TIFF", {}), ("TIFF", {"tile": (64, 64)})])
+@pytest.mark.parametrize("resample", ["bilinear", "bicubic", "lanczos"])
+def test_stream_resize_matches_full_resize(tmp_path, monkeypatch, fmt, options, resample):
+    """分条缩放的结果与整图缩放一致 (比例不是整数时条带的起点有浮点舍入, 个别像素可能差 1)"""
+    if options and not features.check("libtiff"):
+        pytest.skip("需要 libtiff")
+    path = str(tmp_path / f"big.{fmt.lower()}")
+    gradient_image((300, 1000)).save(path, fmt, **options)
+    # 每个条带只有几十行, 一张图分成很多条带
+    monkeypatch.setattr(streaming, "STRIP_BYTES", 300 * 4 * 40)
+    sizes = [(150, 500), (97, 323), (30, 100)]
+    job = JobSpec("", "", resample=resample)
+    with Image.open(path) as img:
+        assert can_stream(img)
+        expected = [img.resize(size, resample=get_filter(resample)) for size in sizes]
+    for result, reference in zip(stream_resize(path, (300, 1000), sizes, job), expected):
+        assert result.size == reference.size
+        assert max(high for _, high in ImageChops.difference(result, reference).getextrema()) <= 1
+
+
+def test_engine_streamed_output_matches_full(tmp_path, engine, monkeypatch):
+    """超过阈值的图像走分条缩放, 输出与关闭分条缩放时一致"""
+    calls = []
+    monkeypatch.setattr(worker, "stream_resize", lambda *args: calls.append(args) or stream_resize(*args))
+    source = tmp_path / "in"
+    source.mkdir()
+    gradient_image((300, 1000)).save(source / "big.bmp")
+    outputs = {}
+    for threshold in (1000, 0):
+        output = tmp_path / f"out{threshold}"
+        output.mkdir()
+        job = JobSpec(str(source), str(output), scale=0.5, output_format="PNG", stream_threshold=threshold)
+        assert engine.run(job).succeeded == 1
+        outputs[threshold] = Image.open(output / "big.png")
+    assert len(calls) == 1
+    assert ImageChops.difference(outputs[1000], outputs[0]).getbbox() is None
+
+
+def test_each_source_row_decoded_once(tmp_path, monkeypatch):
+    """保留上一个条带末尾的行, 不重新读取: 缩小很多倍时保留的行数比新读取的还多"""
+    path = str(tmp_path / "wide.bmp")
+    gradient_image((400, 3000)).save(path)
+    monkeypatch.setattr(streaming, "STRIP_BYTES", 400 * 4 * 20)
+    bands = []
+    read_band = streaming.read_band
+    monkeypatch.setattr(streaming, "read_band", lambda *args: bands.append(args[1:]) or read_band(*args))
+    job = JobSpec("", "", resample="lanczos")
+    result, = stream_resize(path, (400, 3000), [(4, 30)], job)
+    assert [top for top, _ in bands] == list(range(0, 3000, 20))
+    assert all(bottom - top == 20 for top, bottom in bands)
+    with Image.open(path) as img:
+        reference = img.resize((4, 30), resample=get_filter("lanczos"))
+    assert max(high for _, high in ImageChops.difference(result, reference).getextrema()) <= 1
+
+
+def test_streamed_working_set_includes_overlap():
+    """1% 的 lanczos 缩小: 保留的行远多于新读取的行, 内存估算要算上"""
+    item = WorkItem("big.bmp", "", None, width=40000, height=40000, mode="RGB", streamed=True)
+    job = JobSpec("", "", scale=0.01, resample="lanczos")
+    strip_rows, overlap = band_rows(40000, 40000, [(400, 400)], "lanczos")
+    assert overlap > strip_rows
+    assert estimate_working_set(item, job) >= (strip_rows + overlap) * 40000 * 4
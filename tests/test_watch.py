@@ -0,0 +1,51 @@
+import threading
+
+from PIL import Image
+
+from imgbatch.job import JobSpec
+from imgbatch import watch
+from imgbatch.watch import watch_folder
+
+from conftest import make_image
+
+
+def test_same_folder_outputs_not_reprocessed(tmp_path, engine):
+    """输出到输入文件夹时, 再次运行不会把上次的输出当作新的输入"""
+    make_image(str(tmp_path / "a.png"), size=(80, 60))
+    make_image(str(tmp_path / "b.jpeg"), size=(80, 60))
+    job = JobSpec(str(tmp_path), str(tmp_path), scale=0.5)
+    first = engine.run(job)
+    assert first.succeeded == 2
+    second = engine.run(job)
+    assert second.succeeded == 0 and second.total == 1
+    assert Image.open(tmp_path / "a.jpeg").size == (40, 30)
+    assert Image.open(tmp_path / "b.jpeg").size == (40, 30)
+
+
+def test_watch_same_folder_stops_after_first_batch(tmp_path, engine):
+    make_image(str(tmp_path / "a.jpeg"), size=(80, 60))
+    job = JobSpec(str(tmp_path), str(tmp_path), scale=0.5)
+    stop = threading.Event()
+    batches = []
+    timer = threading.Timer(3.0, stop.set)
+    timer.start()
+    watch_folder(engine, job, stop, interval=0.1, settle=0.1, on_batch=batches.append)
+    assert [summary.succeeded for summary in batches] == [1]
+    assert Image.open(tmp_path / "a.jpeg").size == (40, 30)
+
+
+def test_watch_retries_failed_files(tmp_path, engine, monkeypatch):
+    """处理失败的文件没有变化也会在之后的扫描中重试, 成功的文件只处理一次"""
+    monkeypatch.setattr(watch, "FULL_SCAN_INTERVAL", 0.2)
+    source, output = tmp_path / "in", tmp_path / "out"
+    make_image(str(source / "good.png"))
+    (source / "bad.png").write_bytes(b"broken")
+    output.mkdir()
+    stop = threading.Event()
+    attempts = []
+    timer = threading.Timer(2.0, stop.set)
+    timer.start()
+    watch_folder(engine, JobSpec(str(source), str(output)), stop, interval=0.1, settle=0.1,
+                 on_result=lambda result: attempts.append((result.filename, result.ok)))
+    assert attempts.count(("good.png", True)) == 1
+    assert attempts.count(("bad.png", False)) >= 2